@@ -32,7 +32,7 @@ import os
 
 from brightside.exceptions import ConfigurationException
 from brightside.messaging import BrightsideMessageType
-from sqlalchemy import create_engine, Table, Column, Integer, String, MetaData, DateTime, Enum
+from sqlalchemy import create_engine, Table, Column, Integer, String, MetaData, DateTime, Enum, UniqueConstraint
 from alchemy_store.custom_types import GUID
 
 db_uri = os.environ.get('BRIGHTER_MESSAGE_STORE_URL')
@@ -53,6 +53,14 @@ messages = Table('messages', metadata,
                  Column('Body', String, nullable=True)
                  )
 
+inbox = Table('inbox', metadata,
+              Column('Id', Integer, primary_key=True),
+              Column('MessageId', GUID, nullable=False),
+              Column('ContextKey', String(255), nullable=False),
+              Column('Timestamp', DateTime, nullable=True),
+              UniqueConstraint('MessageId', 'ContextKey')
+              )
+
 metadata.create_all(engine)
 
 
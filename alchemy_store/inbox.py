@@ -0,0 +1,90 @@
+"""
+File             : inbox.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+
+from datetime import datetime
+from typing import Iterable
+from uuid import UUID
+
+from alchemy_store import engine, inbox
+from brightside.messaging import BrightsideInbox
+from brightside.metrics import Metrics, get_metrics
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+
+class SqlAlchemyInbox(BrightsideInbox):
+    """
+    Records handled messages in the inbox table, next to the message store. The table's unique key on the message id
+    and context key decides which of two racing adds wins, so add is safe across processes. Put a CachedInbox in
+    front of it, so that most checks never reach the database
+    """
+    def __init__(self, metrics: Metrics=None):
+        super().__init__()
+        self._metrics = metrics or get_metrics()
+
+    def add(self, message_id: UUID, context_key: str) -> bool:
+        ins = inbox.insert().values(
+            MessageId=message_id,
+            ContextKey=context_key,
+            Timestamp=datetime.utcnow()
+            )
+        with self._metrics.time("brightside_inbox_add_seconds"):
+            conn = engine.connect()
+            try:
+                with conn.begin() as trans:
+                    conn.execute(ins)
+                    trans.commit()
+                return True
+            except IntegrityError:
+                return False
+            finally:
+                conn.close()
+
+    def exists(self, message_id: UUID, context_key: str) -> bool:
+        query = select([inbox.c.Id]).where(inbox.c.MessageId == message_id).where(inbox.c.ContextKey == context_key)
+        with self._metrics.time("brightside_inbox_exists_seconds"):
+            conn = engine.connect()
+            result = conn.execute(query)
+            row = result.fetchone()
+            result.close()
+            conn.close()
+        return row is not None
+
+    def ids(self, context_key: str, since: datetime = None) -> Iterable[UUID]:
+        query = select([inbox.c.MessageId]).where(inbox.c.ContextKey == context_key)
+        if since is not None:
+            query = query.where(inbox.c.Timestamp >= since)
+        conn = engine.connect()
+        result = conn.execute(query)
+        message_ids = [row[inbox.c.MessageId] for row in result]
+        result.close()
+        conn.close()
+        return message_ids
@@ -36,6 +36,7 @@ from uuid import UUID, uuid4
 
 from alchemy_store import engine, messages
 from brightside.messaging import BrightsideMessage, BrightsideMessageHeader, BrightsideMessageBody, BrightsideMessageType, BrightsideMessageStore
+from brightside.metrics import Metrics, get_metrics
 from sqlalchemy import select
 
 
@@ -68,8 +69,9 @@ def create_message(row) -> BrightsideMessage:
 
 
 class SqlAlchemyMessageStore(BrightsideMessageStore):
-    def __init__(self):
+    def __init__(self, metrics: Metrics=None):
         super().__init__()
+        self._metrics = metrics or get_metrics()
 
     def add(self, message: BrightsideMessage) -> None:
         ins = messages.insert().values(
@@ -79,11 +81,12 @@ class SqlAlchemyMessageStore(BrightsideMessageStore):
             Timestamp=datetime.utcnow(),
             Body=message.body.value
             )
-        conn = engine.connect()
-        with conn.begin() as trans:
-            conn.execute(ins)
-            trans.commit()
-        conn.close()
+        with self._metrics.time("brightside_message_store_add_seconds"):
+            conn = engine.connect()
+            with conn.begin() as trans:
+                conn.execute(ins)
+                trans.commit()
+            conn.close()
 
     def get_message(self, key: UUID) -> BrightsideMessage:
         msg = create_empty_message()
@@ -29,6 +29,7 @@ THE SOFTWARE.
 **********************************************************************i*
 """
 
+from collections import deque
 from typing import Dict
 from uuid import uuid4
 import logging
@@ -41,10 +42,33 @@ from kombu.pools import connections
 from kombu import exceptions as kombu_exceptions
 from kombu.message import Message as KombuMessage
 
+from brightside.compression import Compression
 from brightside.connection import Connection
 from brightside.exceptions import ChannelFailureException
-from brightside.messaging import BrightsideConsumer, BrightsideConsumerConfiguration, BrightsideMessage, BrightsideProducer, BrightsideMessageHeader, BrightsideMessageBody, BrightsideMessageType
-from arame.messaging import ArameMessageFactory, KombuMessageFactory
+from brightside.log_handler import LogSampler
+from brightside.messaging import BrightsideConsumer, BrightsideConsumerConfiguration, BrightsideMessage, BrightsideProducer, BrightsideMessageHeader, BrightsideMessageBody, BrightsideMessageType, \
+    BrightsideReplyReceiver
+from brightside.metrics import Metrics, get_metrics
+from arame.messaging import ArameMessageFactory, KombuMessageFactory, message_content_encoding_header, \
+    message_handled_count_header
+
+
+def queue_depth(connection: Connection, configuration: BrightsideConsumerConfiguration) -> int:
+    """
+    Asks the broker how many messages are waiting on the queue for a consumer, without consuming them. We use a
+    passive declare, so we will not create the queue if it does not exist. Intended for the dispatcher's autoscaler,
+    which runs in the parent process and so cannot use the consumer's own connection
+    :param connection: The connection to the broker
+    :param configuration: The configuration of the consumer whose queue we want to inspect
+    :return: The number of messages ready on the queue
+    """
+    exchange = Exchange(connection.exchange, type=connection.exchange_type, durable=connection.is_durable)
+    queue = Queue(configuration.queue_name, exchange=exchange, routing_key=configuration.routing_key,
+                  durable=configuration.is_durable)
+    cnx = BrokerConnection(hostname=connection.amqp_uri, connect_timeout=connection.connect_timeout)
+    with connections[cnx].acquire(block=True) as conn:
+        _, message_count, _ = queue(conn.default_channel).queue_declare(passive=True)
+        return message_count
 
 
 class ArameProducer(BrightsideProducer):
@@ -57,24 +81,38 @@ class ArameProducer(BrightsideProducer):
         'max_retries': 3,
     }
 
-    def __init__(self, connection: Connection, logger: logging.Logger=None) -> None:
+    def __init__(self, connection: Connection, logger: logging.Logger=None, metrics: Metrics=None,
+                 payload_log_sampling: int=1, compression: Compression=None) -> None:
+        """
+        :param payload_log_sampling: At debug level, log the message we send 1 in every this many sends; 0 turns it off
+        :param compression: If set, we compress bodies over its threshold, and record the codec in the
+            x-content-encoding header, so that an ArameConsumer can decompress them
+        """
         self._amqp_uri = connection.amqp_uri
         self._cnx = BrokerConnection(hostname=connection.amqp_uri)
         self._exchange = Exchange(connection.exchange, type=connection.exchange_type, durable=connection.is_durable)
         self._logger = logger or logging.getLogger(__name__)
+        self._metrics = metrics or get_metrics()
+        self._payload_sampler = LogSampler(payload_log_sampling)
+        self._compression = compression
 
     def send(self, message: BrightsideMessage):
         # we want to expose our logger to the functions defined in inner scope, so put it in their outer scope
 
         logger = self._logger
+        log_payload = logger.isEnabledFor(logging.DEBUG) and self._payload_sampler.sample()
 
         def _build_message_header(msg: BrightsideMessage) -> Dict:
-            return KombuMessageFactory(msg).create_message_header()
+            header = KombuMessageFactory(msg).create_message_header()
+            if content_encoding is not None:
+                header[message_content_encoding_header] = content_encoding
+            return header
 
         def _publish(sender: Producer) -> None:
-            logger.debug("Send message {body} to broker {amqpuri} with routing key {routing_key}"
-                         .format(body=message, amqpuri=self._amqp_uri, routing_key=message.header.topic))
-            sender.publish(message.body.bytes,
+            if log_payload:
+                logger.debug("Send message %s to broker %s with routing key %s",
+                             message.body.value, self._amqp_uri, message.header.topic)
+            sender.publish(body,
                            headers=_build_message_header(message),
                            exchange=self._exchange,
                            content_type="text/plain",
@@ -82,9 +120,17 @@ class ArameProducer(BrightsideProducer):
                            declare=[self._exchange])
 
         def _error_callback(e, interval) -> None:
-            logger.debug("Publishing error: {e}. Will retry in {interval} seconds".format(e=e, interval=interval))
+            logger.debug("Publishing error: %s. Will retry in %s seconds", e, interval)
+            self._metrics.increment("brightside_producer_publish_retries_total", labels={"topic": message.header.topic})
+
+        body, content_encoding = message.body.bytes, None
+        if self._compression is not None:
+            body, content_encoding = self._compression.compress(body)
+            if content_encoding is not None:
+                self._metrics.increment("brightside_producer_compression_saved_bytes_total",
+                                        len(message.body.bytes) - len(body), {"topic": message.header.topic})
 
-        self._logger.debug("Connect to broker {amqpuri}".format(amqpuri=self._amqp_uri))
+        self._logger.debug("Connect to broker %s", self._amqp_uri)
 
         # Producer uses a pool, because you may have many instances in your code, but no heartbeat as a result
         with connections[self._cnx].acquire(block=True) as conn:
@@ -92,12 +138,14 @@ class ArameProducer(BrightsideProducer):
                 ensure_kwargs = self.RETRY_OPTIONS.copy()
                 ensure_kwargs['errback'] = _error_callback
                 safe_publish = conn.ensure(producer, _publish, **ensure_kwargs)
-                safe_publish(producer)
+                with self._metrics.time("brightside_producer_publish_seconds", {"topic": message.header.topic}):
+                    safe_publish(producer)
 
 
 class ArameConsumer(BrightsideConsumer):
     """ Implements reading a message from an RMQ broker. It uses a queue, created by subscribing to a message topic
-
+    We may hold many messages that we have received but not yet acked or requeued, such as a batch, so we track them
+    by id; we hand out prefetched messages one at a time, in the order the broker sent them
     """
     RETRY_OPTIONS = {
         'interval_start': 1,
@@ -106,7 +154,12 @@ class ArameConsumer(BrightsideConsumer):
         'max_retries': 3,
     }
 
-    def __init__(self, connection: Connection, configuration: BrightsideConsumerConfiguration, logger: logging.Logger=None) -> None:
+    def __init__(self, connection: Connection, configuration: BrightsideConsumerConfiguration, logger: logging.Logger=None,
+                 payload_log_sampling: int=1) -> None:
+        """
+        :param payload_log_sampling: At debug level, log the headers and payload of 1 in every this many messages we
+            receive; 0 turns it off
+        """
         self._exchange = Exchange(connection.exchange, type=connection.exchange_type, durable=connection.is_durable)
         self._routing_key = configuration.routing_key
         self._amqp_uri = connection.amqp_uri
@@ -118,6 +171,7 @@ class ArameConsumer(BrightsideConsumer):
         self._connect_timeout = connection.connect_timeout
         self._message_factory = ArameMessageFactory()
         self._logger = logger or logging.getLogger(__name__)
+        self._payload_sampler = LogSampler(payload_log_sampling)
         self._conn = None
         consumer_arguments = {}
         if configuration.is_ha is True:
@@ -127,23 +181,43 @@ class ArameConsumer(BrightsideConsumer):
 
         self._queue = Queue(self._queue_name, exchange=self._exchange, routing_key=self._routing_key,
                             durable=self._is_durable, consumer_arguments=consumer_arguments)
+        # where we hold deferred messages until they expire, and RabbitMQ dead-letters them back to our queue
+        self._delay_queue = Queue("{}.delay".format(self._queue_name), exchange=Exchange(""),
+                                  routing_key="{}.delay".format(self._queue_name), durable=self._is_durable,
+                                  queue_arguments={"x-dead-letter-exchange": "",
+                                                   "x-dead-letter-routing-key": self._queue_name})
 
-        self._msg = None  # Kombu Message
-        self._message = None  # Brightside Message
+        self._received = deque()
+        self._outstanding = {}
 
         self._establish_connection(BrokerConnection(hostname=self._amqp_uri, connect_timeout=self._connect_timeout, heartbeat=self._heartbeat))
         self._establish_channel()
         self._establish_consumer()
 
     def acknowledge(self, message: BrightsideMessage):
-        if (self._message is not None) and self._message.id == message.id:
-            self._msg.ack()
-            self._msg = None
+        msg = self._outstanding.pop(message.id, None)
+        if msg is not None:
+            msg.ack()
+
+    def cancel(self) -> None:
+        """Sends a basic.cancel, so the broker stops sending us messages. We keep the channel open, so we can still
+        ack or requeue the messages already prefetched, which we will continue to read on receive"""
+        if self._conn is not None:
+            self._logger.debug("Cancelling consumption from queue %s", self._queue_name)
+            self._consumer.cancel()
+
+    def resume(self) -> None:
+        """Sends a basic.consume, so the broker starts sending us messages again after a cancel"""
+        if self._conn is not None:
+            self._logger.debug("Resuming consumption from queue %s", self._queue_name)
+            self._consumer.consume()
 
     def _ensure_connection(self):
         # We can get connection aborted before we try to read, so despite ensure()
         # we check the connection here
         if self._conn.connected is not True:
+            # the broker redelivers what we had not acked, so we can no longer settle it
+            self._forget_received()
             self._conn = self._conn.clone()
             self._conn.ensure_connection(max_retries=3)
             self._channel = self._conn.channel()
@@ -155,7 +229,7 @@ class ArameConsumer(BrightsideConsumer):
 
     def _establish_consumer(self):
         self._consumer = Consumer(channel=self._channel, queues=[self._queue], callbacks=[self._read_message])
-        self._consumer.qos(prefetch_count=1)
+        self._consumer.qos(prefetch_count=self._prefetch_count)
         self._consumer.consume()
 
     def _establish_connection(self, conn: BrokerConnection) -> None:
@@ -177,12 +251,12 @@ class ArameConsumer(BrightsideConsumer):
             else:
                 conn.close()
 
+    def _forget_received(self) -> None:
+        self._received.clear()
+        self._outstanding.clear()
+
     def has_acknowledged(self, message):
-        if (self._message is not None) and self._message.id == message.id:
-            if self._msg is None:
-                return True
-            else:
-                return False
+        return message.id not in self._outstanding
 
     def purge(self, timeout: int = 5) -> None:
 
@@ -191,7 +265,6 @@ class ArameConsumer(BrightsideConsumer):
 
         def _purge_messages(cnsmr: BrightsideConsumer):
             cnsmr.purge()
-            self._message = None
 
         self._ensure_connection()
 
@@ -201,13 +274,16 @@ class ArameConsumer(BrightsideConsumer):
         safe_purge(self._consumer)
 
     def _read_message(self, body: str, msg: KombuMessage) -> None:
-        self._logger.debug("Monitoring event received at: %s headers: %s payload: %s", datetime.utcnow().isoformat(), msg.headers, body)
-        self._msg = msg
-        self._message = self._message_factory.create_message(msg)
+        if self._logger.isEnabledFor(logging.DEBUG) and self._payload_sampler.sample():
+            self._logger.debug("Monitoring event received at: %s headers: %s payload: %s", datetime.utcnow().isoformat(), msg.headers, body)
+        message = self._message_factory.create_message(msg)
+        self._outstanding[message.id] = msg
+        self._received.append(message)
 
     def receive(self, timeout: int) -> BrightsideMessage:
 
-        self._message = BrightsideMessage(BrightsideMessageHeader(uuid4(), "", BrightsideMessageType.MT_NONE), BrightsideMessageBody(""))
+        if self._received:
+            return self._received.popleft()
 
         def _consume(cnx: BrokerConnection, timesup: int) -> None:
             try:
@@ -236,20 +312,57 @@ class ArameConsumer(BrightsideConsumer):
         safe_drain = self._conn.ensure(self._consumer, _consume, **ensure_kwargs)
         safe_drain(self._conn, timeout)
 
-        return self._message
+        if self._received:
+            return self._received.popleft()
+        return BrightsideMessage(BrightsideMessageHeader(uuid4(), "", BrightsideMessageType.MT_NONE), BrightsideMessageBody(""))
 
     def _reset_connection(self) -> None:
         self._logger.debug('Reset connection to RabbitMQ following socket error')
         self._conn.close()
+        self._forget_received()
         self._establish_connection(BrokerConnection(hostname=self._amqp_uri, connect_timeout=self._connect_timeout, heartbeat=self._heartbeat))
         self._establish_channel()
         self._establish_consumer()
 
-    def requeue(self, message: BrightsideMessage) -> None:
+    def requeue(self, message: BrightsideMessage, delay: float = 0.0) -> None:
         """
-            TODO: has does a consumer resend
+        Without a delay, a reject with requeue returns the message to the head of its queue at once, as it arrived.
+        With one, we publish the message, with its headers as they are now, to a delay queue of our own, through the
+        default exchange, so that it reaches no other queue bound to its topic, then ack the original. It expires from
+        the delay queue after the delay, and RabbitMQ dead-letters it back to our queue. RabbitMQ only expires messages
+        at the head of a queue, so a message may wait behind one deferred before it with a longer delay
         """
-        self._msg.requeue()
+        msg = self._outstanding.get(message.id)
+        if msg is None:
+            return
+        if delay > 0:
+            try:
+                self._publish_delayed(message, msg, delay)
+                del self._outstanding[message.id]
+                msg.ack()
+                return
+            except (kombu_exceptions.KombuError, OSError, IOError, ConnectionError):
+                self._logger.warning("Could not delay message %s, requeueing it at once", message.id, exc_info=1)
+        del self._outstanding[message.id]
+        msg.requeue()
+
+    def _publish_delayed(self, message: BrightsideMessage, msg: KombuMessage, delay: float) -> None:
+        # we send the body as it came to us, which may be compressed or checked in, with headers that record what the
+        # pump has changed since, such as how many times we have handled it
+        headers = dict(msg.headers)
+        if message.header.bag:
+            headers.update({key: value for key, value in message.header.bag.items()
+                            if isinstance(value, (str, int, float, bool))})
+        headers[message_handled_count_header] = message.header.handled_count
+        Producer(self._channel).publish(msg.body,
+                                        headers=headers,
+                                        exchange="",
+                                        routing_key=self._delay_queue.name,
+                                        declare=[self._delay_queue],
+                                        expiration=delay,
+                                        content_type=msg.content_type,
+                                        content_encoding=msg.content_encoding,
+                                        delivery_mode=msg.properties.get("delivery_mode"))
 
     def run_heartbeat_continuously(self) -> threading.Event:
         """
@@ -286,4 +399,66 @@ class ArameConsumer(BrightsideConsumer):
             self._logger.debug("Closing connection: %s", self._conn)
             self._conn.close()
             self._conn = None
-            
\ No newline at end of file
+            
+
+
+class ArameReplyReceiver(BrightsideReplyReceiver):
+    """
+    Receives replies to calls on an exclusive, auto-delete queue of its own, bound to the exchange by the queue's name,
+    so the broker removes the queue when we disconnect. We read from the queue on a thread of our own, as the thread
+    that made a call is blocked waiting for the reply
+    """
+    def __init__(self, connection: Connection, logger: logging.Logger=None) -> None:
+        super().__init__(logger)
+        self._amqp_uri = connection.amqp_uri
+        self._connect_timeout = connection.connect_timeout
+        self._heartbeat = connection.heartbeat
+        self._exchange = Exchange(connection.exchange, type=connection.exchange_type, durable=connection.is_durable)
+        self._message_factory = ArameMessageFactory()
+        self._queue_name = "brightside.reply.{}".format(uuid4())
+        self._queue = Queue(self._queue_name, exchange=self._exchange, routing_key=self._queue_name,
+                            exclusive=True, auto_delete=True)
+        self._conn = None  # type: BrokerConnection
+        self._consumer = None  # type: Consumer
+        self._stopped = threading.Event()
+        self._reader = None  # type: threading.Thread
+
+    def _close(self) -> None:
+        self._stopped.set()
+        self._reader.join()
+        if self._conn is not None:
+            self._logger.debug("Closing reply connection: %s", self._conn)
+            self._conn.close()
+            self._conn = None
+
+    def _connect(self) -> None:
+        self._conn = BrokerConnection(hostname=self._amqp_uri, connect_timeout=self._connect_timeout,
+                                      heartbeat=self._heartbeat)
+        self._conn.ensure_connection(max_retries=3)
+        # no_ack, as a reply that nobody is waiting for has nowhere else to go
+        self._consumer = Consumer(channel=self._conn.channel(), queues=[self._queue], callbacks=[self._read_reply],
+                                  no_ack=True)
+        self._consumer.consume()
+
+    def _open(self) -> str:
+        self._stopped.clear()
+        self._connect()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+        return self._queue_name
+
+    def _read(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._conn.drain_events(timeout=0.5)
+            except kombu_exceptions.TimeoutError:
+                self._conn.heartbeat_check()
+            except (kombu_exceptions.OperationalError, OSError, IOError, ConnectionError):
+                if self._stopped.is_set():
+                    break
+                self._logger.warning("Error reading replies from %s, reconnecting", self._queue_name, exc_info=1)
+                self._conn.close()
+                self._connect()
+
+    def _read_reply(self, body: str, msg: KombuMessage) -> None:
+        self.complete(self._message_factory.create_message(msg))
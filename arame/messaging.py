@@ -34,6 +34,7 @@ from uuid import UUID, uuid4
 
 from kombu.message import Message as Message
 
+from brightside.compression import lookup_codec
 from brightside.handler import Request
 from brightside.messaging import BrightsideMessage, BrightsideMessageHeader, BrightsideMessageBody, BrightsideMessageType
 from brightside.exceptions import MessagingException
@@ -41,12 +42,19 @@ from brightside.exceptions import MessagingException
 message_type_header = "MessageType"
 message_id_header = "MessageId"
 message_correlation_id_header = "CorrelationId"
+message_reply_to_header = "ReplyTo"
 message_topic_name_header = "Topic"
 message_handled_count_header = "HandledCount"
 message_delay_milliseconds_header = "x-delay"
 message_delayed_milliseconds_header = "x-delay"
 message_original_message_id_header = "x-original-message-id"
 message_delivery_tag_header = "DeliveryTag"
+message_content_encoding_header = "x-content-encoding"
+
+# Headers we map onto the message header itself; anything else we find on the wire goes into the header bag
+_reserved_headers = frozenset([message_type_header, message_id_header, message_correlation_id_header,
+                               message_reply_to_header, message_topic_name_header, message_handled_count_header,
+                               message_content_encoding_header])
 
 
 class ReadError:
@@ -95,14 +103,6 @@ class ArameMessageFactory:
                 self._has_read_errors = True
                 return BrightsideMessageType.MT_UNACCEPTABLE
 
-        def _get_payload() -> str:
-            body, err = self._read_payload(message)
-            if err is None:
-                return body
-            else:
-                self._has_read_errors = True
-                return ""
-
         def _get_payload_type() -> str:
             payload_type, err = self._read_payload_type(message)
             if err is None:
@@ -123,11 +123,25 @@ class ArameMessageFactory:
         topic = _get_topic()
         message_type = _get_message_type() if not message.errors or self._has_read_errors else BrightsideMessageType.MT_UNACCEPTABLE
         correlation_id = _get_correlation_id()
-        payload = _get_payload()
+        payload, payload_error = self._read_payload(message)
+        if payload_error is not None:
+            # we cannot handle a message whose body we cannot read, such as one we cannot decompress
+            self._has_read_errors = True
+            message_type = BrightsideMessageType.MT_UNACCEPTABLE
         payload_type = _get_payload_type()
 
+        # Only calls have somewhere to reply to, so a missing header is not an error
+        reply_to = message.headers.get(message_reply_to_header)
+        # Only a message we requeued with a delay has been handled before
+        try:
+            handled_count = int(message.headers.get(message_handled_count_header, 0))
+        except (TypeError, ValueError):
+            handled_count = 0
+
         message_header = BrightsideMessageHeader(identity=message_id, topic=topic, message_type=message_type,
-                                                 correlation_id=correlation_id, content_type="json")
+                                                 correlation_id=correlation_id, reply_to=reply_to, content_type="json",
+                                                 header_bag=self._read_header_bag(message),
+                                                 handled_count=handled_count)
 
         message_body = BrightsideMessageBody(body=payload, body_type=payload_type)
 
@@ -141,9 +155,20 @@ class ArameMessageFactory:
         else:
             return message.headers.get(header_key), None
 
+    def _read_header_bag(self, message: Message) -> Dict:
+        return {key: value for key, value in message.headers.items() if key not in _reserved_headers}
+
     def _read_payload(self, message: Message) -> (str, ReadError):
         if not message.errors:
-            body_text = message.body.decode("unicode_escape")
+            body = message.body
+            content_encoding = message.headers.get(message_content_encoding_header)
+            if content_encoding is not None:
+                try:
+                    body = lookup_codec(content_encoding).decompress(body)
+                except Exception as ex:
+                    return "", ReadError("Could not decompress message with content encoding {}. Error: {}".format(
+                        content_encoding, ex))
+            body_text = body.decode("unicode_escape")
             return body_text, None
         else:
             errors = ", ".join(message.errors)
@@ -177,10 +202,23 @@ class KombuMessageFactory:
                 raise MessagingException("Missing type on message, this is a required field")
             brightside_message_header[message_type_header] = brightside_message_type
 
+        def _add_reply_to(brightside_message_header: Dict, reply_to: str) -> None:
+            if reply_to is not None:
+                brightside_message_header[message_reply_to_header] = reply_to
+
+        def _add_header_bag(brightside_message_header: Dict, bag: Dict) -> None:
+            if bag:
+                for key, value in bag.items():
+                    # AMQP tables only hold simple types, so anything else, a UUID say, goes as a string
+                    brightside_message_header[key] = value if isinstance(value, (str, int, float, bool)) else str(value)
+
         header = {}
+        # we add the bag first, so it cannot overwrite the headers we need to read the message
+        _add_header_bag(header, self._message.header.bag)
         _add_message_id(header, self._message.header.id)
         _add_message_type(header, self._message.header.message_type.name)
         _add_correlation_id(header, self._message.header.correlation_id)
+        _add_reply_to(header, self._message.header.reply_to)
 
         return header
 
@@ -0,0 +1,83 @@
+"""
+File             : bench_command_processor.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import pytest
+
+from brightside.command_processor import CommandProcessor
+from brightside.handler import Handler
+from brightside.pipeline import FeatureFlagStep, LoggingStep, RetryStep, TimingStep
+from brightside.registry import Registry
+from tests.handlers_testdoubles import MyCommand, MyCommandHandler, MyEvent, MyEventHandler
+
+
+class MyNullCommandHandler(Handler):
+    """Does nothing, so that we time the command processor and not the handler"""
+    def handle(self, request):
+        pass
+
+
+@pytest.fixture
+def registry() -> Registry:
+    registry = Registry()
+    registry.register(MyCommand, lambda: MyNullCommandHandler())
+    registry.register(MyEvent, lambda: MyEventHandler())
+    registry.register(MyEvent, lambda: MyEventHandler())
+    return registry
+
+
+def bench_registry_lookup(benchmark, registry):
+    benchmark(registry.lookup, MyCommand())
+
+
+def bench_send(benchmark, registry):
+    benchmark(CommandProcessor(registry=registry).send, MyCommand())
+
+
+def bench_send_to_a_logged_handler(benchmark):
+    """MyCommandHandler is decorated with log_handler at debug, which is off, so this is the decorator's overhead"""
+    registry = Registry()
+    registry.register(MyCommand, lambda: MyCommandHandler())
+
+    benchmark(CommandProcessor(registry=registry).send, MyCommand())
+
+
+def bench_publish_to_two_handlers(benchmark, registry):
+    benchmark(CommandProcessor(registry=registry).publish, MyEvent())
+
+
+def bench_send_through_a_pipeline(benchmark, registry):
+    """The built in steps with logging and metrics off, so this is the pipeline's own overhead per message"""
+    command_processor = CommandProcessor(registry=registry)
+    command_processor.add_step(TimingStep())
+    command_processor.add_step(LoggingStep())
+    command_processor.add_step(RetryStep(RuntimeError))
+    command_processor.add_step(FeatureFlagStep(lambda request: True))
+
+    benchmark(command_processor.send, MyCommand())
@@ -0,0 +1,59 @@
+"""
+File             : bench_message_factory.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import pytest
+from kombu.message import Message
+
+from arame.messaging import ArameMessageFactory, KombuMessageFactory
+from tests.handlers_testdoubles import MyCommand, map_mycommand_to_message
+
+PAYLOAD_SIZES = [64, 16 * 1024]
+
+
+def _kombu_message(size: int) -> Message:
+    request = MyCommand()
+    request.payload = "x" * size
+    message = map_mycommand_to_message(request)
+    headers = KombuMessageFactory(message).create_message_header()
+    return Message(body=message.body.bytes, content_type="text/plain", headers=headers)
+
+
+@pytest.mark.parametrize("size", PAYLOAD_SIZES)
+def bench_create_message(benchmark, size):
+    kombu_message = _kombu_message(size)
+    factory = ArameMessageFactory()
+
+    benchmark(factory.create_message, kombu_message)
+
+
+def bench_create_message_header(benchmark):
+    message = map_mycommand_to_message(MyCommand())
+
+    benchmark(lambda: KombuMessageFactory(message).create_message_header())
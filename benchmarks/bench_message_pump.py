@@ -0,0 +1,68 @@
+"""
+File             : bench_message_pump.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+from brightside.command_processor import CommandProcessor
+from brightside.handler import Handler
+from brightside.message_factory import create_quit_message
+from brightside.message_pump import MessagePump
+from brightside.registry import Registry
+from tests.handlers_testdoubles import MyCommand, map_my_command_to_request, map_mycommand_to_message
+from tests.message_pump_doubles import FakeChannel
+
+MESSAGES_PER_RUN = 1000
+
+
+class MyNullCommandHandler(Handler):
+    """Does nothing, so that we time the pump and not the handler"""
+    def handle(self, request):
+        pass
+
+
+def _full_channel() -> FakeChannel:
+    channel = FakeChannel("bench")
+    for _ in range(MESSAGES_PER_RUN):
+        channel.add(map_mycommand_to_message(MyCommand()))
+    channel.add(create_quit_message())
+    return channel
+
+
+def bench_pump_a_thousand_messages(benchmark):
+    """
+    The pump end to end: receive, translate, dispatch to a handler and acknowledge, over an in-memory channel.
+    Divide by MESSAGES_PER_RUN for the cost per message
+    """
+    registry = Registry()
+    registry.register(MyCommand, lambda: MyNullCommandHandler())
+    command_processor = CommandProcessor(registry=registry)
+
+    def _setup():
+        return (MessagePump(command_processor, _full_channel(), map_my_command_to_request),), {}
+
+    benchmark.pedantic(lambda pump: pump.run(), setup=_setup, rounds=20)
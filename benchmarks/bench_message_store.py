@@ -0,0 +1,53 @@
+"""
+File             : bench_message_store.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+from uuid import uuid4
+
+import pytest
+
+from brightside.messaging import BrightsideMessage, BrightsideMessageBody, BrightsideMessageHeader, BrightsideMessageType
+
+
+@pytest.fixture
+def store():
+    from alchemy_store import engine
+    from alchemy_store.message_store import SqlAlchemyMessageStore
+    # the engine echoes SQL to the console, which would swamp what we want to measure
+    echo, engine.echo = engine.echo, False
+    yield SqlAlchemyMessageStore()
+    engine.echo = echo
+
+
+def bench_add(benchmark, store):
+    def _setup():
+        header = BrightsideMessageHeader(uuid4(), "bench topic", BrightsideMessageType.MT_COMMAND)
+        return (BrightsideMessage(header, BrightsideMessageBody("x" * 1024)),), {}
+
+    benchmark.pedantic(store.add, setup=_setup, rounds=200)
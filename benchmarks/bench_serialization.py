@@ -0,0 +1,59 @@
+"""
+File             : bench_serialization.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import pytest
+
+from arame.messaging import JsonRequestSerializer
+from brightside.handler import Command
+
+PAYLOAD_SIZES = [64, 1024, 16 * 1024, 256 * 1024]
+
+
+class MyPayloadCommand(Command):
+    def __init__(self, size: int = 0) -> None:
+        super().__init__()
+        self.count = 42
+        self.ratio = 3.14
+        self.flag = True
+        self.payload = "x" * size
+
+
+@pytest.mark.parametrize("size", PAYLOAD_SIZES)
+def bench_serialize_to_json(benchmark, size):
+    request = MyPayloadCommand(size)
+
+    benchmark(lambda: JsonRequestSerializer(request=request).serialize_to_json())
+
+
+@pytest.mark.parametrize("size", PAYLOAD_SIZES)
+def bench_deserialize_from_json(benchmark, size):
+    serialized = JsonRequestSerializer(request=MyPayloadCommand(size)).serialize_to_json()
+
+    benchmark(lambda: JsonRequestSerializer(request=MyPayloadCommand(), serialized_request=serialized).deserialize_from_json())
@@ -0,0 +1,250 @@
+"""
+File             : async_publisher.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from brightside.exceptions import ConfigurationException, PublishQueueFullException
+from brightside.handler import Request
+from brightside.metrics import Metrics, get_metrics
+
+_WorkItem = Tuple[Callable[[Request], Any], Request, contextvars.Context, Future]
+
+
+class PublishOptions:
+    """
+    How we run the handlers for an event type asynchronously
+    :param workers: The threads that run handlers; each handler of an event runs as its own item of work, so with enough
+        workers an event's handlers run in parallel
+    :param queue_size: The most handler runs we queue before a publish has to wait for room
+    :param block: Whether a publish waits for room when the queue is full; if not we raise PublishQueueFullException
+    :param timeout: The seconds a publish waits for room before we raise PublishQueueFullException; None waits forever
+    """
+    def __init__(self, workers: int=4, queue_size: int=1000, block: bool=True, timeout: Optional[float]=None) -> None:
+        if workers < 1:
+            raise ConfigurationException("An async publisher needs at least one worker")
+        if queue_size < 1:
+            raise ConfigurationException("An async publisher needs a queue size of at least one")
+        self._workers = workers
+        self._queue_size = queue_size
+        self._block = block
+        self._timeout = timeout
+
+    @property
+    def block(self) -> bool:
+        return self._block
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue_size
+
+    @property
+    def timeout(self) -> Optional[float]:
+        return self._timeout
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+
+class AsyncPublisher:
+    """
+    Runs the handlers for events on a pool of worker threads, so that the thread that publishes an event does not wait
+    for its handlers, and the handlers of one event run at the same time as each other. Handlers must be independent
+    for this to be safe, as they are for publish: we give no guarantee of the order they run in.
+    Event types share the default pool, unless you configure a pool of their own for them, so that a slow subscriber to
+    one event cannot hold up the handlers of another.
+    Each handler runs in isolation: if it raises, we log it and fail its future, and the other handlers still run
+    """
+    def __init__(self, default_options: PublishOptions=None, metrics: Metrics=None, logger: logging.Logger=None) -> None:
+        self._default_options = default_options or PublishOptions()
+        self._options = {}
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._metrics = metrics or get_metrics()
+        self._logger = logger or logging.getLogger(__name__)
+        self._stopped = False
+
+    def configure(self, request_class: type, options: PublishOptions) -> None:
+        """
+        Give an event type a pool of its own; do so before you publish it
+        :param request_class: The event type
+        :param options: The workers and queue of its pool
+        """
+        with self._lock:
+            if request_class.__name__ in self._pools:
+                raise ConfigurationException("Events of type {} have already been published".format(request_class.__name__))
+            self._options[request_class.__name__] = options
+
+    def depth(self, request_class: type=None) -> int:
+        """The handler runs waiting for a worker, in the pool for the event type or else in the default pool"""
+        with self._lock:
+            pool = self._pools.get(self._pool_key(request_class.__name__ if request_class else None))
+        return pool.depth if pool is not None else 0
+
+    def shutdown(self, wait: bool=True, timeout: Optional[float]=None) -> None:
+        """
+        Stop accepting events; workers finish the handler runs already queued, then exit
+        :param wait: Whether to wait for the workers to exit
+        :param timeout: The most seconds to wait for all of them
+        """
+        with self._lock:
+            self._stopped = True
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for pool in pools:
+                pool.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def submit(self, request: Request, handlers: List[Callable[[Request], Any]]) -> List[Future]:
+        """
+        Queue a run of each handler for the request
+        :param handlers: The pipelines, each ending in a handler, to run the request through
+        :return: A future for each handler, which completes when it has run, or fails with what it raised
+        """
+        if not handlers:
+            return []
+        pool = self._pool_for(request)
+        # so that handlers see the span, and anything else in context, of the code that published the event; each
+        # handler gets its own copy, as a context cannot be entered by two threads at once
+        items = [(handler, request, contextvars.copy_context(), Future()) for handler in handlers]
+        pool.put(items)
+        return [item[3] for item in items]
+
+    def _pool_for(self, request: Request) -> '_WorkerPool':
+        name = request.__class__.__name__
+        with self._lock:
+            if self._stopped:
+                raise ConfigurationException("The async publisher has been shut down")
+            key = self._pool_key(name)
+            pool = self._pools.get(key)
+            if pool is None:
+                options = self._options.get(name, self._default_options)
+                pool = self._pools[key] = _WorkerPool(key or "default", options, self._metrics, self._logger)
+            return pool
+
+    def _pool_key(self, name: Optional[str]) -> Optional[str]:
+        return name if name in self._options else None
+
+
+class _WorkerPool:
+    def __init__(self, name: str, options: PublishOptions, metrics: Metrics, logger: logging.Logger) -> None:
+        self._name = name
+        self._options = options
+        self._metrics = metrics
+        self._logger = logger
+        self._items = deque()  # type: deque
+        self._condition = threading.Condition()
+        self._closed = False
+        self._labels = {"pool": name}
+        self._workers = [threading.Thread(target=self._work, name="brightside-publish-{}-{}".format(name, i), daemon=True)
+                         for i in range(options.workers)]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def depth(self) -> int:
+        with self._condition:
+            return len(self._items)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def join(self, timeout: Optional[float]) -> None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def put(self, items: List[_WorkItem]) -> None:
+        """Queue all of an event's handler runs, or none of them; an event with more handlers than the queue holds
+        waits for the queue to empty. Once we are closed our workers may have exited, so we take no more"""
+        needed = min(len(items), self._options.queue_size)
+        with self._condition:
+            self._check_open()
+            if not self._has_room(needed):
+                if not self._options.block:
+                    self._reject()
+                deadline = None if self._options.timeout is None else time.monotonic() + self._options.timeout
+                while not self._has_room(needed):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._reject()
+                    self._condition.wait(remaining)
+                    self._check_open()
+            self._items.extend(items)
+            self._metrics.gauge("brightside_publish_queue_depth", len(self._items), self._labels)
+            self._condition.notify_all()
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise ConfigurationException("The async publisher has been shut down")
+
+    def _has_room(self, needed: int) -> bool:
+        return self._options.queue_size - len(self._items) >= needed
+
+    def _reject(self) -> None:
+        self._metrics.increment("brightside_publish_rejected_total", labels=self._labels)
+        raise PublishQueueFullException("The publish queue for {} is full".format(self._name))
+
+    def _run(self, item: _WorkItem) -> None:
+        handler, request, context, future = item
+        if not future.set_running_or_notify_cancel():
+            return
+        request_type = request.__class__.__name__
+        try:
+            with self._metrics.time("brightside_handler_seconds", {"request_type": request_type}):
+                context.run(handler, request)
+        except Exception as ex:
+            self._logger.exception("Handler for %s with id %s failed", request_type, request.id)
+            self._metrics.increment("brightside_publish_handler_errors_total", labels={"request_type": request_type})
+            future.set_exception(ex)
+        else:
+            future.set_result(None)
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._items and not self._closed:
+                    self._condition.wait()
+                if not self._items:
+                    return
+                item = self._items.popleft()
+                # a publish may be waiting for room
+                self._condition.notify_all()
+            self._run(item)
@@ -0,0 +1,171 @@
+"""
+File             : caching.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import time
+from collections import OrderedDict
+from threading import Event, Lock
+from typing import Any, Callable, Tuple
+
+from brightside.exceptions import ConfigurationException
+from brightside.handler import Request
+from brightside.metrics import Metrics, get_metrics
+from brightside.pipeline import NextStep, Step
+
+
+class CachingStep(Step):
+    """
+    Returns the result of an earlier request of the same type with the same cache_key, whilst it is younger than the
+    ttl, rather than running the rest of the pipeline; for query-style handlers, used with CommandProcessor.send, that
+    see the same parameters over and over. Requests with no cache_key always run. We keep up to max_entries results
+    for each request type, evicting the least recently used, so one busy type cannot push out the rest.
+    If a request misses whilst another with the same key is being handled, it waits for that result, or exception,
+    rather than running the handler too, so an expired entry does not send a stampede to the downstream; if that
+    handling stops without either, such as when its task is cancelled, one of the waiters runs the handler instead.
+    We do not keep a result from a handler that was running when we were cleared, as it may be from before the change.
+    We hand the same result to every caller, so callers must not change it
+    :param ttl: The seconds we reuse a result for
+    :param max_entries: The most results we keep for each request type
+    :param metrics: Where we count hits and misses, by request type
+    :param clock: What we read the time from, in seconds
+    """
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1000, metrics: Metrics = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        if ttl <= 0 or max_entries < 1:
+            raise ConfigurationException("A cache needs a positive ttl, and room for at least one entry, not a ttl of "
+                                         "{} and {} entries".format(ttl, max_entries))
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._metrics = metrics or get_metrics()
+        self._clock = clock
+        self._entries = {}
+        self._flights = {}
+        # bumped by each clear, so that we can tell a result was asked for before it
+        self._generation = 0
+        self._lock = Lock()
+
+    def clear(self, request_class: type = None) -> None:
+        """Forget the results we hold for a request type, or for every type, such as when the data behind them changes"""
+        with self._lock:
+            self._generation += 1
+            if request_class is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(request_class.__name__, None)
+
+    def handle(self, request: Request, next_step: NextStep) -> Any:
+        key = request.cache_key
+        if key is None:
+            return next_step(request)
+
+        request_type = request.__class__.__name__
+        while True:
+            with self._lock:
+                entries = self._entries.get(request_type)
+                entry = entries.get(key) if entries is not None else None
+                if entry is not None:
+                    expires, result = entry
+                    if expires > self._clock():
+                        entries.move_to_end(key)
+                        self._record("hits", request_type)
+                        return result
+                    del entries[key]
+                flight = self._flights.get((request_type, key))
+                if flight is None:
+                    flight = self._flights[(request_type, key)] = _Flight()
+                    generation = self._generation
+                    break
+
+            landed, result = flight.wait()
+            # if the flight was abandoned we try again, perhaps running the handler ourselves
+            if landed:
+                self._record("hits", request_type)
+                return result
+
+        self._record("misses", request_type)
+        try:
+            result = next_step(request)
+        except Exception as ex:
+            flight.fail(ex)
+            raise
+        else:
+            with self._lock:
+                # if we were cleared whilst the handler ran, its result may be from before the change
+                if generation == self._generation:
+                    self._store(request_type, key, result)
+            flight.succeed(result)
+            return result
+        finally:
+            # whatever stopped us, even a BaseException, must not leave those waiting on us waiting for ever
+            with self._lock:
+                del self._flights[(request_type, key)]
+            flight.abandon()
+
+    def _store(self, request_type: str, key: Any, result: Any) -> None:
+        entries = self._entries.get(request_type)
+        if entries is None:
+            entries = self._entries[request_type] = OrderedDict()
+        entries[key] = (self._clock() + self._ttl, result)
+        entries.move_to_end(key)
+        while len(entries) > self._max_entries:
+            entries.popitem(last=False)
+
+    def _record(self, outcome: str, request_type: str) -> None:
+        self._metrics.increment("brightside_cache_{}_total".format(outcome), labels={"request_type": request_type})
+
+
+class _Flight:
+    """The handling of a request that missed, which others with the same key wait on"""
+    def __init__(self) -> None:
+        self._done = Event()
+        self._landed = False
+        self._result = None  # type: Any
+        self._error = None  # type: Exception
+
+    def abandon(self) -> None:
+        """The handling stopped without a result or an exception we can hand on, such as when its task was cancelled"""
+        self._done.set()
+
+    def fail(self, error: Exception) -> None:
+        self._error = error
+        self._done.set()
+
+    def succeed(self, result: Any) -> None:
+        self._result = result
+        self._landed = True
+        self._done.set()
+
+    def wait(self) -> Tuple[bool, Any]:
+        """
+        :return: Whether the handling landed, with its result; if it was abandoned, the caller should try again
+        """
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._landed, self._result
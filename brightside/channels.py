@@ -30,11 +30,14 @@ THE SOFTWARE.
 """
 from enum import Enum
 from multiprocessing import Queue
+from queue import Empty
 from threading import Event
+from typing import Optional
 
 from brightside.exceptions import ChannelFailureException
-from brightside.messaging import BrightsideConsumer, BrightsideMessage
-from brightside.message_factory import create_quit_message
+from brightside.messaging import BrightsideConsumer, BrightsideMessage, BrightsideMessageType
+from brightside.message_factory import create_quit_message, create_rate_limit_message
+from brightside.metrics import Metrics, get_metrics
 
 
 class ChannelState(Enum):
@@ -62,13 +65,19 @@ class Channel:
     Uses BrightsideConsumer to be independent of the underlying implementation of the consumer i.e. rmq, redis, etc.
     It uses a buffer over the backing service queue, this allows us to insert control messages into the channel.
     We use control message to stop the consumption of messages from the channel
+    Control messages take priority over messages from the consumer, so we check the buffer before the consumer on
+    every receive. We don't trust empty() on the buffer for this, as it can report empty before a put from another
+    process has arrived
     """
-    def __init__(self, name: str, consumer: BrightsideConsumer, pipeline: Queue) -> None:
+    def __init__(self, name: str, consumer: BrightsideConsumer, pipeline: Queue, metrics: Metrics = None) -> None:
         self._consumer = consumer
         self._name = ChannelName(name)
         self._queue = pipeline
         self._state = ChannelState.initialized
+        self._quit_received = False
         self._cancel_heartbeat = None  # type: Event
+        self._metrics = metrics or get_metrics()
+        self._metric_labels = {"channel": name}
 
     def __len__(self):
         return self._queue.qsize()
@@ -76,6 +85,15 @@ class Channel:
     def acknowledge(self, message: BrightsideMessage):
         self._consumer.acknowledge(message)
 
+    def cancel(self) -> None:
+        """Stop the consumer from receiving new messages from the broker, but keep the connection so that we can
+        still acknowledge or requeue messages we have already received"""
+        self._consumer.cancel()
+
+    def resume(self) -> None:
+        """Start the consumer receiving new messages from the broker again, after a cancel"""
+        self._consumer.resume()
+
     def end(self) -> None:
         self._consumer.stop()
         self._state = ChannelState.stopped
@@ -95,10 +113,31 @@ class Channel:
         if self._state is ChannelState.initialized:
             self._state = ChannelState.started
 
-        if not self._queue.empty():
-            return self._queue.get(block=True, timeout=timeout)
-
-        return self._consumer.receive(timeout=timeout)
+        if self._metrics.enabled:
+            self._record_pipeline_depth()
+
+        # If we stopped ourselves, the quit message is on its way, so wait for it. Once it has come, we go back to the
+        # consumer, so that the pump can drain the messages it has already been sent
+        if self._state is ChannelState.stopping and not self._quit_received:
+            try:
+                message = self._queue.get(block=True, timeout=timeout)
+                if message.header.message_type == BrightsideMessageType.MT_QUIT:
+                    self._quit_received = True
+                return message
+            except Empty:
+                pass
+
+        try:
+            return self._queue.get_nowait()
+        except Empty:
+            return self._consumer.receive(timeout=timeout)
+
+    def _record_pipeline_depth(self) -> None:
+        try:
+            self._metrics.gauge("brightside_channel_pipeline_depth", self._queue.qsize(), self._metric_labels)
+        except NotImplementedError:
+            # qsize is not available on all platforms, i.e. macOS
+            pass
 
     @property
     def state(self) -> ChannelState:
@@ -111,8 +150,23 @@ class Channel:
         self._queue.put(create_quit_message())
         self._state = ChannelState.stopping
 
-    def requeue(self, message):
-        self._consumer.requeue(message)
+    def receive_control(self) -> Optional[BrightsideMessage]:
+        """A control message, such as quit, if one is waiting; we never wait for one, or read from the consumer"""
+        try:
+            return self._queue.get_nowait()
+        except Empty:
+            return None
+
+    def set_rate_limit(self, rate_limit: Optional[float], burst: int = None) -> None:
+        """Change the rate limit of the message pump reading this channel; a rate_limit of None removes it"""
+        self._queue.put(create_rate_limit_message(rate_limit, burst))
+
+    def requeue(self, message, delay: float = 0.0):
+        # consumers that predate delayed requeue only take the message
+        if delay > 0:
+            self._consumer.requeue(message, delay)
+        else:
+            self._consumer.requeue(message)
 
 
 
@@ -0,0 +1,157 @@
+"""
+File             : claim_check.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import os
+import tempfile
+from abc import ABCMeta, abstractmethod
+from uuid import UUID, uuid4
+
+from brightside.exceptions import ConfigurationException, DeferMessageException, MessagingException
+from brightside.messaging import BrightsideMessage, BrightsideMessageBody, BrightsideMessageHeader, \
+    BrightsideMessageStore, BrightsideMessageType
+from brightside.metrics import Metrics, get_metrics
+
+CLAIM_CHECK_HEADER = "x-claim-check"
+CLAIM_CHECK_TOPIC = "brightside.claim_check"
+
+
+class ClaimCheckStore(metaclass=ABCMeta):
+    """Where a claim check keeps the bodies too large to send through the broker, until a consumer claims them"""
+    @abstractmethod
+    def check_in(self, body: str) -> str:
+        """
+        :return: The reference a consumer claims the body with
+        """
+        pass
+
+    @abstractmethod
+    def claim(self, reference: str) -> str:
+        pass
+
+
+class MessageStoreClaimCheckStore(ClaimCheckStore):
+    """
+    Keeps bodies in a message store, such as the one a CommandProcessor stores the messages it posts in, as messages of
+    their own on the claim check topic, so that producer and consumer need share nothing but the database
+    """
+    def __init__(self, message_store: BrightsideMessageStore) -> None:
+        self._message_store = message_store
+
+    def check_in(self, body: str) -> str:
+        claim_id = uuid4()
+        self._message_store.add(BrightsideMessage(
+            BrightsideMessageHeader(claim_id, CLAIM_CHECK_TOPIC, BrightsideMessageType.MT_DOCUMENT),
+            BrightsideMessageBody(body)))
+        return str(claim_id)
+
+    def claim(self, reference: str) -> str:
+        message = self._message_store.get_message(UUID(reference))
+        # a store that does not have the message gives us an empty one
+        if message.header.message_type == BrightsideMessageType.MT_NONE:
+            raise MessagingException("There is no body in the message store for the claim check {}".format(reference))
+        return message.body.value
+
+
+class FileSystemClaimCheckStore(ClaimCheckStore):
+    """
+    Keeps bodies as files in a directory, for local use, or where producer and consumer share a file system. We never
+    delete them; that is for whatever cleans up the directory
+    :param directory: Where we keep the bodies; we create it if it does not exist
+    """
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def check_in(self, body: str) -> str:
+        reference = str(uuid4())
+        # write then rename, so a consumer never reads half a body
+        fd, temporary_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as temporary_file:
+            temporary_file.write(body.encode())
+        os.replace(temporary_path, self._path(reference))
+        return reference
+
+    def claim(self, reference: str) -> str:
+        try:
+            with open(self._path(reference), "rb") as body_file:
+                return body_file.read().decode()
+        except FileNotFoundError:
+            raise MessagingException("There is no body in {} for the claim check {}".format(self._directory, reference))
+
+    def _path(self, reference: str) -> str:
+        # a reference is a UUID, so one read from the wire cannot point outside our directory
+        return os.path.join(self._directory, str(UUID(reference)))
+
+
+class ClaimCheck:
+    """
+    Keeps message bodies of threshold bytes or more out of the broker, so that our largest messages do not slow the
+    broker down for everyone else. When we post, we check the body into a store, and send the message with an empty
+    body and a header that refers to it; the message pump claims the body back before it translates the message.
+    Give the same ClaimCheck, or one with a store that can see the same bodies, to the CommandProcessor that posts and
+    the one a Dispatcher's pumps use. If we cannot claim a body, as the store is unavailable, we defer the message, so
+    that the pump requeues it to try again, rather than lose it
+    :param store: Where we keep the bodies
+    :param threshold: The smallest body, in bytes, that we keep out of the broker
+    :param defer_delay: The seconds to ask for a message whose body we could not claim to be requeued for
+    """
+    def __init__(self, store: ClaimCheckStore, threshold: int = 262144, metrics: Metrics = None,
+                 defer_delay: float = 5.0) -> None:
+        if threshold < 0:
+            raise ConfigurationException("The claim check threshold cannot be negative, not {}".format(threshold))
+        self._store = store
+        self._threshold = threshold
+        self._defer_delay = defer_delay
+        self._metrics = metrics or get_metrics()
+
+    def check_in(self, message: BrightsideMessage) -> None:
+        """Swaps the body of a message at or over the threshold for a reference to it in the store"""
+        if len(message.body.bytes) < self._threshold:
+            return
+        with self._metrics.time("brightside_claim_check_in_seconds", {"topic": message.header.topic}):
+            reference = self._store.check_in(message.body.value)
+        if message.header.bag is None:
+            message.header.bag = {}
+        message.header.bag[CLAIM_CHECK_HEADER] = reference
+        message.body = BrightsideMessageBody("", message.body.body_type)
+
+    def claim(self, message: BrightsideMessage) -> None:
+        """Swaps the body of a message back from the store, if it was checked in"""
+        reference = message.header.bag.get(CLAIM_CHECK_HEADER) if message.header.bag else None
+        if reference is None:
+            return
+        with self._metrics.time("brightside_claim_check_claim_seconds", {"topic": message.header.topic}):
+            try:
+                body = self._store.claim(reference)
+            except Exception as ex:
+                raise DeferMessageException("Could not claim the body for claim check {}: {}".format(reference, ex),
+                                            delay=self._defer_delay) from ex
+        message.body = BrightsideMessageBody(body, message.body.body_type)
+        del message.header.bag[CLAIM_CHECK_HEADER]
@@ -28,12 +28,22 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 ***********************************************************************
 """
-from typing import Optional
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, List, Optional, Union
+from uuid import uuid4
 
-from brightside.exceptions import ConfigurationException
+from brightside.async_publisher import AsyncPublisher
+from brightside.claim_check import ClaimCheck
+from brightside.exceptions import ConfigurationException, MessagingException, RequestTimeoutException
 from brightside.registry import Registry, MessageMapperRegistry
-from brightside.messaging import BrightsideMessageStore, BrightsideProducer
-from brightside.handler import Request
+from brightside.messaging import BrightsideInbox, BrightsideMessage, BrightsideMessageStore, BrightsideProducer, \
+    BrightsideReplyReceiver
+from brightside.handler import BatchHandler, Call, Reply, Request
+from brightside.metrics import Metrics, get_metrics
+from brightside.partitioning import Partitioner
+from brightside.pipeline import NextStep, Step, compose
+from brightside.policies import PolicyRegistry
+from brightside.tracing import Tracer, get_tracer, inject
 
 
 class CommandProcessor:
@@ -45,24 +55,105 @@ class CommandProcessor:
                  registry: Optional[Registry]=None,
                  message_mapper_registry: Optional[MessageMapperRegistry]=None,
                  message_store: Optional[BrightsideMessageStore]=None,
-                 producer: Optional[BrightsideProducer]=None) -> None:
+                 producer: Optional[BrightsideProducer]=None,
+                 metrics: Optional[Metrics]=None,
+                 tracer: Optional[Tracer]=None,
+                 partitioner: Optional[Partitioner]=None,
+                 reply_receiver: Optional[BrightsideReplyReceiver]=None,
+                 async_publisher: Optional[AsyncPublisher]=None,
+                 policy_registry: Optional[PolicyRegistry]=None,
+                 inbox: Optional[BrightsideInbox]=None,
+                 claim_check: Optional[ClaimCheck]=None) -> None:
+        """
+        :param async_publisher: Runs the handlers for publish_async. Configure it to give event types pools of their
+            own; if None, we use one with the default options
+        :param policy_registry: The policies, such as retry and circuit breakers, that use_policy adds to pipelines
+        :param inbox: Where the message pumps of a Dispatcher that use us record the messages they have handled, so
+            that they ack a duplicate without handling it again
+        :param claim_check: If set, we keep large bodies of messages we post out of the broker, and the message pumps
+            of a Dispatcher that use us claim them back
+        """
         self._registry = registry
         self._message_mapper_registry = message_mapper_registry
         self._message_store = message_store
         self._producer = producer
+        self._metrics = metrics or get_metrics()
+        self._tracer = tracer or get_tracer()
+        self._partitioner = partitioner
+        self._reply_receiver = reply_receiver
+        self._pipelines = {}
+        self._pipelines_version = None  # type: int
+        # cheap to create, as it starts no workers until we publish
+        self._async_publisher = async_publisher or AsyncPublisher(metrics=self._metrics)
+        self._policy_registry = policy_registry
+        self._inbox = inbox
+        self._claim_check = claim_check
+
+    @property
+    def claim_check(self) -> Optional[ClaimCheck]:
+        return self._claim_check
 
-    def send(self, request: Request) -> None:
+    @property
+    def inbox(self) -> Optional[BrightsideInbox]:
+        return self._inbox
+
+    def send(self, request: Request) -> Any:
         """
         Dispatches a request. Expects one and one only target handler
         :param request: The request to dispatch
-        :return: None, will throw a ConfigurationException if more than one handler factor is registered for the command
+        :return: Whatever the handler returns, for query-style handlers; will throw a ConfigurationException if more
+            than one handler factor is registered for the command
         """
 
-        handler_factories = self._registry.lookup(request)
+        pipelines = self._pipelines_for(request)
+        if len(pipelines) != 1:
+            raise ConfigurationException("There is no handler registered for this request")
+        with self._metrics.time("brightside_handler_seconds", {"request_type": request.__class__.__name__}):
+            return pipelines[0](request)
+
+    def send_batch(self, requests: List[Request]) -> List[Optional[Exception]]:
+        """
+        Dispatches many requests of one type, each to the one handler registered for them. If that is a BatchHandler,
+        and no steps are registered for the requests, we hand it the whole batch at once; steps run around one request,
+        so otherwise we send the requests one by one, through their pipeline
+        :param requests: The requests to dispatch, all of the same type
+        :return: An outcome for each request, in the same order: None if it succeeded, or the exception it failed with;
+            will throw a ConfigurationException if the requests are of more than one type, or do not have one handler
+        """
+        if not requests:
+            return []
+        request_type = requests[0].__class__
+        if any(request.__class__ is not request_type for request in requests):
+            raise ConfigurationException("A batch must hold requests of one type")
+
+        handler_factories = self._registry.lookup(requests[0])
         if len(handler_factories) != 1:
             raise ConfigurationException("There is no handler registered for this request")
-        handler = handler_factories[0]()
-        handler.handle(request)
+
+        handler = handler_factories[0]() if not self._registry.steps_for(requests[0]) else None
+        if isinstance(handler, BatchHandler):
+            with self._metrics.time("brightside_batch_handler_seconds", {"request_type": request_type.__name__}):
+                try:
+                    outcomes = handler.handle_batch(requests)
+                except ConfigurationException:
+                    raise
+                except Exception as ex:
+                    return [ex] * len(requests)
+            if len(outcomes) != len(requests):
+                raise ConfigurationException("{} returned {} outcomes for a batch of {} requests".format(
+                    handler.__class__.__name__, len(outcomes), len(requests)))
+            return outcomes
+
+        outcomes = []  # type: List[Optional[Exception]]
+        for request in requests:
+            try:
+                self.send(request)
+                outcomes.append(None)
+            except ConfigurationException:
+                raise
+            except Exception as ex:
+                outcomes.append(ex)
+        return outcomes
 
     def publish(self, request: Request) -> None:
         """
@@ -70,10 +161,67 @@ class CommandProcessor:
         :param request: The request to dispatch
         :return: None.
         """
-        handler_factories = self._registry.lookup(request)
-        for factory in handler_factories:
-            handler = factory()
-            handler.handle(request)
+        for pipeline in self._pipelines_for(request):
+            with self._metrics.time("brightside_handler_seconds", {"request_type": request.__class__.__name__}):
+                pipeline(request)
+
+    def add_step(self, step: Step, request_class: Optional[type]=None) -> None:
+        """
+        Add a step to the pipeline that runs around handlers; see Registry.add_step
+        :param step: The step to add
+        :param request_class: The request type to run the step for; if None, we run it for all requests
+        """
+        if self._registry is None:
+            raise ConfigurationException("Command Processor requires a Registry to add a step to its pipeline")
+        self._registry.add_step(step, request_class)
+
+    def call(self, request: Call, timeout: float,
+             reply_mapper: Optional[Callable[[BrightsideMessage], Request]]=None) -> Union[Request, BrightsideMessage]:
+        """
+        Posts a request over middleware, and waits for the reply. Many calls, from many threads, can be in flight at
+        once; they share the one reply queue of our reply receiver
+        :param request: The request to dispatch
+        :param timeout: The seconds to wait for the reply; we raise RequestTimeoutException once they pass
+        :param reply_mapper: Maps the reply message to a reply; if None, we return the reply message
+        :return: The reply
+        """
+        if self._reply_receiver is None:
+            raise ConfigurationException("Command Processor requires a BrightsideReplyReceiver to make a call")
+
+        correlation_id = None
+        future = None  # type: Future
+
+        def _address_reply(message: BrightsideMessage) -> None:
+            nonlocal correlation_id, future
+            if message.header.correlation_id is None:
+                message.header.correlation_id = uuid4()
+            correlation_id = message.header.correlation_id
+            message.header.reply_to = self._reply_receiver.reply_to
+            # we wait before we send, so that we cannot miss a quick reply
+            future = self._reply_receiver.register(correlation_id)
+
+        try:
+            self._post(request, _address_reply)
+            reply = future.result(timeout)
+        except FutureTimeoutError:
+            raise RequestTimeoutException("No reply to {} with correlation id {} within {} seconds".format(
+                request.__class__.__name__, correlation_id, timeout))
+        finally:
+            if correlation_id is not None:
+                self._reply_receiver.cancel(correlation_id)
+
+        return reply_mapper(reply) if reply_mapper is not None else reply
+
+    def publish_async(self, request: Request) -> List[Future]:
+        """
+        Dispatches a request to zero or more target handlers, as publish does, but runs the handlers on the worker
+        threads of our async publisher and returns without waiting for them. Handlers run at the same time as each
+        other, and a handler that raises does not stop the others. If the publisher's queue is full we wait for room,
+        or raise PublishQueueFullException, as it is configured for the request type
+        :param request: The request to dispatch
+        :return: A future for each handler, which completes when it has run, or fails with what it raised
+        """
+        return self._async_publisher.submit(request, self._pipelines_for(request))
 
     def post(self, request: Request) -> None:
         """
@@ -82,15 +230,72 @@ class CommandProcessor:
         :param request: The request to dispatch
         :return: None
         """
+        self._post(request)
 
+    def reply(self, call: Call, reply: Reply) -> None:
+        """
+        Sends the reply to a call back to the caller. Replies are only of use to a caller that is still waiting, so
+        we do not add them to the message store
+        :param call: The call we are replying to, as received by its handler
+        :param reply: The reply; we look up its message mapper as we would for a post
+        """
         if self._producer is None:
-            raise ConfigurationException("Command Processor requires a BrightsideProducer to post to a Broker")
+            raise ConfigurationException("Command Processor requires a BrightsideProducer to reply")
         if self._message_mapper_registry is None:
-            raise ConfigurationException("Command Processor requires a BrightsideMessage Mapper Registry to post to a Broker")
+            raise ConfigurationException("Command Processor requires a BrightsideMessage Mapper Registry to reply")
+        if call.reply_address is None:
+            raise MessagingException("The call {} has no reply address, was it sent with call?".format(call.id))
 
-        message_mapper = self._message_mapper_registry.lookup(request)
-        message = message_mapper(request)
-        self._message_store.add(message)
+        message = self._message_mapper_registry.lookup(reply)(reply)
+        message.header.topic = call.reply_address.topic
+        message.header.correlation_id = call.reply_address.correlation_id
         self._producer.send(message)
 
+    def use_policy(self, name: str, request_class: Optional[type]=None) -> None:
+        """
+        Add a policy from our policy registry to the pipeline that runs around handlers. Handlers that use a policy of
+        the same name share it, and so share its state, such as whether a circuit breaker is open
+        :param name: The name of the policy
+        :param request_class: The request type to run the policy for; if None, we run it for all requests
+        """
+        if self._policy_registry is None:
+            raise ConfigurationException("Command Processor requires a PolicyRegistry to use a policy")
+        self.add_step(self._policy_registry.lookup(name), request_class)
+
+    def _pipelines_for(self, request: Request) -> List[NextStep]:
+        """
+        The steps and handler for each handler of the request, composed into one callable. We compose them the first
+        time we see a request type, and again only if the registry changes
+        """
+        if self._pipelines_version != self._registry.version:
+            self._pipelines = {}
+            self._pipelines_version = self._registry.version
+        key = request.__class__.__name__
+        pipelines = self._pipelines.get(key)
+        if pipelines is None:
+            steps = self._registry.steps_for(request)
+            pipelines = self._pipelines[key] = [compose(steps, factory) for factory in self._registry.lookup(request)]
+        return pipelines
+
+    def _post(self, request: Request, prepare: Optional[Callable[[BrightsideMessage], None]]=None) -> None:
+        if self._producer is None:
+            raise ConfigurationException("Command Processor requires a BrightsideProducer to post to a Broker")
+        if self._message_mapper_registry is None:
+            raise ConfigurationException("Command Processor requires a BrightsideMessage Mapper Registry to post to a Broker")
 
+        message_mapper = self._message_mapper_registry.lookup(request)
+        with self._tracer.start_span("brightside.post", attributes={"request_type": request.__class__.__name__}) as span:
+            message = message_mapper(request)
+            if prepare is not None:
+                prepare(message)
+            if self._partitioner is not None:
+                self._partitioner.partition(request, message)
+            if span.context is not None:
+                if message.header.bag is None:
+                    message.header.bag = {}
+                inject(span.context, message.header.bag)
+                span.set_attribute("topic", message.header.topic)
+            if self._claim_check is not None:
+                self._claim_check.check_in(message)
+            self._message_store.add(message)
+            self._producer.send(message)
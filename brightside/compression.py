@@ -0,0 +1,140 @@
+"""
+File             : compression.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import lzma
+import zlib
+from abc import ABCMeta, abstractmethod
+from typing import Optional, Tuple
+
+from brightside.exceptions import ConfigurationException, MessagingException
+
+
+class Codec(metaclass=ABCMeta):
+    """
+    A way to compress message bodies. A consumer finds the codec to decompress a body with by the name the producer
+    records on the message, so register your own codecs, with register_codec, in both
+    """
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        pass
+
+    @abstractmethod
+    def compress(self, body: bytes) -> bytes:
+        pass
+
+    @abstractmethod
+    def decompress(self, body: bytes) -> bytes:
+        pass
+
+
+class ZlibCodec(Codec):
+    """Quick, with a good ratio for JSON; the default"""
+    def __init__(self, level: int = 6) -> None:
+        self._level = level
+
+    @property
+    def name(self) -> str:
+        return "zlib"
+
+    def compress(self, body: bytes) -> bytes:
+        return zlib.compress(body, self._level)
+
+    def decompress(self, body: bytes) -> bytes:
+        return zlib.decompress(body)
+
+
+class LzmaCodec(Codec):
+    """Slower than zlib, for a better ratio, where the bandwidth or storage saved is worth the CPU"""
+    def __init__(self, preset: int = 6) -> None:
+        self._preset = preset
+
+    @property
+    def name(self) -> str:
+        return "lzma"
+
+    def compress(self, body: bytes) -> bytes:
+        return lzma.compress(body, preset=self._preset)
+
+    def decompress(self, body: bytes) -> bytes:
+        return lzma.decompress(body)
+
+
+_codecs = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """Make a codec available, by its name, to decompress the bodies it compressed"""
+    _codecs[codec.name] = codec
+
+
+def lookup_codec(name: str) -> Codec:
+    """The codec to decompress a body with, by the name the producer recorded on the message"""
+    codec = _codecs.get(name)
+    if codec is None:
+        raise MessagingException("There is no codec registered for the content encoding {}".format(name))
+    return codec
+
+
+register_codec(ZlibCodec())
+register_codec(LzmaCodec())
+
+
+class Compression:
+    """
+    Compresses message bodies of threshold bytes or more with a codec, for a producer. Compressing a small body costs
+    more CPU than it saves on the wire, so we leave those, and any body the codec cannot make smaller, as they are
+    :param codec: What we compress with; defaults to zlib
+    :param threshold: The smallest body, in bytes, that we compress
+    """
+    def __init__(self, codec: Codec = None, threshold: int = 16384) -> None:
+        if threshold < 0:
+            raise ConfigurationException("The compression threshold cannot be negative, not {}".format(threshold))
+        self._codec = codec or ZlibCodec()
+        self._threshold = threshold
+
+    @property
+    def codec(self) -> Codec:
+        return self._codec
+
+    @property
+    def threshold(self) -> int:
+        return self._threshold
+
+    def compress(self, body: bytes) -> Tuple[bytes, Optional[str]]:
+        """
+        :return: The body to send, and the name of the codec that compressed it, or None if we left it as it was
+        """
+        if len(body) < self._threshold:
+            return body, None
+        compressed = self._codec.compress(body)
+        if len(compressed) >= len(body):
+            return body, None
+        return compressed, self._codec.name
@@ -28,20 +28,94 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 ***********************************************************************
 """
+import copy
 import logging
+import math
+import multiprocessing
+import os
 import time
 from enum import Enum
-from multiprocessing import Event, Process
-from threading import Thread
-from typing import Callable, Dict
+from multiprocessing import Event, Process, Queue
+from multiprocessing.context import BaseContext
+from queue import Empty
+from threading import Event as ThreadEvent, Lock, Thread
+from typing import Callable, Dict, List, Optional
 
 from brightside.channels import Channel
 from brightside.command_processor import CommandProcessor, Request
 from brightside.connection import Connection
 from brightside.exceptions import ConfigurationException, MessagingException
-from brightside.message_factory import create_quit_message
-from brightside.message_pump import MessagePump
+from brightside.message_factory import create_quit_message, create_rate_limit_message
+from brightside.message_pump import MessagePump, PumpLiveness
 from brightside.messaging import BrightsideConsumerConfiguration, BrightsideConsumer, BrightsideMessage
+from brightside.metrics import InMemoryMetrics, merge_snapshots, set_metrics, to_prometheus_text
+from brightside.partitioning import partition_configuration
+
+
+class PerformerHealth:
+    """
+    What the supervisor knows about the health of the performer for a channel: how often we have had to restart it
+    and how long it has been up since we last started it
+    """
+    def __init__(self, channel_name: str) -> None:
+        self._channel_name = channel_name
+        self._restarts = 0
+        self._consecutive_failures = 0
+        self._started_at = None  # type: float
+        self._restart_at = None  # type: float
+        self._is_alive = False
+
+    @property
+    def channel_name(self) -> str:
+        return self._channel_name
+
+    @property
+    def consecutive_failures(self) -> int:
+        return self._consecutive_failures
+
+    @property
+    def is_alive(self) -> bool:
+        return self._is_alive
+
+    @property
+    def restarts(self) -> int:
+        return self._restarts
+
+    @property
+    def restart_at(self) -> float:
+        """When we will next try to restart a failed performer, None if it has not failed"""
+        return self._restart_at
+
+    @property
+    def uptime(self) -> float:
+        """Seconds since the performer was last started, 0 if it is not running"""
+        if not self._is_alive or self._started_at is None:
+            return 0.0
+        return time.time() - self._started_at
+
+    def failed(self, backoff: float, max_backoff: float) -> None:
+        self._is_alive = False
+        self._consecutive_failures += 1
+        delay = min(backoff * (2 ** (self._consecutive_failures - 1)), max_backoff)
+        self._restart_at = time.time() + delay
+
+    def restarted(self) -> None:
+        self._restarts += 1
+        self.started()
+
+    def started(self) -> None:
+        self._is_alive = True
+        self._started_at = time.time()
+        self._restart_at = None
+
+    def stable(self, window: float) -> None:
+        """Forgive earlier failures once we have stayed up for the window, so backoff starts from scratch"""
+        if self._is_alive and self.uptime >= window:
+            self._consecutive_failures = 0
+
+    def stopped(self) -> None:
+        self._is_alive = False
+        self._restart_at = None
 
 
 class Performer:
@@ -52,7 +126,10 @@ class Performer:
                  consumer_factory: Callable[[Connection, BrightsideConsumerConfiguration, logging.Logger], BrightsideConsumer],
                  command_processor_factory: Callable[[str], CommandProcessor],
                  mapper_func: Callable[[BrightsideMessage], Request],
-                 logger: logging.Logger=None
+                 logger: logging.Logger=None,
+                 context: BaseContext=None,
+                 metrics_queue: Queue=None,
+                 metrics_interval: float=5.0
                  ) -> None:
         """
         Each Performer abstracts a process running a message pump.
@@ -67,6 +144,12 @@ class Performer:
         :param command_processor_factory: We need a user supplied callback to create a commandprocessor with
             subscribers, policies, outgoing tasks queues etc.
         :param mapper_func: We need a user supplied callback to map on the wire messages to requests
+        :param context: The multiprocessing context we use to start the process, which determines the start method
+            i.e. fork, forkserver or spawn. With anything but fork, our parameters must be pickled. Defaults to the
+            default context
+        :param metrics_queue: If set, the performer collects metrics and sends snapshots of them to the supervisor
+            over this queue
+        :param metrics_interval: How often, in seconds, the performer sends a snapshot of its metrics
         """
         # TODO: The paramater needs to be a connection, not an AramaConnection as we can't decide to create an Arame Consumer
         # here. Where do we make that choice?
@@ -78,30 +161,78 @@ class Performer:
         self._command_processor_factory = command_processor_factory
         self._mapper_func = mapper_func
         self._logger = logger or logging.getLogger(__name__)
+        self._context = context or multiprocessing.get_context()
+        self._metrics_queue = metrics_queue
+        self._metrics_interval = metrics_interval
+        self._liveness = None  # type: PumpLiveness
+        self._process = None  # type: Process
+        self._started_event = None  # type: Event
+        self._health = PerformerHealth(channel_name)
+
+    @property
+    def channel_name(self) -> str:
+        return self._channel_name
+
+    @property
+    def health(self) -> PerformerHealth:
+        return self._health
+
+    @property
+    def is_ready(self) -> bool:
+        """Has the message pump from the last call to run signalled that it has started"""
+        return self._started_event is not None and self._started_event.is_set()
+
+    @property
+    def liveness(self) -> PumpLiveness:
+        """The liveness of the message pump from the last call to run, None if we have never run"""
+        return self._liveness
+
+    def set_rate_limit(self, rate_limit: Optional[float], burst: int=None) -> None:
+        """Change the rate limit of our message pump, now if it is running, and whenever we restart it"""
+        self._consumer_configuration.set_rate_limit(rate_limit, burst)
+        # the configuration decides the burst if we were not given one
+        self._consumer_configuration.pipeline.put(create_rate_limit_message(self._consumer_configuration.rate_limit,
+                                                                            self._consumer_configuration.burst))
 
     def stop(self) -> None:
         self._consumer_configuration.pipeline.put(create_quit_message())
 
     def run(self, started_event: Event) -> Process:
+        """
+        Starts the process for the message pump. Does not wait for the pump to start, so that a supervisor can
+        start many performers at once; wait on the started event, or check is_ready, for that
+        :param started_event: Set by the message pump once it is running
+        :return: The process we started
+        """
 
-        p = Process(target=_sub_process_main, args=(
+        self._liveness = PumpLiveness(self._context)
+
+        p = self._context.Process(target=_sub_process_main, args=(
             started_event,
             self._channel_name,
             self._connection,
             self._consumer_configuration,
             self._consumer_factory,
             self._command_processor_factory,
-            self._mapper_func))
+            self._mapper_func,
+            self._liveness,
+            self._metrics_queue,
+            self._metrics_interval))
 
         self._logger.debug("Starting worker process for channel: %s on exchange %s on server %s",
                            self._channel_name, self._connection.exchange, self._connection.amqp_uri)
 
         p.start()
-
-        started_event.wait(timeout=1)
+        self._process = p
+        self._started_event = started_event
 
         return p
 
+    @property
+    def process(self) -> Process:
+        """The process from the last call to run, None if we have never run"""
+        return self._process
+
 
 def _sub_process_main(started_event: Event,
                       channel_name: str,
@@ -109,7 +240,10 @@ def _sub_process_main(started_event: Event,
                       consumer_configuration: BrightsideConsumerConfiguration,
                       consumer_factory: Callable[[Connection, BrightsideConsumerConfiguration, logging.Logger], BrightsideConsumer],
                       command_processor_factory: Callable[[str], CommandProcessor],
-                      mapper_func: Callable[[BrightsideMessage], Request]) -> None:
+                      mapper_func: Callable[[BrightsideMessage], Request],
+                      liveness: PumpLiveness = None,
+                      metrics_queue: Queue = None,
+                      metrics_interval: float = 5.0) -> None:
     """
     This is the main method for the sub=process, everything we need to create the message pump and
     channel it needs to be passed in as parameters that can be pickled as when we run they will be serialized
@@ -125,21 +259,49 @@ def _sub_process_main(started_event: Event,
     :param command_processor_factory: Callback to  register subscribers, policies, and task queues then build command
         processor. User code that provides us with their requests and handlers
     :param mapper_func: We need to map between messages on the wire and our handlers
+    :param liveness: Shared with the supervisor, so that the pump can tell it that it is still alive
+    :param metrics_queue: If set, we collect metrics for this process and send snapshots to the supervisor over it
+    :param metrics_interval: How often, in seconds, we send a snapshot of our metrics
     :return:
     """
 
     logger = logging.getLogger(__name__)
+
+    # Set up metrics first, so that the consumer and command processor the user creates pick them up
+    metrics = None
+    metrics_stopped = None
+    if metrics_queue is not None:
+        metrics = InMemoryMetrics()
+        set_metrics(metrics)
+        metrics_stopped = ThreadEvent()
+        Thread(target=_send_metrics, args=(channel_name, metrics, metrics_queue, metrics_interval, metrics_stopped),
+               daemon=True).start()
     consumer = consumer_factory(connection, consumer_configuration, logger)
     channel = Channel(name=channel_name, consumer=consumer, pipeline=consumer_configuration.pipeline)
 
     # TODO: Fix defaults that need passed in config values
     command_processor = command_processor_factory(channel_name)
     message_pump = MessagePump(command_processor=command_processor, channel=channel, mapper_func=mapper_func,
-                               timeout=500, unacceptable_message_limit=None, requeue_count=None)
+                               timeout=500, unacceptable_message_limit=None, requeue_count=None,
+                               liveness=liveness, drain_timeout=consumer_configuration.drain_timeout,
+                               rate_limit=consumer_configuration.rate_limit, burst=consumer_configuration.burst,
+                               inbox=command_processor.inbox, batch_size=consumer_configuration.batch_size,
+                               batch_linger=consumer_configuration.batch_linger,
+                               claim_check=command_processor.claim_check)
 
     logger.debug("Starting the message pump for %s", channel_name)
     message_pump.run(started_event)
 
+    if metrics is not None:
+        metrics_stopped.set()
+        metrics_queue.put(((channel_name, os.getpid()), metrics.snapshot()))
+
+
+def _send_metrics(channel_name: str, metrics: InMemoryMetrics, metrics_queue: Queue, interval: float,
+                  stopped: ThreadEvent) -> None:
+    while not stopped.wait(interval):
+        metrics_queue.put(((channel_name, os.getpid()), metrics.snapshot()))
+
 
 class ConsumerConfiguration:
     def __init__(self,
@@ -147,7 +309,10 @@ class ConsumerConfiguration:
                  consumer: BrightsideConsumerConfiguration,
                  consumer_factory: Callable[[Connection, BrightsideConsumerConfiguration, logging.Logger], BrightsideConsumer],
                  command_processor_factory: Callable[[str], CommandProcessor],
-                 mapper_func: Callable[[BrightsideMessage], Request]) -> None:
+                 mapper_func: Callable[[BrightsideMessage], Request],
+                 performers: int = 1,
+                 autoscale: 'AutoscalePolicy' = None,
+                 partitions: int = None) -> None:
         """
         The configuration parameters for one consumer - can create one or more performers from this, each of which is
         a message pump reading from a queue
@@ -156,12 +321,33 @@ class ConsumerConfiguration:
         :param consumer_factory: A factory to create a consumer to read from a broker, a given implementation i.e. arame
         the command processor factory creates a command processor configured for a pipeline
         :param mapper_func: Maps between messages on the queue and requests (commnands/events)
+        :param performers: The number of performers, competing consumers of the queue, to start for this consumer
+        :param autoscale: If set, the dispatcher will vary the number of performers at runtime, within its bounds
+        :param partitions: If set, the producer partitions this consumer's routing key with a Partitioner, and we
+            run one performer for each partition, reading that partition's queue, so that we handle each key in order.
+            The number of performers is then the number of partitions, and cannot be scaled
         """
+        if performers < 0:
+            raise ConfigurationException("The number of performers for a consumer cannot be negative")
+        if partitions is not None:
+            if partitions < 1:
+                raise ConfigurationException("A partitioned consumer must have at least one partition")
+            if autoscale is not None:
+                raise ConfigurationException("A partitioned consumer has one performer per partition, so cannot autoscale")
+            performers = partitions
+
         self._connection = connection
         self._consumer = consumer
         self._consumer_factory = consumer_factory
         self._command_processor_factory = command_processor_factory
         self._mapper_func = mapper_func
+        self._performers = performers
+        self._autoscale = autoscale
+        self._partitions = partitions
+
+    @property
+    def autoscale(self) -> 'AutoscalePolicy':
+        return self._autoscale
 
     @property
     def connection(self) -> Connection:
@@ -183,6 +369,77 @@ class ConsumerConfiguration:
     def mapper_func(self) -> Callable[[BrightsideMessage], Request]:
         return self._mapper_func
 
+    @property
+    def partitions(self) -> int:
+        return self._partitions
+
+    @property
+    def performers(self) -> int:
+        return self._performers
+
+
+class AutoscalePolicy:
+    """
+    How the dispatcher should scale the performers for a channel at runtime. We scale out when the queue is deeper
+    than our performers can work through, or when our message pumps are busy, and we scale in when the pumps are idle
+    and the queue is shallow. We wait for a cool down after each change to avoid flapping.
+    """
+    def __init__(self,
+                 min_performers: int = 1,
+                 max_performers: int = 4,
+                 messages_per_performer: int = 100,
+                 queue_depth_func: Callable[[Connection, BrightsideConsumerConfiguration], int] = None,
+                 scale_out_utilisation: float = 0.8,
+                 scale_in_utilisation: float = 0.2,
+                 interval: float = 5.0,
+                 cooldown: float = 30.0) -> None:
+        """
+        :param min_performers: We will never scale in below this number of performers
+        :param max_performers: We will never scale out beyond this number of performers
+        :param messages_per_performer: The queue depth we expect a single performer to keep up with
+        :param queue_depth_func: Returns the number of messages waiting on the queue, i.e. arame.gateway.queue_depth.
+            If None, we scale on utilisation alone
+        :param scale_out_utilisation: Add a performer when the average pump spends more than this fraction of its
+            time handling messages
+        :param scale_in_utilisation: Remove a performer when the average pump spends less than this fraction of its
+            time handling messages
+        :param interval: Seconds between checks of queue depth and utilisation
+        :param cooldown: Seconds to wait after scaling before we consider scaling again
+        """
+        if min_performers < 0 or max_performers < min_performers:
+            raise ConfigurationException("An autoscale policy needs 0 <= min_performers <= max_performers")
+
+        self.min_performers = min_performers
+        self.max_performers = max_performers
+        self.messages_per_performer = messages_per_performer
+        self.queue_depth_func = queue_depth_func
+        self.scale_out_utilisation = scale_out_utilisation
+        self.scale_in_utilisation = scale_in_utilisation
+        self.interval = interval
+        self.cooldown = cooldown
+
+    def desired_performers(self, current: int, queue_depth: int = None, utilisation: float = None) -> int:
+        """
+        The number of performers we want, given what we observed
+        :param current: The number of performers running now
+        :param queue_depth: The number of messages waiting on the queue, None if unknown
+        :param utilisation: The average fraction of time our pumps spent handling messages, None if unknown
+        :return: The number of performers we want, within our bounds
+        """
+        desired = current
+        by_depth = math.ceil(queue_depth / self.messages_per_performer) if queue_depth is not None else None
+
+        if by_depth is not None and by_depth > current:
+            desired = by_depth
+        elif utilisation is not None and utilisation >= self.scale_out_utilisation:
+            desired = current + 1
+        elif (utilisation is None or utilisation <= self.scale_in_utilisation) and \
+                (by_depth is None or by_depth < current) and \
+                (utilisation is not None or by_depth is not None):
+            desired = current - 1
+
+        return max(self.min_performers, min(self.max_performers, desired))
+
 
 class DispatcherState(Enum):
     ds_awaiting = 0,
@@ -196,7 +453,9 @@ class Dispatcher:
     """
     The dispatcher orchestrates the creation of consumers, where a consumer is the sub-process that runs a message pump
     to consumer messages from a given channel and dispatch to handlers. The dispatcher can start more than one performer
-    for a given channel.
+    for a given channel; they are competing consumers of the same queue. Each performer has its own pipeline, so that
+    we can stop one performer without stopping the others. The number of performers for a channel can be changed at
+    runtime, with scale, or by an autoscale policy on the consumer configuration.
     The dispatcher also orchestrates the shutdown of consumers. It does this by posting a stop message into each running
     consumers queue, thus allowing the current handler to run to completion but killing the consumer before it can
     consume another work item from the queue.
@@ -204,97 +463,478 @@ class Dispatcher:
     In addition, as we must pass a factory method to the sub-process that creates the command processor for that channel
     i.e. handler and policy registration, outgoing queues, the Dispatcher also acts a registry of those factory methods
     for individual channels.
-    THe dispatcher uses a thread to 'stay running' until end is called. This means that receive is non-blocking. The
-    supervisor thread yields regularly to avoid spinning the CPU. This means there can be a delay between signalling to
-    end and the shutdown beginning.
+    THe dispatcher uses a thread to 'stay running' until end is called. This means that receive is non-blocking, beyond
+    waiting for performers to start. The supervisor thread yields regularly to avoid spinning the CPU.
+    We start all performers at once, and wait for them against a single startup deadline; likewise we signal all
+    performers to stop at once and wait for them against a single shutdown deadline, terminating any that miss it.
+    Whilst it yields, the supervisor checks the health of each performer. A performer whose process has died, or whose
+    message pump has not beaten within the hang timeout, is restarted with an exponential backoff so that a consumer
+    that fails on start does not spin.
     Shutdown will finish work in progress, as it inserts a quit message in the queue that gets consumerd 'next'
+    By default performers are started with the platform's default start method. Where that is fork, the child
+    already shares the parent's imports copy-on-write. Where it is not, choose the forkserver start method and
+    preload the modules your performers need: the fork server imports them once, and each performer is then forked
+    from it already warm, rather than re-importing kombu and your application on every start or restart.
     """
-    def __init__(self, consumers: Dict[str, ConsumerConfiguration]) -> None:
+    def __init__(self,
+                 consumers: Dict[str, ConsumerConfiguration],
+                 supervision_interval: float = 1.0,
+                 hang_timeout: float = None,
+                 restart_backoff: float = 1.0,
+                 max_restart_backoff: float = 60.0,
+                 startup_timeout: float = 30.0,
+                 shutdown_timeout: float = 30.0,
+                 start_method: str = None,
+                 preload: List[str] = None,
+                 collect_metrics: bool = False,
+                 metrics_interval: float = 5.0) -> None:
+        """
+        :param consumers: The consumers we want to run, by channel name
+        :param supervision_interval: How often, in seconds, the supervisor checks the health of performers
+        :param hang_timeout: Seconds without a beat from a message pump before we consider it hung and restart it.
+            Must be longer than your slowest handler. None, the default, means we only restart performers that die
+        :param restart_backoff: Seconds to wait before the first restart of a failed performer, doubles on each failure
+        :param max_restart_backoff: The longest we will wait between restarts of a failing performer
+        :param startup_timeout: The longest, in seconds, receive waits for all performers to signal they have started
+        :param shutdown_timeout: The longest, in seconds, end waits for all performers to finish their work in progress;
+            performers still running after that are terminated. Should be longer than any consumer's drain timeout
+        :param start_method: The multiprocessing start method for performers: fork, forkserver or spawn. None, the
+            default, uses the platform default
+        :param preload: Modules for the fork server to import before it forks any performers, i.e. kombu and the
+            modules containing your handlers. Only valid with the forkserver start method
+        :param collect_metrics: If True, each performer collects metrics and sends them to us, so that we can export
+            them for all performers from metrics
+        :param metrics_interval: How often, in seconds, performers send us their metrics
+        """
         self._state = DispatcherState.ds_notready
 
+        self._context = multiprocessing.get_context(start_method)
+        if preload is not None:
+            if self._context.get_start_method() != "forkserver":
+                raise ConfigurationException("We can only preload modules when the start method is forkserver")
+            self._context.set_forkserver_preload(preload)
+
         self._consumers = consumers
 
-        self._performers = {k: Performer(
-                            k,
-                            v.connection,
-                            v.brightside_configuration,
-                            v.consumer_factory,
-                            v.command_processor_factory,
-                            v.mapper_func)
-                            for k, v in self._consumers.items()}
+        self._metrics_queue = self._context.Queue() if collect_metrics else None
+        self._metrics_interval = metrics_interval
+        self._metrics_snapshots = {}  # type: Dict[tuple, Dict]
+
+        self._performer_counts = {k: v.performers for k, v in self._consumers.items()}  # type: Dict[str, int]
+        self._performers = {k: self._create_performers(k, v.performers)
+                            for k, v in self._consumers.items()}  # type: Dict[str, List[Performer]]
+        self._draining = []  # type: List[Performer]
+        self._lock = Lock()
 
-        self._running_performers = {}
         self._supervisor = None
+        self._supervisor_wake = ThreadEvent()
+        self._supervision_interval = supervision_interval
+        self._hang_timeout = hang_timeout
+        self._restart_backoff = restart_backoff
+        self._max_restart_backoff = max_restart_backoff
+        self._startup_timeout = startup_timeout
+        self._shutdown_timeout = shutdown_timeout
+        self._autoscale_samples = {}  # type: Dict[str, _AutoscaleSample]
+        self._logger = logging.getLogger(__name__)
 
         self._state = DispatcherState.ds_awaiting
 
+    @property
+    def health(self) -> Dict[str, List[PerformerHealth]]:
+        """The health of the performers we have started, by channel name"""
+        with self._lock:
+            return {k: [performer.health for performer in v] for k, v in self._performers.items()}
+
+    def metrics(self) -> str:
+        """The metrics from all our performers, combined, in the Prometheus text exposition format"""
+        if self._metrics_queue is None:
+            raise ConfigurationException("The dispatcher was not asked to collect metrics")
+        self._collect_metrics()
+        with self._lock:
+            snapshots = list(self._metrics_snapshots.values())
+        return to_prometheus_text(merge_snapshots(snapshots))
+
+    def performer_count(self, channel_name: str) -> int:
+        """The number of performers we have for the channel"""
+        with self._lock:
+            return len(self._performers.get(channel_name, []))
+
+    @property
+    def performer_pids(self) -> Dict[str, List[int]]:
+        """By channel name, the process ids of the performers we have started"""
+        with self._lock:
+            return {k: [performer.process.pid for performer in v if performer.process is not None]
+                    for k, v in self._performers.items()}
+
+    @property
+    def readiness(self) -> Dict[str, bool]:
+        """By channel name, whether all the performers for that channel have signalled that they have started"""
+        with self._lock:
+            return {k: all(performer.is_ready for performer in v) for k, v in self._performers.items()}
+
     @property
     def state(self):
         return self._state
 
-    def receive(self):
+    def receive(self) -> Dict[str, bool]:
+        """
+        Starts the performers for all channels, and the supervisor that monitors them. Returns once all performers
+        have signalled they have started, or the startup timeout has passed
+        :return: By channel name, whether all the performers for that channel started within the startup timeout
+        """
+
+        def _receive(dispatcher: Dispatcher, initialized: ThreadEvent) -> None:
+            with dispatcher._lock:
+                started = [dispatcher._start(performer)
+                           for performers in dispatcher._performers.values() for performer in performers]
 
-        def _receive(dispatcher: Dispatcher, initialized: Event) -> None:
-            for k, v in self._performers.items():
-                event = Event()
-                dispatcher._running_performers[k] = v.run(event)
-                event.wait(3)  # TODO: Do we want to configure this polling interval?
+            deadline = time.monotonic() + dispatcher._startup_timeout
+            for event in [e for e in started if e is not None]:
+                event.wait(max(0.0, deadline - time.monotonic()))
 
             initialized.set()
 
             while self._state == DispatcherState.ds_running:
-                time.sleep(5)  # yield to avoid spinning, between checking for changes to state
+                self._supervise()
+                self._autoscale()
+                self._collect_metrics()
+                # yield to avoid spinning, between checking for changes to state
+                self._supervisor_wake.wait(self._supervision_interval)
 
         if self._state == DispatcherState.ds_awaiting:
-            initialized = Event()
-            self._supervisor = Thread(target=_receive, args=(self, initialized))
-            initialized.wait(5)  # TODO: Should this be number of performs and configured with related?
+            self.warm()
+            initialized = ThreadEvent()
+            self._supervisor_wake.clear()
             self._state = DispatcherState.ds_running
+            self._supervisor = Thread(target=_receive, args=(self, initialized))
             self._supervisor.start()
+            initialized.wait(self._startup_timeout)
+
+            not_ready = [k for k, v in self.readiness.items() if not v]
+            if not_ready:
+                self._logger.warning("Dispatcher: Channels %s did not start within %s seconds",
+                                     ", ".join(not_ready), self._startup_timeout)
+
+        return self.readiness
 
     def end(self):
         if self._state == DispatcherState.ds_running:
+            # one deadline for the whole of shutdown, supervisor and performers alike
+            deadline = time.monotonic() + self._shutdown_timeout
 
-            for channel, process in list(self._running_performers.items()):
-                self._performers[channel].stop()
-                process.join(10)  # TODO: We really want to make this configurable
-
+            # stop the supervisor first, so that it does not restart the performers we are about to stop
             self._state = DispatcherState.ds_stopping
-            self._supervisor.join(5)
-            self._running_performers.clear()
+            self._supervisor_wake.set()
+            self._supervisor.join(max(0.0, deadline - time.monotonic()))
+
+            with self._lock:
+                performers = [p for performers in self._performers.values() for p in performers] + self._draining
+                running = [p for p in performers if p.process is not None]
+
+                # signal everyone first, so that they all finish their work in progress at the same time
+                for performer in running:
+                    performer.stop()
+
+            self._join(running, deadline)
+
+            for performer in running:
+                if performer.process.is_alive():
+                    self._logger.error("Dispatcher: Performer for channel %s did not stop within %s seconds, terminating",
+                                       performer.channel_name, self._shutdown_timeout)
+                    performer.process.terminate()
+                    performer.process.join(1)
+
+            with self._lock:
+                for performer in performers:
+                    performer.health.stopped()
+                self._draining.clear()
+
+            self._collect_metrics()
+
             self._supervisor = None
 
         self._state = DispatcherState.ds_stopped
 
-        # Do we want to determine if any processes have failed to complete Within the time frame
+    def warm(self) -> None:
+        """
+        With the forkserver start method, start the fork server and import the preload modules now, rather than when we
+        start the first performer. Call early, i.e. during application start up, to take that cost off receive.
+        Does nothing for other start methods
+        """
+        if self._context.get_start_method() == "forkserver":
+            from multiprocessing import forkserver
+            forkserver.ensure_running()
 
     def open(self, consumer_name: str) -> None:
-        # TODO: Build then refactor with receive
         # Find the consumer
         if consumer_name not in self._consumers:
             raise ConfigurationException("The consumer {} could not be found, did you register it?".format(consumer_name))
 
-        consumer = self._consumers[consumer_name]
-        performer = Performer(consumer_name,
-                              consumer.connection,
-                              consumer.brightside_configuration,
-                              consumer.consumer_factory,
-                              consumer.command_processor_factory,
-                              consumer.mapper_func)
-        self._performers[consumer_name] = performer
-
-        # if we have a supervisor thread
-        if self._state == DispatcherState.ds_running:
-        # start and add to items monitored by supervisor (running performers)
-            pass
-        # else
-        elif self._state == DispatcherState.ds_stopped:
-        # start the supervisor with the single consumer
+        with self._lock:
+            # if we have a supervisor thread, start and add to items monitored by supervisor
+            if self._state == DispatcherState.ds_running:
+                for performer in self._performers.get(consumer_name, []):
+                    if performer.process is not None and performer.process.is_alive():
+                        performer.stop()
+                        self._draining.append(performer)
+                # the performers we are draining may still be reading their pipelines, so the replacements must not
+                # share one, or a replacement could take the quit meant for the performer it replaces
+                performers = self._create_performers(consumer_name, self._performer_counts[consumer_name], replacing=True)
+                for performer in performers:
+                    self._start(performer)
+                self._performers[consumer_name] = performers
+                return
+
+            self._performers[consumer_name] = self._create_performers(consumer_name, self._performer_counts[consumer_name])
+
+        # else start the supervisor with the single consumer
+        if self._state == DispatcherState.ds_stopped:
+            self._performers = {consumer_name: self._performers[consumer_name]}
             self._state = DispatcherState.ds_awaiting
             self.receive()
         else:
             raise MessagingException("Dispatcher in a un-recognised state to open new connection; state was {}", self._state)
 
-
-
-
+    def scale(self, channel_name: str, performers: int) -> None:
+        """
+        Change the number of performers for a channel. If we are running we start new performers, or drain existing
+        ones by sending them a quit message, so they finish their current message first. If we are not running,
+        we will start this number of performers when we next receive.
+        :param channel_name: The channel to scale
+        :param performers: The number of performers we want for that channel
+        """
+        if channel_name not in self._consumers:
+            raise ConfigurationException("The consumer {} could not be found, did you register it?".format(channel_name))
+        if performers < 0:
+            raise ConfigurationException("The number of performers for a consumer cannot be negative")
+        if self._consumers[channel_name].partitions is not None:
+            raise ConfigurationException("The consumer {} is partitioned, so has one performer per partition".format(channel_name))
+
+        with self._lock:
+            self._performer_counts[channel_name] = performers
+            current = self._performers.setdefault(channel_name, [])
+
+            if len(current) < performers:
+                added = [self._create_performer(channel_name, index) for index in range(len(current), performers)]
+                if self._state == DispatcherState.ds_running:
+                    for performer in added:
+                        self._start(performer)
+                current.extend(added)
+            else:
+                while len(current) > performers:
+                    performer = current.pop()
+                    if performer.process is not None and performer.process.is_alive():
+                        performer.stop()
+                        self._draining.append(performer)
+
+        self._logger.info("Dispatcher: Scaled channel %s to %s performers", channel_name, performers)
+
+    def set_rate_limit(self, channel_name: str, rate_limit: Optional[float], burst: int=None) -> None:
+        """
+        Change the rate limit of each performer for a channel, whilst they run, through their control pipelines. The
+        limit is per performer. Performers we start later, or restart, use the new limit
+        :param channel_name: The channel to throttle
+        :param rate_limit: The messages a second each performer may receive; None removes the limit
+        :param burst: The most messages each performer receives at once
+        """
+        if channel_name not in self._consumers:
+            raise ConfigurationException("The consumer {} could not be found, did you register it?".format(channel_name))
+
+        with self._lock:
+            self._consumers[channel_name].brightside_configuration.set_rate_limit(rate_limit, burst)
+            for performer in self._performers.get(channel_name, []):
+                performer.set_rate_limit(rate_limit, burst)
+
+        self._logger.info("Dispatcher: Rate limit for channel %s is now %s messages a second", channel_name, rate_limit)
+
+    def _autoscale(self) -> None:
+        for channel_name, consumer in self._consumers.items():
+            policy = consumer.autoscale
+            if policy is None or self._state != DispatcherState.ds_running:
+                continue
+
+            sample = self._autoscale_samples.setdefault(channel_name, _AutoscaleSample())
+            now = time.time()
+            if now < sample.next_check:
+                continue
+            sample.next_check = now + policy.interval
+
+            with self._lock:
+                performers = list(self._performers.get(channel_name, []))
+
+            utilisation = sample.utilisation(performers, now)
+
+            queue_depth = None
+            if policy.queue_depth_func is not None:
+                try:
+                    queue_depth = policy.queue_depth_func(consumer.connection, consumer.brightside_configuration)
+                except Exception:
+                    self._logger.warning("Dispatcher: Could not read the depth of the queue for channel %s",
+                                         channel_name, exc_info=1)
+
+            if now < sample.cooldown_until:
+                continue
+
+            desired = policy.desired_performers(len(performers), queue_depth, utilisation)
+            if desired != len(performers):
+                self._logger.info("Dispatcher: Autoscaling channel %s from %s to %s performers, queue depth %s utilisation %s",
+                                  channel_name, len(performers), desired, queue_depth, utilisation)
+                self.scale(channel_name, desired)
+                sample.cooldown_until = now + policy.cooldown
+
+    def _collect_metrics(self) -> None:
+        """
+        Snapshots are cumulative, so we only need to keep the latest from each performer process. Once a process has
+        gone we keep its counters and histograms, so that totals do not go backwards, but drop its gauges, as what they
+        measured has gone with it
+        """
+        if self._metrics_queue is None:
+            return
+        self._receive_metrics()
+
+        with self._lock:
+            running = {(performer.channel_name, performer.process.pid)
+                       for performer in [p for performers in self._performers.values() for p in performers] + self._draining
+                       if performer.process is not None and performer.process.is_alive()}
+            for performer, snapshot in list(self._metrics_snapshots.items()):
+                if performer not in running and snapshot["gauges"]:
+                    self._metrics_snapshots[performer] = dict(snapshot, gauges={})
+
+    def _receive_metrics(self) -> None:
+        """
+        Take the snapshots our performers have sent us off the queue. A performer's process cannot exit until the queue
+        has taken its last snapshot from it, so we must keep doing this whilst we wait for performers to stop
+        """
+        if self._metrics_queue is None:
+            return
+        while True:
+            try:
+                performer, snapshot = self._metrics_queue.get_nowait()
+            except Empty:
+                return
+            with self._lock:
+                self._metrics_snapshots[performer] = snapshot
+
+    def _create_performer(self, channel_name: str, index: int, replacing: bool=False) -> Performer:
+        consumer = self._consumers[channel_name]
+        # Each performer needs its own pipeline, so that we can stop it on its own; the first uses the one we were given
+        # unless that was created for fork, and we don't fork, as a queue cannot be shared across start methods, or
+        # unless it replaces a performer that may still be draining that pipeline
+        configuration = consumer.brightside_configuration
+        if consumer.partitions is not None:
+            # performers keep their index when restarted, so each partition always has one performer
+            configuration = partition_configuration(configuration, index)
+        shares_pipeline = index == 0 and not replacing and \
+            (multiprocessing.get_start_method() != "fork" or self._context.get_start_method() == "fork")
+        if not shares_pipeline:
+            configuration = copy.copy(configuration)
+            configuration.pipeline = self._context.Queue()
+
+        return Performer(channel_name,
+                         consumer.connection,
+                         configuration,
+                         consumer.consumer_factory,
+                         consumer.command_processor_factory,
+                         consumer.mapper_func,
+                         context=self._context,
+                         metrics_queue=self._metrics_queue,
+                         metrics_interval=self._metrics_interval)
+
+    def _create_performers(self, channel_name: str, count: int, replacing: bool=False) -> List[Performer]:
+        return [self._create_performer(channel_name, index, replacing) for index in range(count)]
+
+    def _is_hung(self, performer: Performer) -> bool:
+        if self._hang_timeout is None or performer.liveness is None:
+            return False
+        return performer.liveness.seconds_since_last_beat() > self._hang_timeout
+
+    def _join(self, performers: List[Performer], deadline: float) -> None:
+        """Wait for the processes of the performers to exit, up to the deadline, taking their metrics as we wait"""
+        for performer in performers:
+            while performer.process.is_alive() and time.monotonic() < deadline:
+                self._receive_metrics()
+                performer.process.join(min(0.05, max(0.0, deadline - time.monotonic())))
+
+    def _reap_drained(self) -> None:
+        for performer in list(self._draining):
+            if not performer.process.is_alive():
+                performer.process.join(0)
+                performer.health.stopped()
+                self._draining.remove(performer)
+
+    def _restart(self, performer: Performer) -> None:
+        self._logger.warning("Dispatcher: Restarting performer for channel %s", performer.channel_name)
+        if self._run(performer) is not None:
+            performer.health.restarted()
+
+    def _run(self, performer: Performer) -> Event:
+        event = self._context.Event()
+        try:
+            performer.run(event)
+        except Exception:
+            self._logger.error("Dispatcher: Could not start performer for channel %s", performer.channel_name, exc_info=1)
+            performer.health.failed(self._restart_backoff, self._max_restart_backoff)
+            return None
+        return event
+
+    def _start(self, performer: Performer) -> Event:
+        event = self._run(performer)
+        if event is not None:
+            performer.health.started()
+        return event
+
+    def _supervise(self) -> None:
+        """Check the health of each running performer, restarting those that have died or hung"""
+        terminated = []
+        with self._lock:
+            self._reap_drained()
+
+            for performer in [p for performers in self._performers.values() for p in performers]:
+                if self._state != DispatcherState.ds_running:
+                    break
+
+                health = performer.health
+                process = performer.process
+
+                if health.is_alive:
+                    if process.is_alive() and not self._is_hung(performer):
+                        health.stable(self._max_restart_backoff)
+                        continue
+
+                    if process.is_alive():
+                        self._logger.error("Dispatcher: Performer for channel %s has not beaten for %s seconds, terminating",
+                                           performer.channel_name, self._hang_timeout)
+                        process.terminate()
+                        terminated.append(process)
+                    else:
+                        self._logger.error("Dispatcher: Performer for channel %s has died with exit code %s",
+                                           performer.channel_name, process.exitcode)
+
+                    health.failed(self._restart_backoff, self._max_restart_backoff)
+
+                if health.restart_at is not None and time.time() >= health.restart_at:
+                    self._restart(performer)
+
+        # so that we do not hold up the rest of the dispatcher whilst a hung process dies
+        for process in terminated:
+            process.join(1)
+
+
+class _AutoscaleSample:
+    """What we last saw of a channel's performers, so we can tell how busy they have been since"""
+    def __init__(self) -> None:
+        self.next_check = 0.0
+        self.cooldown_until = 0.0
+        self._busy = {}  # type: Dict[int, float]
+        self._sampled_at = None  # type: float
+
+    def utilisation(self, performers: List[Performer], now: float) -> float:
+        busy = {id(p): p.liveness.busy_seconds for p in performers if p.liveness is not None}
+        utilisation = None
+        if self._sampled_at is not None and busy and now > self._sampled_at:
+            elapsed = now - self._sampled_at
+            deltas = [seconds - self._busy.get(key, seconds) for key, seconds in busy.items()]
+            utilisation = min(1.0, sum(deltas) / (elapsed * len(deltas)))
+        self._busy = busy
+        self._sampled_at = now
+        return utilisation
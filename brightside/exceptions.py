@@ -35,12 +35,35 @@ class ConfigurationException(Exception):
 
 
 class DeferMessageException(Exception):
-    pass
+    """
+    Raised by a handler to have its message requeued, rather than acked; after a delay in seconds if given.
+    A RetryPolicy that defers sets retry_state, the attempts it has made and when it made the first, by policy name,
+    which the message pump carries on the message so that the policy carries on from there when it comes back
+    """
+    def __init__(self, *args, delay: float = 0.0, retry_state: dict = None) -> None:
+        super().__init__(*args)
+        self.delay = delay
+        self.retry_state = retry_state
 
 
 class MessagingException(Exception):
     pass
 
 
+class PublishQueueFullException(MessagingException):
+    pass
+
+
+class RequestTimeoutException(MessagingException):
+    pass
+
+
 class ChannelFailureException(Exception):
     pass
+
+
+class CircuitBrokenException(Exception):
+    """Raised instead of calling through a circuit breaker that is open"""
+    def __init__(self, *args, retry_after: float = 0.0) -> None:
+        super().__init__(*args)
+        self.retry_after = retry_after
@@ -28,6 +28,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 ***********************************************************************
 """
+from typing import Hashable, List, Optional
 from uuid import UUID, uuid4
 from abc import ABCMeta, abstractmethod
 
@@ -41,6 +42,14 @@ class Request(metaclass=ABCMeta):
     def id(self) -> UUID:
         return self._id
 
+    @property
+    def cache_key(self) -> Optional[Hashable]:
+        """
+        override in query-style requests to let a CachingStep reuse the result of an earlier request with the same
+        parameters; two requests of the same type with equal keys must have the same result. None means do not cache
+        """
+        return None
+
     @staticmethod
     @abstractmethod
     def is_command() -> bool:
@@ -88,6 +97,45 @@ class Event(Request):
         return True
 
 
+class ReplyAddress:
+    """Where to send the reply to a call: the topic the caller listens on, and the correlation id it is waiting for"""
+    def __init__(self, topic: str, correlation_id: UUID) -> None:
+        self._topic = topic
+        self._correlation_id = correlation_id
+
+    @property
+    def correlation_id(self) -> UUID:
+        return self._correlation_id
+
+    @property
+    def topic(self) -> str:
+        return self._topic
+
+
+class Call(Command):
+    """
+    A command that expects a reply. Post it with CommandProcessor.call, and have its handler answer with
+    CommandProcessor.reply. The message pump sets the reply address from the message header when it receives the call
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.reply_address = None  # type: ReplyAddress
+
+
+class Reply(Request):
+    """The answer to a call, sent back to the caller with CommandProcessor.reply"""
+    def __init__(self) -> None:
+        super().__init__()
+
+    @staticmethod
+    def is_command() -> bool:
+        return False
+
+    @staticmethod
+    def is_event() -> bool:
+        return False
+
+
 class Handler(metaclass=ABCMeta):
     """ Receives a message from the command dispatcher, and processes it. Forms part of a pipeline of handlers
         A handler calls handlers that succeed it through the base class method
@@ -98,6 +146,29 @@ class Handler(metaclass=ABCMeta):
         pass
 
 
+class BatchHandler(Handler):
+    """
+    A handler that can handle many requests of one type at once, such as with one bulk insert rather than a row at a
+    time. CommandProcessor.send_batch, and a message pump with a batch_size, call handle_batch; send calls handle, which
+    handles a batch of one. Some requests in a batch may fail whilst others succeed, so we return an outcome for each:
+    None if it succeeded, or the exception it failed with, which a message pump treats as if handle had raised it for
+    that message alone, so a DeferMessageException requeues just that message
+    """
+    def handle(self, request: Request) -> Request:
+        error = self.handle_batch([request])[0]
+        if error is not None:
+            raise error
+        return None
+
+    @abstractmethod
+    def handle_batch(self, requests: List[Request]) -> List[Optional[Exception]]:
+        """
+        :param requests: The requests to handle, all of the same type, in the order they were received
+        :return: An outcome for each request, in the same order: None, or the exception it failed with
+        """
+        pass
+
+
 
 
 
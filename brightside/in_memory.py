@@ -0,0 +1,374 @@
+"""
+File             : in_memory.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import copy
+import heapq
+import logging
+import re
+import time
+from collections import OrderedDict, deque
+from multiprocessing.managers import BaseManager
+from threading import Condition, Event, Thread
+from typing import Optional, Pattern
+from uuid import UUID, uuid4
+
+from brightside.connection import Connection
+from brightside.exceptions import MessagingException
+from brightside.message_factory import create_null_message
+from brightside.messaging import BrightsideConsumer, BrightsideConsumerConfiguration, BrightsideMessage, \
+    BrightsideProducer, BrightsideReplyReceiver
+
+# The same header RabbitMQ's delayed message exchange uses: the milliseconds to wait before we deliver the message
+DELAY_HEADER = "x-delay"
+
+
+class InMemoryBroker:
+    """
+    A broker that lives in memory, for running the whole pipeline, at full speed, without RabbitMQ. Queues are bound
+    to routing keys, which may use AMQP topic wildcards: * matches one word and # matches zero or more. We route a
+    message to every queue bound to a key that matches its topic, and drop it if there are none, as RabbitMQ would.
+
+    Safe to use from many threads. To share it between processes, for example with a Dispatcher, create it in an
+    InMemoryBrokerManager; a plain InMemoryBroker passed to a performer's process is a copy, not the same broker
+    """
+    def __init__(self) -> None:
+        self._bindings = []
+        self._queues = {}
+        self._consumers = {}
+        self._condition = Condition()
+
+    def ack(self, consumer_id: str, message_id: UUID) -> None:
+        with self._condition:
+            self._consumer(consumer_id).unacked.pop(message_id, None)
+            self._condition.notify_all()
+
+    def cancel(self, consumer_id: str) -> None:
+        """
+        Stop delivering messages to the consumer; it can still ack or requeue those it has. As RabbitMQ would have
+        pushed the consumer up to its prefetch count of messages before it cancelled, we hand it those, and it can still
+        fetch them
+        """
+        with self._condition:
+            consumer = self._consumer(consumer_id)
+            consumer.cancelled = True
+            queue = self._queues[consumer.queue_name]
+            queue.promote(time.monotonic())
+            while len(consumer.unacked) < consumer.prefetch_count and queue.ready:
+                message = queue.ready.popleft()
+                consumer.unacked[message.id] = message
+                consumer.prefetched.append(message)
+
+    def resume(self, consumer_id: str) -> None:
+        """Start delivering messages to a cancelled consumer again"""
+        with self._condition:
+            self._consumer(consumer_id).cancelled = False
+            self._condition.notify_all()
+
+    def close(self, consumer_id: str) -> None:
+        """Remove the consumer, returning the messages it has not acked to the front of its queue"""
+        with self._condition:
+            consumer = self._consumers.pop(consumer_id, None)
+            if consumer is not None:
+                self._queues[consumer.queue_name].ready.extendleft(reversed(list(consumer.unacked.values())))
+                self._condition.notify_all()
+
+    def consume(self, queue_name: str, prefetch_count: int = 1) -> str:
+        """
+        Start consuming from a queue
+        :param queue_name: The queue to consume from; declare it first
+        :param prefetch_count: The most messages we will deliver to this consumer before it acks or requeues them
+        :return: The id of the consumer, to pass to fetch, ack, requeue and close
+        """
+        with self._condition:
+            if queue_name not in self._queues:
+                raise MessagingException("The queue {} has not been declared".format(queue_name))
+            consumer_id = str(uuid4())
+            self._consumers[consumer_id] = _ConsumerState(queue_name, max(prefetch_count, 1))
+            return consumer_id
+
+    def declare_queue(self, queue_name: str, routing_key: str) -> None:
+        """Create the queue, if it does not exist, and bind it to the routing key, if it is not bound already"""
+        with self._condition:
+            if queue_name not in self._queues:
+                self._queues[queue_name] = _QueueState()
+            if not any(key == routing_key and name == queue_name for key, _, name in self._bindings):
+                self._bindings.append((routing_key, _compile_routing_key(routing_key), queue_name))
+
+    def delete_queue(self, queue_name: str) -> None:
+        """Remove the queue, its bindings, and any messages on it"""
+        with self._condition:
+            self._queues.pop(queue_name, None)
+            self._bindings = [binding for binding in self._bindings if binding[2] != queue_name]
+
+    def depth(self, queue_name: str) -> int:
+        """The number of messages ready to deliver, which does not include those that are delayed or unacked"""
+        with self._condition:
+            queue = self._queues.get(queue_name)
+            if queue is None:
+                return 0
+            queue.promote(time.monotonic())
+            return len(queue.ready)
+
+    def fetch(self, consumer_id: str, timeout: float) -> Optional[BrightsideMessage]:
+        """
+        Deliver the next message to a consumer, waiting up to the timeout for one
+        :return: The message, or None if there was nothing we could deliver in time
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                consumer = self._consumer(consumer_id)
+                queue = self._queues[consumer.queue_name]
+                now = time.monotonic()
+                queue.promote(now)
+                if consumer.prefetched:
+                    return consumer.prefetched.popleft()
+                if not consumer.cancelled and len(consumer.unacked) < consumer.prefetch_count and queue.ready:
+                    message = queue.ready.popleft()
+                    consumer.unacked[message.id] = message
+                    return message
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    return None
+                next_due = queue.next_due()
+                self._condition.wait(min(remaining, next_due - now) if next_due is not None else remaining)
+
+    def in_flight(self, queue_name: str) -> int:
+        """The number of messages delivered from the queue that have not yet been acked or requeued"""
+        with self._condition:
+            return sum(len(c.unacked) for c in self._consumers.values() if c.queue_name == queue_name)
+
+    def is_unacked(self, consumer_id: str, message_id: UUID) -> bool:
+        with self._condition:
+            return message_id in self._consumer(consumer_id).unacked
+
+    def publish(self, message: BrightsideMessage) -> int:
+        """
+        Route the message to each queue bound to a key that matches its topic. If the header bag has an x-delay, we
+        hold the message for that many milliseconds before we deliver it
+        :return: The number of queues we routed the message to
+        """
+        delay = _delay_of(message)
+        with self._condition:
+            topic = "." + message.header.topic
+            queue_names = {name for _, pattern, name in self._bindings if pattern.match(topic)}
+            for queue_name in queue_names:
+                # each queue gets its own copy, as a broker would, so that no consumer sees another's changes
+                self._queues[queue_name].put(copy.deepcopy(message), delay)
+            self._condition.notify_all()
+            return len(queue_names)
+
+    def purge(self, queue_name: str) -> None:
+        with self._condition:
+            queue = self._queues.get(queue_name)
+            if queue is not None:
+                queue.ready.clear()
+                queue.delayed.clear()
+
+    def requeue(self, consumer_id: str, message: BrightsideMessage, delay: float = 0.0) -> None:
+        """
+        Return a message the consumer was delivered to the back of its queue, after the delay in seconds. We keep
+        the message we are given, rather than the one we delivered, so that its handled count survives
+        """
+        with self._condition:
+            consumer = self._consumer(consumer_id)
+            consumer.unacked.pop(message.id, None)
+            self._queues[consumer.queue_name].put(message, delay)
+            self._condition.notify_all()
+
+    def _consumer(self, consumer_id: str) -> '_ConsumerState':
+        consumer = self._consumers.get(consumer_id)
+        if consumer is None:
+            raise MessagingException("The consumer {} is not consuming from this broker".format(consumer_id))
+        return consumer
+
+
+class InMemoryBrokerManager(BaseManager):
+    """
+    Runs an InMemoryBroker in a server process, so that producers and consumers in other processes share it:
+        with InMemoryBrokerManager() as manager:
+            broker = manager.InMemoryBroker()
+    The broker we return is a proxy, which can be passed to another process
+    """
+    pass
+
+
+InMemoryBrokerManager.register("InMemoryBroker", InMemoryBroker)
+
+
+class InMemoryProducer(BrightsideProducer):
+    """Sends messages to an in-memory broker"""
+    def __init__(self, broker: InMemoryBroker, logger: logging.Logger = None) -> None:
+        self._broker = broker
+        self._logger = logger or logging.getLogger(__name__)
+
+    def send(self, message: BrightsideMessage) -> None:
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("Send message %s to in memory broker with routing key %s", message.id, message.header.topic)
+        self._broker.publish(message)
+
+
+class InMemoryConsumer(BrightsideConsumer):
+    """Reads messages from a queue on an in-memory broker, declaring the queue if need be"""
+    def __init__(self, broker: InMemoryBroker, configuration: BrightsideConsumerConfiguration,
+                 logger: logging.Logger = None) -> None:
+        self._broker = broker
+        self._queue_name = configuration.queue_name
+        self._logger = logger or logging.getLogger(__name__)
+        self._broker.declare_queue(configuration.queue_name, configuration.routing_key)
+        self._consumer_id = self._broker.consume(configuration.queue_name, configuration.prefetch_count)
+
+    def acknowledge(self, message: BrightsideMessage) -> None:
+        self._broker.ack(self._consumer_id, message.id)
+
+    def cancel(self) -> None:
+        self._broker.cancel(self._consumer_id)
+
+    def has_acknowledged(self, message: BrightsideMessage) -> bool:
+        return not self._broker.is_unacked(self._consumer_id, message.id)
+
+    def purge(self) -> None:
+        self._broker.purge(self._queue_name)
+
+    def receive(self, timeout: float) -> BrightsideMessage:
+        message = self._broker.fetch(self._consumer_id, timeout)
+        return message if message is not None else create_null_message()
+
+    def requeue(self, message: BrightsideMessage, delay: float = 0.0) -> None:
+        self._broker.requeue(self._consumer_id, message, delay)
+
+    def resume(self) -> None:
+        self._broker.resume(self._consumer_id)
+
+    def run_heartbeat_continuously(self) -> Event:
+        # there is no connection to keep alive
+        return Event()
+
+    def stop(self) -> None:
+        self._broker.close(self._consumer_id)
+
+
+class InMemoryReplyReceiver(BrightsideReplyReceiver):
+    """Receives replies to calls on a queue of its own on an in-memory broker, which we delete when we stop"""
+    def __init__(self, broker: InMemoryBroker, logger: logging.Logger = None) -> None:
+        super().__init__(logger)
+        self._broker = broker
+        self._queue_name = "brightside.reply.{}".format(uuid4())
+        self._consumer_id = None  # type: str
+        self._stopped = Event()
+        self._reader = None  # type: Thread
+
+    def _close(self) -> None:
+        self._stopped.set()
+        self._reader.join()
+        self._broker.close(self._consumer_id)
+        self._broker.delete_queue(self._queue_name)
+
+    def _open(self) -> str:
+        self._broker.declare_queue(self._queue_name, self._queue_name)
+        # replies are cheap to hold, and we want every one of them as soon as it arrives
+        self._consumer_id = self._broker.consume(self._queue_name, prefetch_count=1000)
+        self._stopped.clear()
+        self._reader = Thread(target=self._read, daemon=True)
+        self._reader.start()
+        return self._queue_name
+
+    def _read(self) -> None:
+        while not self._stopped.is_set():
+            message = self._broker.fetch(self._consumer_id, 0.1)
+            if message is not None:
+                self._broker.ack(self._consumer_id, message.id)
+                self.complete(message)
+
+
+class InMemoryConsumerFactory:
+    """
+    A consumer factory for the Dispatcher that reads from an in-memory broker. It can be pickled, so works with any
+    start method, provided the broker comes from an InMemoryBrokerManager. Pass queue_depth as the queue_depth_func
+    of an AutoscalePolicy to autoscale on the broker's queues
+    """
+    def __init__(self, broker: InMemoryBroker) -> None:
+        self._broker = broker
+
+    def __call__(self, connection: Connection, configuration: BrightsideConsumerConfiguration,
+                 logger: logging.Logger = None) -> InMemoryConsumer:
+        return InMemoryConsumer(self._broker, configuration, logger)
+
+    def queue_depth(self, connection: Connection, configuration: BrightsideConsumerConfiguration) -> int:
+        return self._broker.depth(configuration.queue_name)
+
+
+class _ConsumerState:
+    def __init__(self, queue_name: str, prefetch_count: int) -> None:
+        self.queue_name = queue_name
+        self.prefetch_count = prefetch_count
+        self.cancelled = False
+        self.unacked = OrderedDict()
+        # delivered to the consumer when it cancelled, but not yet fetched
+        self.prefetched = deque()
+
+
+class _QueueState:
+    def __init__(self) -> None:
+        self.ready = deque()
+        self.delayed = []  # heap of (due, sequence, message)
+        self._sequence = 0
+
+    def next_due(self) -> Optional[float]:
+        return self.delayed[0][0] if self.delayed else None
+
+    def promote(self, now: float) -> None:
+        """Move delayed messages whose time has come onto the ready queue"""
+        while self.delayed and self.delayed[0][0] <= now:
+            self.ready.append(heapq.heappop(self.delayed)[2])
+
+    def put(self, message: BrightsideMessage, delay: float) -> None:
+        if delay > 0:
+            self._sequence += 1
+            heapq.heappush(self.delayed, (time.monotonic() + delay, self._sequence, message))
+        else:
+            self.ready.append(message)
+
+
+def _compile_routing_key(routing_key: str) -> Pattern:
+    """We match against the topic with a leading dot, so that every word, including one # matches, owns its dot"""
+    words = {"*": r"\.[^.]+", "#": r"(?:\.[^.]+)*"}
+    return re.compile("^" + "".join(words.get(word, r"\." + re.escape(word)) for word in routing_key.split(".")) + "$")
+
+
+def _delay_of(message: BrightsideMessage) -> float:
+    bag = message.header.bag
+    if not bag or DELAY_HEADER not in bag:
+        return 0.0
+    try:
+        return max(float(bag[DELAY_HEADER]) / 1000.0, 0.0)
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,195 @@
+"""
+File             : inbox.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import hashlib
+import logging
+import math
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Any, Iterable
+from uuid import UUID
+
+from brightside.exceptions import ConfigurationException
+from brightside.handler import Request
+from brightside.messaging import BrightsideInbox
+from brightside.metrics import Metrics, get_metrics
+from brightside.pipeline import NextStep, Step
+
+
+class InMemoryInbox(BrightsideInbox):
+    """Records handled messages in memory, for tests, or where we only need to recognise redeliveries in this process"""
+    def __init__(self) -> None:
+        # when we recorded each id, by id and context key
+        self._entries = {}
+        self._lock = Lock()
+
+    def add(self, message_id: UUID, context_key: str) -> bool:
+        with self._lock:
+            if (message_id, context_key) in self._entries:
+                return False
+            self._entries[(message_id, context_key)] = datetime.utcnow()
+            return True
+
+    def exists(self, message_id: UUID, context_key: str) -> bool:
+        with self._lock:
+            return (message_id, context_key) in self._entries
+
+    def ids(self, context_key: str, since: datetime = None) -> Iterable[UUID]:
+        with self._lock:
+            return [message_id for (message_id, key), recorded in self._entries.items()
+                    if key == context_key and (since is None or recorded >= since)]
+
+
+class BloomFilter:
+    """
+    A set that can tell us an item is certainly not in it, in constant time and little memory, but may wrongly tell us
+    an item is in it, with about the false positive rate we ask for, once it holds capacity items
+    """
+    def __init__(self, capacity: int = 100000, false_positive_rate: float = 0.01) -> None:
+        if capacity < 1 or not 0 < false_positive_rate < 1:
+            raise ConfigurationException("A Bloom filter needs a capacity of at least 1, and a false positive rate "
+                                         "between 0 and 1")
+        self._size = max(8, int(math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2))))
+        self._hashes = max(1, int(round(self._size / capacity * math.log(2))))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def __contains__(self, item: Any) -> bool:
+        return all(self._bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(item))
+
+    def add(self, item: Any) -> None:
+        for i in self._indexes(item):
+            self._bits[i >> 3] |= 1 << (i & 7)
+
+    def _indexes(self, item: Any) -> Iterable[int]:
+        # two hashes from one digest, combined as Kirsch and Mitzenmacher do, stand in for k independent hashes
+        digest = hashlib.blake2b(str(item).encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self._size for i in range(self._hashes))
+
+
+class CachedInbox(BrightsideInbox):
+    """
+    Puts a cache in front of an inbox, usually one in a database, so that most checks never reach it. We remember the
+    most recent ids we have seen in an LRU, so a redelivery soon after the first delivery, the usual case, is a cache
+    hit. With a Bloom filter we also know the ids we have certainly never seen, which is most of them, and answer
+    for those without the database either; only ids the filter may have seen, and the LRU has forgotten, go to it.
+    The Bloom filter only knows the ids we add and those the inbox recorded within the warm window when we warm it, on
+    first use, so only use it where one process handles a context's messages, such as a partitioned consumer; a
+    message another process has recorded would look new to us, as would one recorded before the window. We give no
+    guarantee across threads beyond that of the inbox we front
+    :param inbox: The inbox we cache
+    :param cache_size: The most ids we keep in the LRU
+    :param bloom_filter: If set, the Bloom filter we use to answer for ids we have not seen
+    :param metrics: Where we count which of the LRU, the Bloom filter or the inbox answered each check
+    :param warm_window: How many seconds back we load ids from the inbox into the Bloom filter; make it longer than
+        the longest a broker may take to redeliver a message. None loads every id the inbox has ever recorded
+    """
+    def __init__(self, inbox: BrightsideInbox, cache_size: int = 10000, bloom_filter: BloomFilter = None,
+                 metrics: Metrics = None, warm_window: float = 24 * 60 * 60) -> None:
+        self._inbox = inbox
+        self._cache_size = cache_size
+        self._recent = OrderedDict()  # type: OrderedDict
+        self._bloom_filter = bloom_filter
+        self._warm_window = warm_window
+        self._warmed = set()
+        self._metrics = metrics or get_metrics()
+        self._lock = Lock()
+
+    def add(self, message_id: UUID, context_key: str) -> bool:
+        added = self._inbox.add(message_id, context_key)
+        self._remember(message_id, context_key)
+        return added
+
+    def exists(self, message_id: UUID, context_key: str) -> bool:
+        key = (message_id, context_key)
+        with self._lock:
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                self._record("lru")
+                return True
+        if self._bloom_filter is not None:
+            self._warm(context_key)
+            if key not in self._bloom_filter:
+                self._record("bloom")
+                return False
+        self._record("inbox")
+        found = self._inbox.exists(message_id, context_key)
+        if found:
+            self._remember(message_id, context_key)
+        return found
+
+    def ids(self, context_key: str, since: datetime = None) -> Iterable[UUID]:
+        return self._inbox.ids(context_key, since)
+
+    def _record(self, answered_by: str) -> None:
+        self._metrics.increment("brightside_inbox_checks_total", labels={"answered_by": answered_by})
+
+    def _remember(self, message_id: UUID, context_key: str) -> None:
+        key = (message_id, context_key)
+        with self._lock:
+            self._recent[key] = True
+            self._recent.move_to_end(key)
+            while len(self._recent) > self._cache_size:
+                self._recent.popitem(last=False)
+            if self._bloom_filter is not None:
+                self._bloom_filter.add(key)
+
+    def _warm(self, context_key: str) -> None:
+        with self._lock:
+            if context_key in self._warmed:
+                return
+            self._warmed.add(context_key)
+            since = None if self._warm_window is None else datetime.utcnow() - timedelta(seconds=self._warm_window)
+            for message_id in self._inbox.ids(context_key, since):
+                self._bloom_filter.add((message_id, context_key))
+
+
+class InboxStep(Step):
+    """
+    Handles a request only if it has not been handled before, by its id, for when a request can be sent to a
+    CommandProcessor more than once. We record the request once its handler succeeds, so a failure can be retried
+    :param inbox: Where we record the requests we have handled
+    :param context_key: Separates the requests of one handler from another, when they may share ids
+    """
+    def __init__(self, inbox: BrightsideInbox, context_key: str, logger: logging.Logger = None) -> None:
+        self._inbox = inbox
+        self._context_key = context_key
+        self._logger = logger or logging.getLogger(__name__)
+
+    def handle(self, request: Request, next_step: NextStep) -> Any:
+        if self._inbox.exists(request.id, self._context_key):
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Skipping %s with id %s, as we have already handled it",
+                                   request.__class__.__name__, request.id)
+            return None
+        response = next_step(request)
+        self._inbox.add(request.id, self._context_key)
+        return response
@@ -29,7 +29,9 @@ THE SOFTWARE.
 ***********************************************************************
 """
 from functools import wraps
+from itertools import count
 import logging
+import time
 
 from brightside.exceptions import ConfigurationException
 from brightside.handler import Request
@@ -38,15 +40,50 @@ ENTRY_MESSAGE = "Entering {}"
 EXIT_MESSAGE = "Exiting {}"
 
 
-def log_handler(level=logging.DEBUG, name=None, entry_message=None, exit_message=None):
+class LogSampler:
+    """
+    Decides whether to log, 1 in every N times it is asked. Use it to keep expensive logs, such as message payloads,
+    from costing us on every message. A count is cheaper than a random number, and lets a test know what to expect
+    """
+    def __init__(self, every: int = 1) -> None:
+        """
+        :param every: Log 1 in every this many times; 1 logs every time, 0 never logs
+        """
+        if every < 0:
+            raise ConfigurationException("The log sampling rate must be 0 or more, not {}".format(every))
+        self._every = every
+        self._counter = count()
+
+    @property
+    def every(self) -> int:
+        return self._every
+
+    def sample(self) -> bool:
+        if self._every <= 1:
+            return self._every == 1
+        # next on a count is atomic under the GIL, so this is safe across threads
+        return next(self._counter) % self._every == 0
+
+
+def log_handler(level=logging.DEBUG, name=None, entry_message=None, exit_message=None, timed=False, sample=1):
+    """
+    Logs entry to, and exit from, a handler, along with the request it handles. We resolve the logger and messages
+    when we decorate the handler, and do nothing else unless the logger is enabled for the level
+    :param level: The level to log at
+    :param name: The name of the logger; defaults to the handler's module
+    :param entry_message: What to log on entry; defaults to "Entering <handler function>"
+    :param exit_message: What to log on exit; defaults to "Exiting <handler function>"
+    :param timed: If true, log how long the handler took on exit
+    :param sample: Log 1 in every this many requests
+    """
     def decorator(func):
+        log = logging.getLogger(name if name else func.__module__)
+        entry_log_msg = entry_message if entry_message else ENTRY_MESSAGE.format(func.__name__)
+        exit_log_msg = exit_message if exit_message else EXIT_MESSAGE.format(func.__name__)
+        sampler = LogSampler(sample)
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            log_name = name if name else func.__module__
-            log = logging.getLogger(log_name)
-            entry_log_msg = entry_message if entry_message else ENTRY_MESSAGE.format(func.__name__)
-            exit_log_msg = exit_message if exit_message else EXIT_MESSAGE.format(func.__name__)
-
             # we assume that the request is always the first positional argument
             # as it should be only argument, and we check for its type to be sure
             # We also assume that the command has a __str__ method if more detailed
@@ -55,11 +92,18 @@ def log_handler(level=logging.DEBUG, name=None, entry_message=None, exit_message
             if not isinstance(request, Request):
                 raise ConfigurationException("A handler must take a Request derived class as its first positional argument {}", func.__name__)
 
-            request_info = " {}".format(str(request))
+            if not log.isEnabledFor(level) or not sampler.sample():
+                return func(*args, **kwargs)
+
+            request_info = " " + str(request)
 
             log.log(level, entry_log_msg + request_info)
+            started = time.perf_counter() if timed else None
             response = func(*args, **kwargs)
-            log.log(level, exit_log_msg + request_info)
+            if timed:
+                log.log(level, "{}{} in {:.6f} seconds".format(exit_log_msg, request_info, time.perf_counter() - started))
+            else:
+                log.log(level, exit_log_msg + request_info)
             return response
 
         return wrapper
@@ -29,6 +29,7 @@ THE SOFTWARE.
 ***********************************************************************
 """
 
+import json
 from uuid import uuid4
 from brightside.messaging import BrightsideMessage, BrightsideMessageBody, BrightsideMessageHeader, BrightsideMessageType
 
@@ -41,3 +42,10 @@ def create_quit_message():
     body = BrightsideMessageBody(body="")
     header = BrightsideMessageHeader(uuid4(), topic="", message_type=BrightsideMessageType.MT_QUIT)
     return BrightsideMessage(header, body)
+
+
+def create_rate_limit_message(rate_limit: float, burst: int = None):
+    """A control message that changes the rate limit of a message pump; a rate_limit of None removes it"""
+    body = BrightsideMessageBody(body=json.dumps({"rate_limit": rate_limit, "burst": burst}))
+    header = BrightsideMessageHeader(uuid4(), topic="", message_type=BrightsideMessageType.MT_CONFIGURE)
+    return BrightsideMessage(header, body)
@@ -30,15 +30,25 @@ THE SOFTWARE.
 """
 
 from contextlib import contextmanager
+import json
 import logging
 import time
-from typing import Callable
+import multiprocessing
+from multiprocessing.context import BaseContext
+from typing import Callable, List, Optional, Tuple
 from threading import current_thread, Event
 
+from brightside.claim_check import ClaimCheck
 from brightside.command_processor import CommandProcessor, Request
+from brightside.handler import Call, ReplyAddress
 from brightside.channels import Channel
-from brightside.exceptions import ChannelFailureException, ConfigurationException, DeferMessageException
-from brightside.messaging import BrightsideMessage, BrightsideMessageHeader, BrightsideMessageType
+from brightside.exceptions import ChannelFailureException, CircuitBrokenException, ConfigurationException, \
+    DeferMessageException
+from brightside.messaging import BrightsideInbox, BrightsideMessage, BrightsideMessageHeader, BrightsideMessageType
+from brightside.metrics import Metrics, get_metrics
+from brightside.policies import RETRY_STATE_HEADER, RetryState, resume_retries
+from brightside.rate_limit import TokenBucket
+from brightside.tracing import Tracer, extract, get_tracer
 
 
 @contextmanager
@@ -48,13 +58,79 @@ def heartbeat(channel: Channel):
     channel.end_heartbeat()
 
 
+class PumpLiveness:
+    """
+    Shared memory that a message pump uses to tell its supervisor it is still alive. The pump records a beat on each
+    pass through its loop, so a supervisor in another process can tell a pump that has died or hung from one that is
+    just idle. Note that we do not beat whilst a handler runs, so a hang timeout must be longer than your slowest handler.
+    The clock starts at the first beat, so the time a process takes to start does not count towards the hang timeout
+    """
+    def __init__(self, context: BaseContext = None) -> None:
+        context = context or multiprocessing.get_context()
+        self._last_beat = context.Value('d', 0.0)
+        self._busy_seconds = context.Value('d', 0.0)
+
+    def beat(self) -> None:
+        self._last_beat.value = time.time()
+
+    @property
+    def busy_seconds(self) -> float:
+        """The total time the pump has spent handling messages, as opposed to waiting for them"""
+        return self._busy_seconds.value
+
+    @property
+    def last_beat(self) -> Optional[float]:
+        """When the pump last beat, None if it has not beaten yet"""
+        return self._last_beat.value or None
+
+    def record_busy(self, seconds: float) -> None:
+        with self._busy_seconds.get_lock():
+            self._busy_seconds.value += seconds
+
+    def seconds_since_last_beat(self) -> float:
+        """0 until the pump has first beaten, as until then it is still starting"""
+        last_beat = self._last_beat.value
+        return time.time() - last_beat if last_beat else 0.0
+
+
 class MessagePump:
     def __init__(self, command_processor: CommandProcessor,
                  channel: Channel,
                  mapper_func: Callable[[BrightsideMessage], Request],
                  timeout: int = None,
                  unacceptable_message_limit: int = None,
-                 requeue_count: int = None) -> None:
+                 requeue_count: int = None,
+                 liveness: PumpLiveness = None,
+                 drain_timeout: float = None,
+                 metrics: Metrics = None,
+                 tracer: Tracer = None,
+                 rate_limit: float = None,
+                 burst: int = None,
+                 inbox: BrightsideInbox = None,
+                 batch_size: int = 1,
+                 batch_linger: float = 0.0,
+                 claim_check: ClaimCheck = None) -> None:
+        """
+        :param drain_timeout: If set, when we quit we drain the channel: cancel consumption, handle the messages we
+            have already received for up to this many seconds, and requeue any left after that
+        :param metrics: Where we record time spent receiving, translating, dispatching and acknowledging, and
+            loops where we found nothing to do. Defaults to the process' metrics
+        :param tracer: Where we record spans for translating and dispatching each message, as children of the span
+            that posted it. Defaults to the process' tracer
+        :param rate_limit: If set, we receive no more than this many messages a second. We wait for the limit before
+            we receive, not after, so that we leave messages with the broker rather than hold them. A channel can change
+            the limit whilst we run, with set_rate_limit
+        :param burst: The most messages we receive at once, within the rate limit; defaults to 1
+        :param inbox: If set, we record each message we handle there, by its id and our channel, and ack any message
+            we have already handled without handling it again. Put a CachedInbox in front of a database inbox, so that
+            most checks never reach the database
+        :param batch_size: If more than 1, once we receive a command we wait for up to this many, and send those of
+            each request type to the command processor as one batch, for a BatchHandler. We ack, requeue or fail each
+            message by its own outcome. Events we still publish one at a time
+        :param batch_linger: The most seconds we wait, after the first message, to fill a batch
+        :param claim_check: If set, we claim back the body of a message that was checked in when it was posted, just
+            before we translate it; not before, so we never fetch the body of a duplicate
+        """
         self._command_processor = command_processor
         self._channel = channel
         self._mapper_func = mapper_func
@@ -63,6 +139,30 @@ class MessagePump:
         self._unacceptable_message_limit = unacceptable_message_limit if unacceptable_message_limit else 500
         self._unacceptable_message_count = 0
         self._requeue_count = requeue_count
+        self._liveness = liveness
+        self._drain_timeout = drain_timeout
+        self._drained_count = 0
+        self._returned_count = 0
+        self._metrics = metrics or get_metrics()
+        self._metric_labels = {"channel": str(channel.name)}
+        self._tracer = tracer or get_tracer()
+        self._pause_for = None  # type: float
+        self._rate_limiter = TokenBucket(rate_limit, burst) if rate_limit is not None else None
+        self._inbox = inbox
+        self._inbox_key = str(channel.name)
+        self._batch_size = batch_size
+        self._batch_linger = batch_linger
+        self._claim_check = claim_check
+
+    @property
+    def drained_count(self) -> int:
+        """The number of messages we handled whilst draining the channel"""
+        return self._drained_count
+
+    @property
+    def returned_count(self) -> int:
+        """The number of messages we returned to the broker, as we ran out of time to drain them"""
+        return self._returned_count
 
     def run(self, started_event: Event = None) -> None:
 
@@ -72,67 +172,127 @@ class MessagePump:
 
         while True:
 
+            if self._liveness is not None:
+                self._liveness.beat()
+
             if self._unacceptable_message_limit_reached():
                 self._channel.end()
                 break
 
             message = None
             try:
-                self._logger.debug("MessagePump: Receiving messages from {} on thread # {}".format(
-                    self._channel.name, current_thread().name))
+                if self._rate_limiter is not None:
+                    # a control message may arrive whilst we wait, which we must act on now
+                    message = self._wait_for_rate_limit()
 
-                message = self._channel.receive(self._timeout)
+                if message is None:
+                    if self._logger.isEnabledFor(logging.DEBUG):
+                        self._logger.debug("MessagePump: Receiving messages from %s on thread # %s",
+                                           self._channel.name, current_thread().name)
+
+                    with self._metrics.time("brightside_pump_receive_seconds", self._metric_labels):
+                        message = self._channel.receive(self._timeout)
             except ChannelFailureException:
-                self._logger.warning("MessagePump: ChannelFailureException receiving messages from {} on thread # {}".format(
-                    self._channel.name, current_thread().name), exc_info=1)
+                self._logger.warning("MessagePump: ChannelFailureException receiving messages from %s on thread # %s",
+                                     self._channel.name, current_thread().name, exc_info=1)
                 continue
             except Exception:
-                self._logger.warning("MessagePump: Exception receiving messages from {} on thread # {}".format(
-                    self._channel.name, current_thread().name), exc_info=1)
+                self._logger.warning("MessagePump: Exception receiving messages from %s on thread # %s",
+                                     self._channel.name, current_thread().name, exc_info=1)
 
             if message is None:
                 raise ChannelFailureException("Could not receive message. Note that should return BrightsideMessageType.none from an empty queeu")
             elif message.header.message_type == BrightsideMessageType.MT_NONE:
+                self._metrics.increment("brightside_pump_idle_loops_total", labels=self._metric_labels)
                 time.sleep(self._timeout)
                 continue
             elif message.header.message_type == BrightsideMessageType.MT_QUIT:
-                self._logger.debug("MessagePump: Quit receiving messages from {} on thread # {}".format(
-                    self._channel.name, current_thread().name))
-                self._channel.end()
+                self._quit()
                 break
+            elif message.header.message_type == BrightsideMessageType.MT_CONFIGURE:
+                self._configure(message)
+                continue
             elif message.header.message_type == BrightsideMessageType.MT_UNACCEPTABLE:
-                self._logger.debug("MessagePump: Failed to parse a message from the incoming message with id {} from {} on thread # {} ".format(
-                    message.id, self._channel.name, current_thread().name))
+                if self._logger.isEnabledFor(logging.DEBUG):
+                    self._logger.debug("MessagePump: Failed to parse a message from the incoming message with id %s from %s on thread # %s",
+                                       message.id, self._channel.name, current_thread().name)
                 self._acknowledge_message(message)
                 self._increment_unacceptable_message_count()
                 continue
 
-            with (heartbeat(self._channel)):
-                try:
-                    # Serviceable message
-                    request = self._translate_message(message)
-                    self._dispatch_message(message.header, request)
-
-                except DeferMessageException:
-                    self._requeue_message(message)
-                    continue
-                except ConfigurationException:
-                    raise
-                except Exception as ex:
-                    self._logger.error("MessagePump: Failed to dispatch the message with id {} from {} on thread # {} due to {}".format(
-                        message.id, self._channel.name, current_thread().name, ex))
-
-                self._acknowledge_message(message)
+            if self._rate_limiter is not None:
+                self._rate_limiter.take()
+            if self._batch_size > 1:
+                batch, quitting = self._collect_batch(message)
+                self._handle_batch(batch)
+                if quitting:
+                    self._quit()
+                    break
+            else:
+                self._handle_message(message)
+
+            if self._pause_for is not None and self._pause():
+                self._quit()
+                break
 
-        self._logger.debug("MessagePump: Finished running message loop, no longer receiving messages from {} on thread # {}".format(
-            self._channel.name, current_thread().name))
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("MessagePump: Finished running message loop, no longer receiving messages from %s on thread # %s",
+                               self._channel.name, current_thread().name)
 
         self._channel.end()
 
     def _acknowledge_message(self, message: BrightsideMessage) -> None:
-        self._logger.debug("MessagePump: Acknowledge message {} from {} on thread # {}".format(
-            message.id, self._channel.name, current_thread().name))
-        self._channel.acknowledge(message)
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("MessagePump: Acknowledge message %s from %s on thread # %s",
+                               message.id, self._channel.name, current_thread().name)
+        with self._metrics.time("brightside_pump_acknowledge_seconds", self._metric_labels):
+            self._channel.acknowledge(message)
+
+    def _collect_batch(self, first: BrightsideMessage) -> Tuple[List[BrightsideMessage], bool]:
+        """
+        Receive more messages to go with the first, until we have a batch, the linger passes, or the rate limit stops us
+        :return: The batch, and True if we were told to quit whilst we filled it
+        """
+        batch = [first]
+        deadline = time.monotonic() + self._batch_linger
+        while len(batch) < self._batch_size:
+            if self._rate_limiter is not None and self._rate_limiter.wait_time() > 0:
+                break
+            try:
+                message = self._channel.receive(max(0.0, min(self._timeout, deadline - time.monotonic())))
+            except ChannelFailureException:
+                self._logger.warning("MessagePump: ChannelFailureException filling a batch from %s",
+                                     self._channel.name, exc_info=1)
+                break
+
+            if message is None or message.header.message_type == BrightsideMessageType.MT_NONE:
+                if time.monotonic() >= deadline:
+                    break
+            elif message.header.message_type == BrightsideMessageType.MT_QUIT:
+                return batch, True
+            elif message.header.message_type == BrightsideMessageType.MT_CONFIGURE:
+                self._configure(message)
+            elif message.header.message_type == BrightsideMessageType.MT_UNACCEPTABLE:
+                self._acknowledge_message(message)
+                self._increment_unacceptable_message_count()
+            else:
+                if self._rate_limiter is not None:
+                    self._rate_limiter.take()
+                batch.append(message)
+        return batch, False
+
+    def _configure(self, message: BrightsideMessage) -> None:
+        """Apply a control message that changes how we consume"""
+        configuration = json.loads(message.body.value)
+        rate_limit, burst = configuration.get("rate_limit"), configuration.get("burst")
+        if rate_limit is None:
+            self._rate_limiter = None
+        elif self._rate_limiter is None:
+            self._rate_limiter = TokenBucket(rate_limit, burst)
+        else:
+            self._rate_limiter.reconfigure(rate_limit, burst)
+        self._logger.info("MessagePump: Rate limit for %s is now %s messages a second, with bursts of %s",
+                          self._channel.name, rate_limit, burst)
 
     def _discard_requeued_messages_enabled(self):
         return self._requeue_count is not None
@@ -143,28 +303,290 @@ class MessagePump:
         elif message_header.message_type == BrightsideMessageType.MT_EVENT:
             self._command_processor.publish(request)
 
+    def _drain(self) -> None:
+        """
+        Stop the broker sending us more messages, then work through those it has already sent us, until we run out of
+        them or time. Anything left once we run out of time goes back to the broker, so that another consumer can
+        have it; we don't count that as a failure to handle the message
+        """
+        self._logger.info("MessagePump: Draining channel %s for up to %s seconds", self._channel.name, self._drain_timeout)
+        self._channel.cancel()
+        deadline = time.monotonic() + self._drain_timeout
+
+        while True:
+            try:
+                message = self._channel.receive(self._timeout)
+            except Exception:
+                self._logger.warning("MessagePump: Exception draining messages from %s", self._channel.name, exc_info=1)
+                break
+
+            if message is None or message.header.message_type == BrightsideMessageType.MT_NONE:
+                break
+            elif message.header.message_type in (BrightsideMessageType.MT_QUIT, BrightsideMessageType.MT_CONFIGURE):
+                continue
+            elif message.header.message_type == BrightsideMessageType.MT_UNACCEPTABLE:
+                self._acknowledge_message(message)
+            elif time.monotonic() < deadline:
+                self._handle_message(message)
+                # we are quitting anyway, so there is no point pausing
+                self._pause_for = None
+                self._drained_count += 1
+            else:
+                self._channel.requeue(message)
+                self._returned_count += 1
+
+        self._logger.info("MessagePump: Drained channel %s, handled %s messages and returned %s to the broker",
+                          self._channel.name, self._drained_count, self._returned_count)
+
+    def _handle_message(self, message: BrightsideMessage) -> None:
+        handling_started = time.monotonic()
+        if self._inbox is not None and self._is_duplicate(message):
+            self._acknowledge_message(message)
+            self._record_busy(handling_started)
+            return
+        with heartbeat(self._channel), self._start_span(message):
+            try:
+                # Serviceable message
+                with self._metrics.time("brightside_pump_translate_seconds", self._metric_labels), \
+                        self._tracer.start_span("brightside.translate"):
+                    if self._claim_check is not None:
+                        self._claim_check.claim(message)
+                    request = self._translate_message(message)
+                with self._metrics.time("brightside_pump_dispatch_seconds", self._metric_labels), \
+                        self._tracer.start_span("brightside.dispatch"), resume_retries(self._retry_state(message)):
+                    self._dispatch_message(message.header, request)
+                error = None
+            except ConfigurationException:
+                raise
+            except Exception as ex:
+                error = ex
+
+            self._settle(message, error)
+            self._record_busy(handling_started)
+
+    def _handle_batch(self, messages: List[BrightsideMessage]) -> None:
+        handling_started = time.monotonic()
+        if self._inbox is not None:
+            fresh = []
+            for message in messages:
+                if self._is_duplicate(message):
+                    self._acknowledge_message(message)
+                else:
+                    fresh.append(message)
+            messages = fresh
+
+        self._metrics.increment("brightside_pump_batches_total", labels=self._metric_labels)
+        with heartbeat(self._channel), \
+                self._tracer.start_span("brightside.process_batch", attributes={"channel": self._metric_labels["channel"],
+                                                                              "size": len(messages)}):
+            commands = {}
+            # if we must stop for a configuration error, what we have not yet settled goes back to the broker
+            unsettled = {id(message): message for message in messages}
+            try:
+                for message in messages:
+                    try:
+                        with self._metrics.time("brightside_pump_translate_seconds", self._metric_labels):
+                            if self._claim_check is not None:
+                                self._claim_check.claim(message)
+                            request = self._translate_message(message)
+                        retry_state = self._retry_state(message)
+                        # a batch cannot carry on the retries of one message, so one that was deferred goes on its own
+                        if message.header.message_type == BrightsideMessageType.MT_COMMAND and retry_state is None:
+                            commands.setdefault(request.__class__, []).append((message, request))
+                            continue
+                        with self._metrics.time("brightside_pump_dispatch_seconds", self._metric_labels), \
+                                resume_retries(retry_state):
+                            self._dispatch_message(message.header, request)
+                        error = None
+                    except ConfigurationException:
+                        raise
+                    except Exception as ex:
+                        error = ex
+                    self._settle(message, error)
+                    del unsettled[id(message)]
+
+                for batch in commands.values():
+                    with self._metrics.time("brightside_pump_dispatch_seconds", self._metric_labels):
+                        outcomes = self._command_processor.send_batch([request for _, request in batch])
+                    for (message, _), error in zip(batch, outcomes):
+                        self._settle(message, error)
+                        del unsettled[id(message)]
+            except ConfigurationException:
+                self._logger.error("MessagePump: Configuration error handling a batch from %s, returning %s messages to the broker",
+                                   self._channel.name, len(unsettled))
+                for message in unsettled.values():
+                    self._channel.requeue(message)
+                raise
+
+        self._record_busy(handling_started)
+
     def _increment_unacceptable_message_count(self) -> int:
         self._unacceptable_message_count += 1
         return self._unacceptable_message_count
 
-    def _requeue_message(self, message: BrightsideMessage) -> None:
+    def _is_duplicate(self, message: BrightsideMessage) -> bool:
+        try:
+            duplicate = self._inbox.exists(message.id, self._inbox_key)
+        except Exception:
+            # we would rather handle a message twice than not at all
+            self._logger.warning("MessagePump: Could not check the inbox for message %s from %s, handling it",
+                                 message.id, self._channel.name, exc_info=1)
+            return False
+        if duplicate:
+            self._logger.info("MessagePump: Acking message %s from %s without handling it, as it is a duplicate",
+                              message.id, self._channel.name)
+            self._metrics.increment("brightside_pump_duplicates_total", labels=self._metric_labels)
+        return duplicate
+
+    def _pause(self) -> bool:
+        """
+        A handler's circuit breaker is open, so handling messages would only fail them. We stop the broker sending us
+        messages until the breaker will let a probe through, then start again; the next message we handle is the probe.
+        Whilst we wait we keep receiving from the channel, as that keeps the connection's heartbeat going and lets us
+        see a quit message. Anything the broker sent us before we cancelled goes back to it
+        :return: True if we were told to quit whilst we waited
+        """
+        seconds, self._pause_for = max(self._pause_for, self._timeout), None
+        self._logger.warning("MessagePump: A circuit breaker is open, pausing consumption from %s for %s seconds",
+                             self._channel.name, seconds)
+        self._metrics.increment("brightside_pump_pauses_total", labels=self._metric_labels)
+        self._metrics.gauge("brightside_pump_paused", 1, self._metric_labels)
+        self._channel.cancel()
+        deadline = time.monotonic() + seconds
+
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if self._liveness is not None:
+                    self._liveness.beat()
+                try:
+                    message = self._channel.receive(min(self._timeout, remaining))
+                except ChannelFailureException:
+                    self._logger.warning("MessagePump: ChannelFailureException whilst paused on %s",
+                                         self._channel.name, exc_info=1)
+                    continue
+                if message is None or message.header.message_type == BrightsideMessageType.MT_NONE:
+                    time.sleep(max(0.0, min(self._timeout, deadline - time.monotonic())))
+                elif message.header.message_type == BrightsideMessageType.MT_QUIT:
+                    return True
+                elif message.header.message_type == BrightsideMessageType.MT_CONFIGURE:
+                    self._configure(message)
+                elif message.header.message_type == BrightsideMessageType.MT_UNACCEPTABLE:
+                    self._acknowledge_message(message)
+                    self._increment_unacceptable_message_count()
+                else:
+                    self._channel.requeue(message)
+        finally:
+            self._metrics.gauge("brightside_pump_paused", 0, self._metric_labels)
+
+        self._logger.info("MessagePump: Resuming consumption from %s", self._channel.name)
+        self._channel.resume()
+        return False
+
+    def _quit(self) -> None:
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("MessagePump: Quit receiving messages from %s on thread # %s",
+                               self._channel.name, current_thread().name)
+        if self._drain_timeout is not None:
+            self._drain()
+        self._channel.end()
+
+    def _record_busy(self, handling_started: float) -> None:
+        if self._liveness is not None:
+            self._liveness.record_busy(time.monotonic() - handling_started)
+
+    def _record_retry_state(self, message: BrightsideMessage, retry_state: RetryState) -> None:
+        """Carry the attempts retry policies have made on the message, so they carry on from there when it comes back"""
+        merged = self._retry_state(message) or {}
+        merged.update(retry_state)
+        if message.header.bag is None:
+            message.header.bag = {}
+        message.header.bag[RETRY_STATE_HEADER] = json.dumps(merged)
+
+    def _requeue_message(self, message: BrightsideMessage, delay: float = 0.0) -> None:
         message.increment_handled_count()
 
         if self._discard_requeued_messages_enabled():
             if message.handled_count_reached(self._requeue_count):
-                self._logger.error("MessagePump: Have tried {} times to handle this message {} dropping message \n. Message Body {} ".format(
-                    self._requeue_count, message.id, message.body.value))
+                self._logger.error("MessagePump: Have tried %s times to handle this message %s dropping message \n. Message Body %s ",
+                                   self._requeue_count, message.id, message.body.value)
                 self._channel.acknowledge(message)
                 return
 
-        self._logger.debug("MessagePump: Re-queueing message {} from {}".format(
-                message.id, self._channel.name))
-        self._channel.requeue(message)
+        self._logger.debug("MessagePump: Re-queueing message %s from %s after %s seconds", message.id, self._channel.name, delay)
+        self._channel.requeue(message, delay)
+
+    def _settle(self, message: BrightsideMessage, error: Optional[Exception]) -> None:
+        """Ack, requeue, or give up on a message, by how handling it turned out"""
+        if isinstance(error, CircuitBrokenException):
+            # the handler was not called, so this was not an attempt to handle the message
+            self._channel.requeue(message)
+            self._pause_for = error.retry_after
+            return
+        elif isinstance(error, DeferMessageException):
+            if error.retry_state:
+                self._record_retry_state(message, error.retry_state)
+            self._requeue_message(message, error.delay)
+            return
+        elif error is not None:
+            self._logger.error("MessagePump: Failed to dispatch the message with id %s from %s on thread # %s due to %s",
+                               message.id, self._channel.name, current_thread().name, error)
+        elif self._inbox is not None:
+            try:
+                self._inbox.add(message.id, self._inbox_key)
+            except Exception:
+                self._logger.warning("MessagePump: Could not record message %s from %s in the inbox",
+                                     message.id, self._channel.name, exc_info=1)
+
+        self._acknowledge_message(message)
+
+    def _retry_state(self, message: BrightsideMessage) -> Optional[RetryState]:
+        recorded = message.header.bag.get(RETRY_STATE_HEADER) if message.header.bag else None
+        if recorded is None:
+            return None
+        try:
+            return {name: tuple(state) for name, state in json.loads(recorded).items()}
+        except (TypeError, ValueError, AttributeError):
+            self._logger.warning("MessagePump: Ignoring the unreadable retry state of message %s from %s",
+                                 message.id, self._channel.name)
+            return None
+
+    def _start_span(self, message: BrightsideMessage):
+        """Starts the span for handling a message, as a child of the span that posted it, if the message tells us"""
+        if not self._tracer.enabled:
+            return self._tracer.start_span("brightside.process")
+        return self._tracer.start_span("brightside.process", parent=extract(message.header.bag),
+                                       attributes={"channel": self._metric_labels["channel"],
+                                                   "topic": message.header.topic,
+                                                   "message_id": str(message.id)})
 
     def _translate_message(self, message: BrightsideMessage)-> Request:
         if self._mapper_func is None:
             raise ConfigurationException("Missing Mapper Function for message topic {}".format(message.header.topic))
-        return self._mapper_func(message)
+        request = self._mapper_func(message)
+        # so that the handler of a call can reply to it
+        if isinstance(request, Call) and request.reply_address is None and message.header.reply_to:
+            request.reply_address = ReplyAddress(message.header.reply_to, message.header.correlation_id)
+        return request
+
+    def _wait_for_rate_limit(self) -> BrightsideMessage:
+        """
+        Wait until the rate limit lets us receive a message, watching for control messages as we do
+        :return: A control message that arrived whilst we waited, or None once we can receive
+        """
+        while True:
+            wait = self._rate_limiter.wait_time()
+            if wait <= 0:
+                return None
+            message = self._channel.receive_control()
+            if message is not None:
+                return message
+            self._metrics.increment("brightside_pump_throttled_total", labels=self._metric_labels)
+            if self._liveness is not None:
+                self._liveness.beat()
+            time.sleep(min(wait, self._timeout))
 
     def _unacceptable_message_limit_reached(self) -> bool:
         return self._unacceptable_message_count >= self._unacceptable_message_limit
@@ -29,11 +29,18 @@ THE SOFTWARE.
 ***********************************************************************
 """
 
+from concurrent.futures import Future
+from datetime import datetime
+import logging
 from uuid import UUID, uuid4
 from abc import ABCMeta, abstractmethod
 from enum import Enum, unique
 from multiprocessing import Queue
-from threading import Event
+from threading import Event, Lock
+from typing import Iterable
+
+from brightside.exceptions import ConfigurationException, MessagingException
+from brightside.rate_limit import validate_rate_limit
 
 
 class BrightsideMessageBodyType:
@@ -54,6 +61,10 @@ class BrightsideMessageBody:
             self._encoded_body = "".encode()
         self._body_type = body_type
 
+    @property
+    def body_type(self) -> str:
+        return self._body_type
+
     @property
     def value(self) -> str:
         """ Assumes that the body is text/plain i.e. json or xml and so returns the content as a string"""
@@ -78,6 +89,7 @@ class BrightsideMessageType(Enum):
     MT_QUIT = The message was raised as an event and the producer does not care if anyone listens to it
         It contains a notification of what changed
     MT_CALLBACK = Posted back onto the message pump
+    MT_CONFIGURE = A control message that changes how the message pump consumes, i.e. its rate limit
     """
     MT_UNACCEPTABLE = -1
     MT_NONE = 0
@@ -86,6 +98,7 @@ class BrightsideMessageType(Enum):
     MT_DOCUMENT = 3
     MT_QUIT = 5
     MT_CALLBACK = 6
+    MT_CONFIGURE = 7
 
 
 class BrightsideMessageHeader:
@@ -108,6 +121,10 @@ class BrightsideMessageHeader:
     def bag(self) -> dict:
         return self._header_bag
 
+    @bag.setter
+    def bag(self, value: dict):
+        self._header_bag = value
+
     @property
     def handled_count(self) -> int:
         return self._handled_count
@@ -135,6 +152,10 @@ class BrightsideMessageHeader:
     def correlation_id(self) -> UUID:
         return self._correlation_id
 
+    @correlation_id.setter
+    def correlation_id(self, value: UUID):
+        self._correlation_id = value
+
     @property
     def reply_to(self) -> str:
         return self._reply_to
@@ -169,6 +190,10 @@ class BrightsideMessage:
     def body(self) -> BrightsideMessageBody:
         return self._message_body
 
+    @body.setter
+    def body(self, value: BrightsideMessageBody) -> None:
+        self._message_body = value
+
     def handled_count_reached(self, requeue_count: int) -> bool:
         return self._message_header.handled_count >= requeue_count
 
@@ -195,6 +220,26 @@ class BrightsideMessageStore(metaclass=ABCMeta):
         pass
 
 
+class BrightsideInbox(metaclass=ABCMeta):
+    """ Brighter records the messages it has handled in an inbox, so that it can recognise a message it is sent again,
+    by a redelivery or a requeue, and not handle it twice. Entries are keyed by the message id and a context key, as
+    different consumers of the same message, say an event, each handle it once
+    """
+    @abstractmethod
+    def add(self, message_id: UUID, context_key: str) -> bool:
+        """Record that we have handled the message; return False if we had already"""
+        pass
+
+    @abstractmethod
+    def exists(self, message_id: UUID, context_key: str) -> bool:
+        pass
+
+    def ids(self, context_key: str, since: datetime = None) -> Iterable[UUID]:
+        """The ids of the messages we have handled for a context, so that a cache in front of us can be warmed; if
+        since is set, a UTC time, only those we recorded from then on. Override if the inbox can list them"""
+        return []
+
+
 class BrightsideProducer(metaclass=ABCMeta):
     """ The component that sends messages to a broker. Usually abstracts a socket connection to the broker, using
     a vendor specific client library.
@@ -211,33 +256,100 @@ class BrightsideConsumerConfiguration:
     Use is_long_running_handler when you expect a handler to take more than about 10s to execute, this will instruct
     the consumer to spin up a separate thread to send a heartbeat over the connection. Due to the GIL this won't help
     you that much if your handler is CPU bound though.
+    Use drain_timeout to drain the consumer when it is stopped: we cancel consumption from the broker, handle the
+    messages we have already been sent until the timeout passes, then requeue the rest. Without it we just stop, and
+    the broker redelivers anything we had prefetched once our connection closes.
+    Use rate_limit to throttle consumption to so many messages a second, allowing bursts of up to burst messages, for
+    example to stay within what a third-party API accepts. Each performer has its own limit. Prefetched messages wait
+    on us, not the broker, whilst we are throttled, so we prefetch no more than the burst.
+    Use batch_size, with a BatchHandler, to hand the handler up to that many messages at once, waiting up to
+    batch_linger seconds after the first for the rest. We prefetch at least a batch, unless a burst limits us to less.
     """
     def __init__(self, pipeline: Queue, queue_name: str, routing_key: str, prefetch_count: int=1,
-                 is_durable: bool=False, is_ha: bool=False, is_long_running_handler: bool=False):
+                 is_durable: bool=False, is_ha: bool=False, is_long_running_handler: bool=False,
+                 drain_timeout: float=None, rate_limit: float=None, burst: int=None, batch_size: int=1,
+                 batch_linger: float=0.0):
+        if batch_size < 1 or batch_linger < 0:
+            raise ConfigurationException("A batch must hold at least one message, and we cannot linger for a negative "
+                                         "time; not a batch_size of {} and a batch_linger of {}".format(batch_size,
+                                                                                                        batch_linger))
         self._pipeline = pipeline
         self._queue_name = queue_name
         self._routing_key = routing_key
-        self._prefetch_count = prefetch_count
+        self._prefetch_count = max(prefetch_count, batch_size)
+        self._batch_size = batch_size
+        self._batch_linger = batch_linger
         self._is_durable = is_durable
         self._is_ha = is_ha
         self._is_long_running = is_long_running_handler
+        self._drain_timeout = drain_timeout
+        self._rate_limit = None  # type: float
+        self._burst = None  # type: int
+        if rate_limit is not None:
+            self.set_rate_limit(rate_limit, burst)
 
     @property
     def pipeline(self):
         return self._pipeline
 
+    @pipeline.setter
+    def pipeline(self, value: Queue):
+        self._pipeline = value
+
     @property
     def queue_name(self) -> str:
         return self._queue_name
 
+    @queue_name.setter
+    def queue_name(self, value: str):
+        self._queue_name = value
+
     @property
     def routing_key(self) -> str:
         return self._routing_key
 
+    @routing_key.setter
+    def routing_key(self, value: str):
+        self._routing_key = value
+
     @property
     def prefetch_count(self) -> int:
         return self._prefetch_count
 
+    @property
+    def batch_linger(self) -> float:
+        return self._batch_linger
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size
+
+    @property
+    def burst(self) -> int:
+        return self._burst
+
+    @property
+    def rate_limit(self) -> float:
+        return self._rate_limit
+
+    def set_rate_limit(self, rate_limit: float, burst: int=None) -> None:
+        """
+        Throttle consumption; a rate_limit of None removes the limit
+        :param burst: The most messages we handle at once; defaults to the prefetch count, which we reduce to it
+        """
+        if rate_limit is None:
+            self._rate_limit = self._burst = None
+            return
+        burst = burst if burst is not None else max(self._prefetch_count, 1)
+        validate_rate_limit(rate_limit, burst)
+        self._rate_limit = rate_limit
+        self._burst = burst
+        self._prefetch_count = min(self._prefetch_count, burst)
+
+    @property
+    def drain_timeout(self) -> float:
+        return self._drain_timeout
+
     @property
     def is_durable(self) -> bool:
         return self._is_durable
@@ -260,10 +372,19 @@ class BrightsideConsumer(metaclass=ABCMeta):
     def acknowledge(self, message: BrightsideMessage):
         pass
 
+    def cancel(self) -> None:
+        """Stop receiving new messages from the broker, whilst keeping the connection open so that we can still
+        acknowledge or requeue messages already received. Override if the broker supports it"""
+        pass
+
     @abstractmethod
     def has_acknowledged(self, message):
         pass
 
+    def resume(self) -> None:
+        """Start receiving new messages from the broker again, after a cancel. Override if the broker supports it"""
+        pass
+
     @abstractmethod
     def purge(self):
         pass
@@ -273,7 +394,8 @@ class BrightsideConsumer(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def requeue(self, message) -> None:
+    def requeue(self, message, delay: float = 0.0) -> None:
+        """Return the message to the broker, to be delivered again after the delay in seconds, if the broker can"""
         pass
 
     @abstractmethod
@@ -284,3 +406,82 @@ class BrightsideConsumer(metaclass=ABCMeta):
     def stop(self):
         pass
 
+
+class BrightsideReplyReceiver(metaclass=ABCMeta):
+    """
+    Receives the replies to calls made from this process. There is one reply queue for the receiver, however many
+    calls are in flight: each call registers a future for its correlation id, and we complete that future when a reply
+    with the correlation id arrives. Replies nobody is waiting for, because the call timed out, are dropped.
+    Implementations open the reply queue, and start reading from it, on the first call
+    """
+    def __init__(self, logger: logging.Logger = None) -> None:
+        self._futures = {}
+        self._lock = Lock()
+        self._reply_to = None  # type: str
+        self._logger = logger or logging.getLogger(__name__)
+
+    @property
+    def pending(self) -> int:
+        """The number of calls waiting for a reply"""
+        with self._lock:
+            return len(self._futures)
+
+    @property
+    def reply_to(self) -> str:
+        """The address replies should be sent to, the topic of our reply queue; opens the queue if need be"""
+        self.start()
+        return self._reply_to
+
+    def cancel(self, correlation_id: UUID) -> None:
+        """Stop waiting for a reply, for example because the call timed out"""
+        with self._lock:
+            self._futures.pop(correlation_id, None)
+
+    def complete(self, message: BrightsideMessage) -> bool:
+        """
+        Hand a reply to the call waiting for it
+        :return: False if no call was waiting for the reply
+        """
+        with self._lock:
+            future = self._futures.pop(message.header.correlation_id, None)
+        if future is None:
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Dropping reply %s, as no call is waiting for correlation id %s",
+                                   message.id, message.header.correlation_id)
+            return False
+        future.set_result(message)
+        return True
+
+    def register(self, correlation_id: UUID) -> Future:
+        """Wait for a reply with this correlation id; the future completes with the reply message"""
+        self.start()
+        with self._lock:
+            if correlation_id in self._futures:
+                raise MessagingException("A call is already waiting for a reply with correlation id {}".format(correlation_id))
+            future = self._futures[correlation_id] = Future()
+            return future
+
+    def start(self) -> None:
+        with self._lock:
+            if self._reply_to is None:
+                self._reply_to = self._open()
+
+    def stop(self) -> None:
+        """Close the reply queue; calls still waiting fail"""
+        with self._lock:
+            opened, self._reply_to = self._reply_to is not None, None
+            futures, self._futures = self._futures, {}
+        # outside the lock, as closing waits for our reader, which may be completing a reply
+        if opened:
+            self._close()
+        for future in futures.values():
+            future.set_exception(MessagingException("The reply receiver was stopped"))
+
+    @abstractmethod
+    def _close(self) -> None:
+        pass
+
+    @abstractmethod
+    def _open(self) -> str:
+        """Open the reply queue and start reading from it; return the topic that routes replies to the queue"""
+        pass
@@ -0,0 +1,243 @@
+"""
+File             : metrics.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import bisect
+import time
+from abc import ABCMeta, abstractmethod
+from threading import Lock
+from typing import Dict, Iterable, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics(metaclass=ABCMeta):
+    """
+    Where Brightside records what it is doing: counters, gauges and histograms of timings, each with a name and
+    optional labels. The default is NullMetrics, which records nothing; use InMemoryMetrics to collect them.
+    Check enabled before doing any work that is only needed to record a metric
+    """
+    @property
+    def enabled(self) -> bool:
+        return True
+
+    @abstractmethod
+    def gauge(self, name: str, value: float, labels: Dict[str, str] = None) -> None:
+        pass
+
+    @abstractmethod
+    def increment(self, name: str, value: float = 1, labels: Dict[str, str] = None) -> None:
+        pass
+
+    @abstractmethod
+    def observe(self, name: str, value: float, labels: Dict[str, str] = None) -> None:
+        pass
+
+    def time(self, name: str, labels: Dict[str, str] = None) -> '_Timer':
+        """A context manager that observes the seconds spent within it"""
+        return _Timer(self, name, labels)
+
+
+class NullMetrics(Metrics):
+    """Records nothing, at as little cost as we can manage"""
+    @property
+    def enabled(self) -> bool:
+        return False
+
+    def gauge(self, name: str, value: float, labels: Dict[str, str] = None) -> None:
+        pass
+
+    def increment(self, name: str, value: float = 1, labels: Dict[str, str] = None) -> None:
+        pass
+
+    def observe(self, name: str, value: float, labels: Dict[str, str] = None) -> None:
+        pass
+
+    def time(self, name: str, labels: Dict[str, str] = None) -> '_Timer':
+        return _NULL_TIMER
+
+
+class InMemoryMetrics(Metrics):
+    """
+    Collects metrics in memory. Safe to use from many threads. A snapshot is a plain dictionary, so it can be
+    pickled and sent to another process, where it can be merged with snapshots from other processes
+    """
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS) -> None:
+        self._buckets = tuple(sorted(buckets))
+        self._counters = {}  # type: Dict[Tuple[str, Labels], float]
+        self._gauges = {}  # type: Dict[Tuple[str, Labels], float]
+        self._histograms = {}
+        self._lock = Lock()
+
+    def gauge(self, name: str, value: float, labels: Dict[str, str] = None) -> None:
+        with self._lock:
+            self._gauges[(name, _key(labels))] = value
+
+    def increment(self, name: str, value: float = 1, labels: Dict[str, str] = None) -> None:
+        key = (name, _key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Dict[str, str] = None) -> None:
+        key = (name, _key(labels))
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # one count per bucket, plus +Inf, then the sum
+                histogram = self._histograms[key] = [0] * (len(self._buckets) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def counter_value(self, name: str, labels: Dict[str, str] = None) -> float:
+        with self._lock:
+            return self._counters.get((name, _key(labels)), 0)
+
+    def gauge_value(self, name: str, labels: Dict[str, str] = None) -> float:
+        with self._lock:
+            return self._gauges.get((name, _key(labels)))
+
+    def histogram_count(self, name: str, labels: Dict[str, str] = None) -> int:
+        with self._lock:
+            histogram = self._histograms.get((name, _key(labels)))
+            return sum(histogram[:-1]) if histogram is not None else 0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"buckets": self._buckets,
+                    "counters": dict(self._counters),
+                    "gauges": dict(self._gauges),
+                    "histograms": {k: list(v) for k, v in self._histograms.items()}}
+
+
+def merge_snapshots(snapshots: Iterable[Dict]) -> Dict:
+    """
+    Combine snapshots from many processes into one. Counters and histograms are summed. So are gauges, as we use
+    them for depths, where the total across processes is what we want to see
+    """
+    merged = {"buckets": DEFAULT_BUCKETS, "counters": {}, "gauges": {}, "histograms": {}}
+    for snapshot in snapshots:
+        merged["buckets"] = snapshot["buckets"]
+        for kind in ("counters", "gauges"):
+            for key, value in snapshot[kind].items():
+                merged[kind][key] = merged[kind].get(key, 0) + value
+        for key, value in snapshot["histograms"].items():
+            existing = merged["histograms"].get(key)
+            merged["histograms"][key] = list(value) if existing is None else [a + b for a, b in zip(existing, value)]
+    return merged
+
+
+def to_prometheus_text(snapshot: Dict) -> str:
+    """Renders a snapshot in the Prometheus text exposition format"""
+    lines = []
+
+    def _series(kind: str, name: str) -> None:
+        if name not in declared:
+            declared.add(name)
+            lines.append("# TYPE {} {}".format(name, kind))
+
+    declared = set()
+    for (name, labels), value in sorted(snapshot["counters"].items()):
+        _series("counter", name)
+        lines.append("{}{} {}".format(name, _format_labels(labels), _format_value(value)))
+
+    for (name, labels), value in sorted(snapshot["gauges"].items()):
+        _series("gauge", name)
+        lines.append("{}{} {}".format(name, _format_labels(labels), _format_value(value)))
+
+    buckets = snapshot["buckets"]
+    for (name, labels), histogram in sorted(snapshot["histograms"].items()):
+        _series("histogram", name)
+        cumulative = 0
+        for bound, count in zip([str(b) for b in buckets] + ["+Inf"], histogram[:-1]):
+            cumulative += count
+            lines.append("{}_bucket{} {}".format(name, _format_labels(labels + (("le", bound),)), cumulative))
+        lines.append("{}_sum{} {}".format(name, _format_labels(labels), _format_value(histogram[-1])))
+        lines.append("{}_count{} {}".format(name, _format_labels(labels), cumulative))
+
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+_metrics = NullMetrics()  # type: Metrics
+
+
+def get_metrics() -> Metrics:
+    """The metrics Brightside components in this process use, unless they are given their own"""
+    return _metrics
+
+
+def set_metrics(metrics: Metrics) -> None:
+    """
+    Set the metrics Brightside components in this process use, unless they are given their own. Components pick
+    this up when they are created, so set it before you create them
+    """
+    global _metrics
+    _metrics = metrics if metrics is not None else NullMetrics()
+
+
+class _Timer:
+    def __init__(self, metrics: Metrics, name: str, labels: Dict[str, str]) -> None:
+        self._metrics = metrics
+        self._name = name
+        self._labels = labels
+        self._started = 0.0
+
+    def __enter__(self) -> '_Timer':
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._metrics.observe(self._name, time.perf_counter() - self._started, self._labels)
+
+
+class _NullTimer:
+    def __enter__(self) -> '_NullTimer':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _key(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items())) if labels else ()
@@ -0,0 +1,116 @@
+"""
+File             : partitioning.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import copy
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+from brightside.exceptions import ConfigurationException
+from brightside.handler import Request
+from brightside.messaging import BrightsideConsumerConfiguration, BrightsideMessage
+
+# If the message mapper puts a key in the header bag under this name, we partition on it; we also record the key we
+# partitioned on here, so a consumer can see it
+PARTITION_KEY_HEADER = "x-partition-key"
+
+
+def partition_for(key: Any, partitions: int) -> int:
+    """
+    The partition for a key. We use crc32 rather than hash(), as Python salts hash() for each process, and the
+    producer and consumers must agree on which key goes where
+    """
+    return zlib.crc32(str(key).encode("utf-8")) % partitions
+
+
+def partition_name(name: str, partition: int) -> str:
+    """The routing key, or queue name, of one partition"""
+    return "{}.{}".format(name, partition)
+
+
+def partition_configuration(configuration: BrightsideConsumerConfiguration,
+                            partition: int) -> BrightsideConsumerConfiguration:
+    """A copy of the configuration that reads the queue for one partition, bound to that partition's routing key"""
+    shard = copy.copy(configuration)
+    shard.queue_name = partition_name(configuration.queue_name, partition)
+    shard.routing_key = partition_name(configuration.routing_key, partition)
+    return shard
+
+
+def partition_key_attribute(request: Request) -> Optional[Any]:
+    """The default way to find a request's partition key: its partition_key attribute, if it has one"""
+    return getattr(request, "partition_key", None)
+
+
+class Partitioner:
+    """
+    Spreads the messages for a topic over a fixed number of partitions, each with its own routing key, so that all
+    messages with the same key, say the id of an aggregate, go to the same queue. Give the consumer for that topic the
+    same number of partitions, and the Dispatcher runs one performer per partition, so each key is handled in order.
+    A message with no key goes to a partition chosen by its id, as nothing asked for it to be ordered.
+    The partition is the key's hash modulo the partitions, so changing the number of partitions moves keys between
+    them; drain the queues before you do, or you may handle messages for a key out of order
+    """
+    def __init__(self, partitions: Dict[str, int],
+                 key_func: Callable[[Request], Optional[Any]] = partition_key_attribute) -> None:
+        """
+        :param partitions: The number of partitions for each topic we partition; we leave other topics alone
+        :param key_func: Finds the partition key of a request, if the header bag does not have one. Returns None if
+            the request has no key
+        """
+        for topic, count in partitions.items():
+            if count < 1:
+                raise ConfigurationException("The topic {} must have at least one partition".format(topic))
+        self._partitions = dict(partitions)
+        self._key_func = key_func
+
+    def partition(self, request: Request, message: BrightsideMessage) -> Optional[int]:
+        """
+        Route the message to the partition for its key, by changing its topic
+        :return: The partition, or None if we do not partition the message's topic
+        """
+        partitions = self._partitions.get(message.header.topic)
+        if partitions is None:
+            return None
+
+        bag = message.header.bag
+        key = bag.get(PARTITION_KEY_HEADER) if bag else None
+        if key is None:
+            key = self._key_func(request)
+
+        if key is None:
+            partition = partition_for(message.id, partitions)
+        else:
+            partition = partition_for(key, partitions)
+            if bag is None:
+                bag = message.header.bag = {}
+            bag[PARTITION_KEY_HEADER] = str(key)
+
+        message.header.topic = partition_name(message.header.topic, partition)
+        return partition
@@ -0,0 +1,150 @@
+"""
+File             : pipeline.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import logging
+import time
+from abc import ABCMeta, abstractmethod
+from functools import partial
+from typing import Any, Callable, Iterable, Tuple, Type, Union
+
+from brightside.exceptions import ConfigurationException
+from brightside.handler import Handler, Request
+from brightside.metrics import Metrics, get_metrics
+
+# What a step calls to run the rest of the pipeline, ending with the handler
+NextStep = Callable[[Request], Any]
+
+
+class Step(metaclass=ABCMeta):
+    """
+    One orthogonal concern, such as logging or retry, run around a handler. Register steps with the Registry, for all
+    requests or for one request type, and the CommandProcessor composes them, with the handler, into one callable per
+    handler, which it reuses until the registrations change.
+    A step calls next_step to run the rest of the pipeline; it can short-circuit the pipeline by not calling it.
+    The same step instance runs for every request it is registered for, perhaps on many threads at once, so any state it
+    keeps must be safe to share
+    """
+    @abstractmethod
+    def handle(self, request: Request, next_step: NextStep) -> Any:
+        pass
+
+
+def compose(steps: Iterable[Step], handler_factory: Callable[[], Handler]) -> NextStep:
+    """
+    Composes steps, outermost first, around a handler into one callable that takes the request. We only create the
+    handler if every step passes the request on
+    """
+    def _handle(request: Request) -> Any:
+        return handler_factory().handle(request)
+
+    pipeline = _handle
+    for step in reversed(list(steps)):
+        pipeline = partial(step.handle, next_step=pipeline)
+    return pipeline
+
+
+class FeatureFlagStep(Step):
+    """
+    Only passes a request on if a feature is enabled, so that a handler can be turned off without being unregistered.
+    We check the flag for every request, so it can change whilst we run
+    :param is_enabled: Tells us if the feature is enabled for this request
+    """
+    def __init__(self, is_enabled: Callable[[Request], bool], logger: logging.Logger=None) -> None:
+        self._is_enabled = is_enabled
+        self._logger = logger or logging.getLogger(__name__)
+
+    def handle(self, request: Request, next_step: NextStep) -> Any:
+        if not self._is_enabled(request):
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Feature disabled, not handling %s with id %s", request.__class__.__name__, request.id)
+            return None
+        return next_step(request)
+
+
+class LoggingStep(Step):
+    """
+    Logs entry to, and exit from, the rest of the pipeline, along with the request, as the log_handler decorator does
+    for a single handler. We do nothing else unless the logger is enabled for the level
+    """
+    def __init__(self, level: int=logging.DEBUG, logger: logging.Logger=None) -> None:
+        self._level = level
+        self._logger = logger or logging.getLogger(__name__)
+
+    def handle(self, request: Request, next_step: NextStep) -> Any:
+        if not self._logger.isEnabledFor(self._level):
+            return next_step(request)
+        self._logger.log(self._level, "Entering handle %s", request)
+        response = next_step(request)
+        self._logger.log(self._level, "Exiting handle %s", request)
+        return response
+
+
+class RetryStep(Step):
+    """
+    Runs the rest of the pipeline again if it raises one of the given exceptions, up to a number of times, waiting
+    between attempts. Once we run out of attempts, we raise the last exception
+    :param exceptions: The exception, or exceptions, that we retry
+    :param times: The most attempts we make, including the first
+    :param interval: The seconds we wait between attempts
+    """
+    def __init__(self, exceptions: Union[Type[Exception], Tuple[Type[Exception], ...]], times: int=3,
+                 interval: float=1.0, logger: logging.Logger=None) -> None:
+        if times < 1:
+            raise ConfigurationException("A retry must make at least one attempt, not {}".format(times))
+        self._exceptions = exceptions
+        self._times = times
+        self._interval = interval
+        self._logger = logger or logging.getLogger(__name__)
+
+    def handle(self, request: Request, next_step: NextStep) -> Any:
+        attempt = 1
+        while True:
+            try:
+                return next_step(request)
+            except self._exceptions as ex:
+                if attempt >= self._times:
+                    raise
+                self._logger.warning("Attempt %s of %s to handle %s with id %s failed with %r, retrying in %s seconds",
+                                     attempt, self._times, request.__class__.__name__, request.id, ex, self._interval)
+                attempt += 1
+                time.sleep(self._interval)
+
+
+class TimingStep(Step):
+    """Observes the seconds the rest of the pipeline takes, by request type"""
+    def __init__(self, metrics: Metrics=None, name: str="brightside_pipeline_seconds") -> None:
+        self._metrics = metrics or get_metrics()
+        self._name = name
+
+    def handle(self, request: Request, next_step: NextStep) -> Any:
+        if not self._metrics.enabled:
+            return next_step(request)
+        with self._metrics.time(self._name, {"request_type": request.__class__.__name__}):
+            return next_step(request)
@@ -0,0 +1,415 @@
+"""
+File             : policies.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from abc import abstractmethod
+from contextlib import contextmanager
+from enum import Enum, unique
+from threading import Condition, Lock
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple, Type, Union
+
+from brightside.exceptions import CircuitBrokenException, ConfigurationException, DeferMessageException
+from brightside.handler import Request
+from brightside.pipeline import NextStep, Step
+
+Exceptions = Union[Type[Exception], Tuple[Type[Exception], ...]]
+
+# The attempts each retry policy has made at a message, and when it made the first, by policy name
+RetryState = Dict[str, Tuple[int, float]]
+
+# Where the message pump keeps the retry state of a deferred message, as JSON
+RETRY_STATE_HEADER = "x-retry-state"
+
+_resumed_retries = contextvars.ContextVar("brightside_resumed_retries", default=None)
+
+
+@contextmanager
+def resume_retries(retry_state: Optional[RetryState]) -> Iterator[None]:
+    """
+    Have the retry policies called within carry on from the attempts they made before they deferred a message, rather
+    than start again, so that a message that keeps failing runs out of attempts, or time, and fails
+    :param retry_state: The retry state of the DeferMessageException that deferred the message
+    """
+    token = _resumed_retries.set(retry_state)
+    try:
+        yield
+    finally:
+        _resumed_retries.reset(token)
+
+
+class Policy(Step):
+    """
+    A named way of calling something that may fail, such as a downstream service. Policies are steps, so you can add
+    them to the pipeline around a handler; add the same policy to many handlers, through a PolicyRegistry, and they
+    share it, so that handlers calling the same downstream share one circuit breaker
+    """
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @abstractmethod
+    def execute(self, func: Callable[[], Any]) -> Any:
+        pass
+
+    @abstractmethod
+    async def execute_async(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        pass
+
+    def handle(self, request: Request, next_step: NextStep) -> Any:
+        return self.execute(lambda: next_step(request))
+
+
+class RetryPolicy(Policy):
+    """
+    Retries a call that raises one of the given exceptions, backing off exponentially between attempts, with full
+    jitter so that many callers that failed together do not retry together.
+    A message pump thread that sleeps through a backoff cannot handle anything else, so once a backoff would be longer
+    than defer_after we stop, and raise DeferMessageException with the backoff as its delay; the pump requeues the
+    message to be delivered again after it. The pump records the attempts we made, and when we made the first, on the
+    message, so when it comes back we carry on from there, and attempts and deadline count across deferrals
+    :param name: The name of the policy in the registry
+    :param exceptions: The exception, or exceptions, that we retry
+    :param attempts: The most attempts we make, including the first
+    :param backoff: The seconds we wait after the first attempt; we double it after each attempt after that
+    :param max_backoff: The most seconds we wait between attempts
+    :param jitter: If true, wait a random time between zero and the backoff
+    :param deadline: If set, we give up, rather than wait for a backoff that would take us past this many seconds
+        since the first attempt, across deferrals
+    :param defer_after: If set, defer the message rather than wait for a backoff longer than this many seconds
+    """
+    def __init__(self, name: str, exceptions: Exceptions=Exception, attempts: int=3, backoff: float=0.1,
+                 max_backoff: float=10.0, jitter: bool=True, deadline: Optional[float]=None,
+                 defer_after: Optional[float]=None, logger: logging.Logger=None) -> None:
+        super().__init__(name)
+        if attempts < 1:
+            raise ConfigurationException("A retry must make at least one attempt, not {}".format(attempts))
+        if backoff < 0 or max_backoff < 0:
+            raise ConfigurationException("A retry cannot back off for less than no time")
+        self._exceptions = exceptions
+        self._attempts = attempts
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._jitter = jitter
+        self._deadline = deadline
+        self._defer_after = defer_after
+        self._logger = logger or logging.getLogger(__name__)
+
+    def backoff(self, attempt: int) -> float:
+        """The seconds to wait after a failed attempt, the first being 1"""
+        ceiling = min(self._max_backoff, self._backoff * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling) if self._jitter else ceiling
+
+    def execute(self, func: Callable[[], Any]) -> Any:
+        attempt, started = self._resume()
+        while True:
+            try:
+                return func()
+            except (DeferMessageException, CircuitBrokenException):
+                raise
+            except self._exceptions as ex:
+                delay = self._next_delay(attempt, started, ex)
+            time.sleep(delay)
+            attempt += 1
+
+    async def execute_async(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        attempt, started = self._resume()
+        while True:
+            try:
+                return await func()
+            except (DeferMessageException, CircuitBrokenException):
+                raise
+            except self._exceptions as ex:
+                delay = self._next_delay(attempt, started, ex)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _next_delay(self, attempt: int, started: float, ex: Exception) -> float:
+        """How long to wait before the next attempt; raises if we should not make one"""
+        if attempt >= self._attempts:
+            raise ex
+        delay = self.backoff(attempt)
+        # wall clock time, not monotonic, as a deferred message may come back to another process
+        if self._deadline is not None and time.time() - started + delay > self._deadline:
+            raise ex
+        if self._defer_after is not None and delay > self._defer_after:
+            self._logger.warning("Policy %s: attempt %s of %s failed with %r, deferring for %s seconds",
+                                 self._name, attempt, self._attempts, ex, delay)
+            raise DeferMessageException("Deferred by retry policy {}".format(self._name), delay=delay,
+                                        retry_state={self._name: (attempt, started)}) from ex
+        self._logger.warning("Policy %s: attempt %s of %s failed with %r, retrying in %s seconds",
+                             self._name, attempt, self._attempts, ex, delay)
+        return delay
+
+    def _resume(self) -> Tuple[int, float]:
+        """The attempt we are about to make, and when we made the first, carrying on from before a deferral"""
+        retry_state = _resumed_retries.get()
+        if retry_state and self._name in retry_state:
+            attempts_made, started = retry_state[self._name]
+            return attempts_made + 1, started
+        return 1, time.time()
+
+
+@unique
+class CircuitState(Enum):
+    """
+    CLOSED = calls go through
+    OPEN = calls fail at once with CircuitBrokenException, until the reset timeout passes
+    HALF_OPEN = we let a probe through; if it succeeds we close, if it fails we open again
+    """
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+
+class CircuitBreaker(Policy):
+    """
+    Stops calling something that keeps failing, to give it time to recover. Once calls raise one of the given
+    exceptions failure_threshold times in a row, we open, and fail calls at once with CircuitBrokenException. After
+    reset_timeout seconds we let a probe through; if it succeeds we close again. Safe to share across threads
+    :param name: The name of the policy in the registry
+    :param exceptions: The exception, or exceptions, that count as failures; others pass through without counting
+    :param failure_threshold: The failures in a row that open the circuit
+    :param reset_timeout: The seconds we stay open before we probe
+    """
+    def __init__(self, name: str, exceptions: Exceptions=Exception, failure_threshold: int=5,
+                 reset_timeout: float=30.0, logger: logging.Logger=None) -> None:
+        super().__init__(name)
+        if failure_threshold < 1:
+            raise ConfigurationException("A circuit breaker must allow at least one failure, not {}".format(failure_threshold))
+        self._exceptions = exceptions
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._logger = logger or logging.getLogger(__name__)
+        self._lock = Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def retry_after(self) -> float:
+        """The seconds until we will let a probe through; 0 unless we are open"""
+        with self._lock:
+            return self._retry_after()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            if self._state == CircuitState.OPEN and self._retry_after() == 0:
+                return CircuitState.HALF_OPEN
+            return self._state
+
+    def execute(self, func: Callable[[], Any]) -> Any:
+        self._before_call()
+        try:
+            result = func()
+        except (DeferMessageException, CircuitBrokenException):
+            self._after_call(None)
+            raise
+        except self._exceptions:
+            self._after_call(False)
+            raise
+        except BaseException:
+            self._after_call(None)
+            raise
+        self._after_call(True)
+        return result
+
+    async def execute_async(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        self._before_call()
+        try:
+            result = await func()
+        except (DeferMessageException, CircuitBrokenException):
+            self._after_call(None)
+            raise
+        except self._exceptions:
+            self._after_call(False)
+            raise
+        except BaseException:
+            self._after_call(None)
+            raise
+        self._after_call(True)
+        return result
+
+    def _after_call(self, succeeded: Optional[bool]) -> None:
+        """Record the outcome of a call: True for a success, False for a failure, None for neither"""
+        with self._lock:
+            was_probe, self._probing = self._probing, False
+            if succeeded is None:
+                return
+            if succeeded:
+                if self._state != CircuitState.CLOSED:
+                    self._logger.warning("Circuit breaker %s closed", self._name)
+                self._state = CircuitState.CLOSED
+                self._failures = 0
+                return
+            self._failures += 1
+            if was_probe or self._failures >= self._failure_threshold:
+                if self._state != CircuitState.OPEN or was_probe:
+                    self._logger.warning("Circuit breaker %s opened after %s failures, for %s seconds",
+                                         self._name, self._failures, self._reset_timeout)
+                self._state = CircuitState.OPEN
+                self._opened_at = time.monotonic()
+
+    def _before_call(self) -> None:
+        with self._lock:
+            if self._state == CircuitState.CLOSED:
+                return
+            retry_after = self._retry_after()
+            if retry_after > 0 or self._probing:
+                raise CircuitBrokenException("Circuit breaker {} is open".format(self._name),
+                                             retry_after=retry_after)
+            self._state = CircuitState.HALF_OPEN
+            self._probing = True
+
+    def _retry_after(self) -> float:
+        if self._state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self._reset_timeout - time.monotonic())
+
+
+class Bulkhead(Policy):
+    """
+    Limits how many calls run at once, so that one slow dependency cannot take every worker from the handlers that
+    share a CommandProcessor with it. A call that finds the bulkhead full waits for room, up to queue_timeout; no more
+    than max_queued calls wait. If there is no room to wait, or the wait times out, we raise DeferMessageException, so
+    the message pump requeues the message after defer_delay seconds, rather than tie up a thread waiting.
+    Name a bulkhead for a downstream, and have the handlers that call it use it by name, to limit them together
+    :param name: The name of the policy in the registry
+    :param max_concurrent: The most calls that run at once
+    :param max_queued: The most calls that wait for room
+    :param queue_timeout: The most seconds a call waits for room
+    :param defer_delay: The seconds to ask for a deferred message to be requeued for
+    """
+    def __init__(self, name: str, max_concurrent: int, max_queued: int=0, queue_timeout: float=0.0,
+                 defer_delay: float=1.0, logger: logging.Logger=None) -> None:
+        super().__init__(name)
+        if max_concurrent < 1:
+            raise ConfigurationException("A bulkhead must allow at least one call, not {}".format(max_concurrent))
+        if max_queued < 0:
+            raise ConfigurationException("A bulkhead cannot queue fewer than no calls")
+        self._max_concurrent = max_concurrent
+        self._max_queued = max_queued
+        self._queue_timeout = queue_timeout
+        self._defer_delay = defer_delay
+        self._logger = logger or logging.getLogger(__name__)
+        self._condition = Condition()
+        self._in_use = 0
+        self._queued = 0
+
+    @property
+    def in_use(self) -> int:
+        with self._condition:
+            return self._in_use
+
+    @property
+    def queued(self) -> int:
+        with self._condition:
+            return self._queued
+
+    def execute(self, func: Callable[[], Any]) -> Any:
+        self._acquire()
+        try:
+            return func()
+        finally:
+            self._release()
+
+    async def execute_async(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        # waiting for room blocks, so we wait on the loop's executor rather than the loop
+        acquiring = asyncio.get_running_loop().run_in_executor(None, self._acquire)
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # we cannot stop the executor waiting for room, so if it gets some, we give it straight back
+            acquiring.add_done_callback(self._release_acquired)
+            raise
+        try:
+            return await func()
+        finally:
+            self._release()
+
+    def _acquire(self) -> None:
+        with self._condition:
+            if self._in_use < self._max_concurrent:
+                self._in_use += 1
+                return
+            if self._queued >= self._max_queued:
+                self._defer("full")
+            self._queued += 1
+            try:
+                if not self._condition.wait_for(lambda: self._in_use < self._max_concurrent, self._queue_timeout):
+                    self._defer("still full after {} seconds".format(self._queue_timeout))
+                self._in_use += 1
+            finally:
+                self._queued -= 1
+
+    def _defer(self, reason: str) -> None:
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("Bulkhead %s is %s, deferring for %s seconds", self._name, reason, self._defer_delay)
+        raise DeferMessageException("Bulkhead {} is {}".format(self._name, reason), delay=self._defer_delay)
+
+    def _release(self) -> None:
+        with self._condition:
+            self._in_use -= 1
+            self._condition.notify()
+
+    def _release_acquired(self, acquiring: asyncio.Future) -> None:
+        if not acquiring.cancelled() and acquiring.exception() is None:
+            self._release()
+
+
+class PolicyRegistry:
+    """
+    Policies by name, so that handlers can share them, and so share state such as an open circuit or a full
+    bulkhead. Add a policy to the pipeline of the handlers that use it with CommandProcessor.use_policy
+    """
+    def __init__(self) -> None:
+        self._policies = {}  # type: Dict[str, Policy]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._policies
+
+    def add(self, policy: Policy) -> None:
+        if policy.name in self._policies:
+            raise ConfigurationException("There is already a policy called {}".format(policy.name))
+        self._policies[policy.name] = policy
+
+    def lookup(self, name: str) -> Policy:
+        policy = self._policies.get(name)
+        if policy is None:
+            raise ConfigurationException("There is no policy called {}".format(name))
+        return policy
@@ -0,0 +1,90 @@
+"""
+File             : rate_limit.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import time
+from typing import Callable
+
+from brightside.exceptions import ConfigurationException
+
+
+class TokenBucket:
+    """
+    Limits a rate, whilst allowing bursts: the bucket holds up to burst tokens, refilled at rate tokens a second, and
+    each message takes one. Not safe to share across threads; each message pump has its own
+    :param rate: The tokens we add a second, which is the rate we allow over time
+    :param burst: The most tokens the bucket holds, which is the most messages we allow at once; defaults to 1
+    """
+    def __init__(self, rate: float, burst: int = None, clock: Callable[[], float] = time.monotonic) -> None:
+        validate_rate_limit(rate, burst)
+        self._clock = clock
+        self._rate = rate
+        self._burst = burst if burst is not None else 1
+        self._tokens = float(self._burst)
+        self._updated = clock()
+
+    @property
+    def burst(self) -> int:
+        return self._burst
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def reconfigure(self, rate: float, burst: int = None) -> None:
+        """Change the rate and burst; we keep the tokens we have, up to the new burst"""
+        validate_rate_limit(rate, burst)
+        self._refill()
+        self._rate = rate
+        self._burst = burst if burst is not None else 1
+        self._tokens = min(self._tokens, self._burst)
+
+    def take(self) -> None:
+        """Take a token; check wait_time first, or we will go into debt, which we repay before we allow more"""
+        self._refill()
+        self._tokens -= 1
+
+    def wait_time(self) -> float:
+        """The seconds until there is a token to take; 0 if there is one now"""
+        self._refill()
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self._rate
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+
+def validate_rate_limit(rate: float, burst: int = None) -> None:
+    if rate is None or rate <= 0:
+        raise ConfigurationException("A rate limit must be more than 0 messages a second, not {}".format(rate))
+    if burst is not None and burst < 1:
+        raise ConfigurationException("A rate limit must allow a burst of at least 1 message, not {}".format(burst))
@@ -28,11 +28,12 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 ***********************************************************************
 """
-from typing import Callable, Dict, List, TypeVar
+from typing import Callable, Dict, List, Optional, TypeVar
 
 from brightside.handler import Handler, Request
 from brightside.messaging import BrightsideMessage
 from brightside.exceptions import ConfigurationException
+from brightside.pipeline import Step
 
 
 class Registry:
@@ -42,6 +43,31 @@ class Registry:
 
     def __init__(self) -> None:
         self._registry = dict()  # type: Dict[str, List[Callable[[], Handler]]]
+        self._steps = []  # type: List[Step]
+        self._request_steps = dict()  # type: Dict[str, List[Step]]
+        self._version = 0
+
+    def add_step(self, step: Step, request_class: Optional[type]=None) -> None:
+        """
+        Add a step to the pipeline that runs around handlers. Steps for all requests run outside those for one request
+        type; otherwise steps run in the order they were added, the first outermost
+        :param step: The step to add
+        :param request_class: The request type to run the step for; if None, we run it for all requests
+        """
+        if request_class is None:
+            self._steps.append(step)
+        else:
+            self._request_steps.setdefault(request_class.__name__, []).append(step)
+        self._version += 1
+
+    def steps_for(self, request: Request) -> List[Step]:
+        """The steps to run around the handlers for a request, outermost first"""
+        return self._steps + self._request_steps.get(request.__class__.__name__, [])
+
+    @property
+    def version(self) -> int:
+        """Changes whenever a handler or step is registered, so that anything composed from them can be recomposed"""
+        return self._version
 
     def register(self, request_class: Request, handler_factory: Callable[[], Handler]) -> None:
         """
@@ -61,6 +87,7 @@ class Registry:
             self._registry[key].append(handler_factory)
         elif is_command or is_event:
             self._registry[key] = [handler_factory]
+        self._version += 1
 
     def lookup(self, request: Request) -> List[Callable[[], Handler]]:
         """
@@ -0,0 +1,297 @@
+"""
+File             : tracing.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import logging
+import os
+import re
+import time
+from abc import ABCMeta, abstractmethod
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+TRACEPARENT_HEADER = "traceparent"
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class SpanContext:
+    """
+    Identifies a span, and the trace it belongs to, across processes. On the wire we use the W3C traceparent format
+    (https://www.w3.org/TR/trace-context/), carried in the message header bag, so we can join traces with other
+    services that use it
+    """
+    def __init__(self, trace_id: str, span_id: str, sampled: bool = True) -> None:
+        self._trace_id = trace_id
+        self._span_id = span_id
+        self._sampled = sampled
+
+    @property
+    def sampled(self) -> bool:
+        return self._sampled
+
+    @property
+    def span_id(self) -> str:
+        return self._span_id
+
+    @property
+    def trace_id(self) -> str:
+        return self._trace_id
+
+    def to_traceparent(self) -> str:
+        return "00-{}-{}-{}".format(self._trace_id, self._span_id, "01" if self._sampled else "00")
+
+    @staticmethod
+    def from_traceparent(value: str) -> Optional['SpanContext']:
+        """Returns None if the value is not a traceparent we understand, so that a bad header cannot stop a message"""
+        match = _TRACEPARENT.match(value.strip().lower()) if isinstance(value, str) else None
+        if match is None or match.group(1) == "ff":
+            return None
+        _, trace_id, span_id, flags = match.groups()
+        if trace_id == "0" * 32 or span_id == "0" * 16:
+            return None
+        return SpanContext(trace_id, span_id, bool(int(flags, 16) & 0x01))
+
+
+class Span:
+    """
+    A timed operation within a trace. Use it as a context manager: whilst it is open it is the current span, and
+    spans started within it are its children. An exception raised through it marks it as an error
+    """
+    def __init__(self, tracer: 'Tracer', name: str, context: SpanContext, parent_id: Optional[str],
+                 attributes: Dict[str, Any] = None) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._context = context
+        self._parent_id = parent_id
+        self._attributes = dict(attributes) if attributes else {}
+        self._status = "ok"
+        self._start_time = time.time()
+        self._started = time.perf_counter()
+        self._duration = None  # type: float
+        self._token = None
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        return self._attributes
+
+    @property
+    def context(self) -> SpanContext:
+        return self._context
+
+    @property
+    def duration(self) -> float:
+        """The seconds the span was open for, or None if it has not ended"""
+        return self._duration
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def parent_id(self) -> Optional[str]:
+        return self._parent_id
+
+    @property
+    def start_time(self) -> float:
+        return self._start_time
+
+    @property
+    def status(self) -> str:
+        return self._status
+
+    def end(self) -> None:
+        if self._duration is None:
+            self._duration = time.perf_counter() - self._started
+            self._tracer.exporter.export(self)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self._attributes[key] = value
+
+    def set_error(self, error: BaseException) -> None:
+        self._status = "error"
+        self._attributes["error.type"] = error.__class__.__name__
+        self._attributes["error.message"] = str(error)
+
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_val is not None:
+            self.set_error(exc_val)
+        _current_span.reset(self._token)
+        self.end()
+
+
+class SpanExporter(metaclass=ABCMeta):
+    """Where a tracer sends spans once they end. Called on the thread that ends the span, so keep it quick"""
+    @abstractmethod
+    def export(self, span: Span) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps the spans it is sent, so that tests can inspect them"""
+    def __init__(self) -> None:
+        self._spans = []  # type: List[Span]
+        self._lock = Lock()
+
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+
+class LoggingSpanExporter(SpanExporter):
+    """Logs each span on one line; useful to see where time goes without running a collector"""
+    def __init__(self, logger: logging.Logger = None, level: int = logging.INFO) -> None:
+        self._logger = logger or logging.getLogger(__name__)
+        self._level = level
+
+    def export(self, span: Span) -> None:
+        if self._logger.isEnabledFor(self._level):
+            self._logger.log(self._level, "Span %s trace %s span %s parent %s took %.6f seconds status %s %s",
+                             span.name, span.context.trace_id, span.context.span_id, span.parent_id, span.duration,
+                             span.status, span.attributes)
+
+
+class Tracer:
+    """
+    Starts spans and sends them to an exporter when they end. The default is NullTracer, which traces nothing; use
+    a Tracer with an exporter to trace. Check enabled before doing any work that is only needed to trace
+    """
+    def __init__(self, exporter: SpanExporter) -> None:
+        self._exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return True
+
+    @property
+    def exporter(self) -> SpanExporter:
+        return self._exporter
+
+    def start_span(self, name: str, parent: SpanContext = None, attributes: Dict[str, Any] = None) -> Span:
+        """
+        :param name: What the span is timing
+        :param parent: The span this is part of. Defaults to the current span; if there is none, we start a new trace
+        :param attributes: Details of the operation to record with the span
+        """
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current is not None else None
+        span_id = os.urandom(8).hex()
+        if parent is None:
+            context = SpanContext(os.urandom(16).hex(), span_id)
+        else:
+            context = SpanContext(parent.trace_id, span_id, parent.sampled)
+        return Span(self, name, context, parent.span_id if parent is not None else None, attributes)
+
+
+class NullTracer(Tracer):
+    """Traces nothing, at as little cost as we can manage"""
+    def __init__(self) -> None:
+        super().__init__(None)
+
+    @property
+    def enabled(self) -> bool:
+        return False
+
+    def start_span(self, name: str, parent: SpanContext = None, attributes: Dict[str, Any] = None) -> Span:
+        return _NULL_SPAN
+
+
+def current_span() -> Optional[Span]:
+    """The span open on this thread, or None"""
+    return _current_span.get()
+
+
+def extract(bag: Optional[Dict]) -> Optional[SpanContext]:
+    """Read the span context from a message header bag, if it has one"""
+    if not bag or TRACEPARENT_HEADER not in bag:
+        return None
+    return SpanContext.from_traceparent(bag[TRACEPARENT_HEADER])
+
+
+def inject(context: Optional[SpanContext], bag: Dict) -> None:
+    """Write the span context into a message header bag, so that the consumer can continue the trace"""
+    if context is not None:
+        bag[TRACEPARENT_HEADER] = context.to_traceparent()
+
+
+_tracer = NullTracer()  # type: Tracer
+
+
+def get_tracer() -> Tracer:
+    """The tracer Brightside components in this process use, unless they are given their own"""
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> None:
+    """
+    Set the tracer Brightside components in this process use, unless they are given their own. Components pick
+    this up when they are created, so set it before you create them
+    """
+    global _tracer
+    _tracer = tracer if tracer is not None else NullTracer()
+
+
+_current_span = ContextVar("brightside_current_span", default=None)
+
+
+class _NullSpan:
+    context = None
+
+    def end(self) -> None:
+        pass
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, error: BaseException) -> None:
+        pass
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
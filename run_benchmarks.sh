@@ -0,0 +1,11 @@
+#!/usr/bin/env bash
+
+# Runs the benchmarks and saves the results under benchmarks/.results. Once there is a saved run, we compare with
+# the latest one for this machine, and fail if a benchmark's median has regressed by more than BENCHMARK_THRESHOLD
+THRESHOLD=${BENCHMARK_THRESHOLD:-15%}
+COMPARE=()
+if [ -n "$(find benchmarks/.results -name '*.json' 2>/dev/null | head -1)" ]; then
+    COMPARE=(--benchmark-compare "--benchmark-compare-fail=median:${THRESHOLD}")
+fi
+
+python -m pytest -c benchmarks/pytest.ini benchmarks --benchmark-autosave "${COMPARE[@]}" "$@"
@@ -17,7 +17,7 @@ DESCRIPTION = 'Provides a command dispatcher and task queue to support CQRS and
 URL = 'https://github.com/BrighterCommand/Brightside'
 EMAIL = 'ian_hammond_cooper@yahoo.co.uk'
 AUTHOR = 'Ian Cooper'
-REQUIRES_PYTHON = '>=3.6.0'
+REQUIRES_PYTHON = '>=3.7.0'
 VERSION = '0.6.13'
 
 # What packages are required for this module to be executed?
@@ -28,6 +28,7 @@ REQUIRED = [
 # What packages are optional?
 EXTRAS = {
     # 'fancy feature': ['django'],
+    'bench': ['psutil'],
 }
 
 # The rest you shouldn't have to touch too much :)
@@ -107,6 +108,9 @@ setup(
         exclude=['tests', '*.tests', '*.tests.*', 'tests.*', 'examples', 'testrunner.py']),
     install_requires=REQUIRED,
     extras_require=EXTRAS,
+    entry_points={
+        'console_scripts': ['brightside-bench=brightside.bench:main'],
+    },
     include_package_data=True,
     license='MIT',
     classifiers=[
@@ -115,7 +119,7 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: Implementation :: CPython',
         'Programming Language :: Python :: Implementation :: PyPy',
         'Development Status :: 2 - Pre-Alpha',
@@ -30,12 +30,16 @@ THE SOFTWARE.
 """
 from unittest.mock import Mock
 import logging
+import time
 
 from arame.gateway import ArameConsumer
 from brightside.command_processor import CommandProcessor
 from brightside.connection import Connection
 from brightside.messaging import BrightsideConsumer, BrightsideConsumerConfiguration
 from brightside.message_factory import create_null_message
+from brightside.metrics import get_metrics
+from brightside.registry import Registry
+from tests.handlers_testdoubles import MyCommand, MyCommandHandler
 
 
 def mock_command_processor_factory(channel_name: str):
@@ -44,9 +48,18 @@ def mock_command_processor_factory(channel_name: str):
     channel_name is intended to help and implementor set up the command processor, but its not needed here
     """
     mock_command_processor = Mock(spec=CommandProcessor)
+    mock_command_processor.inbox = None
+    mock_command_processor.claim_check = None
     return mock_command_processor
 
 
+def in_memory_command_processor_factory(channel_name: str) -> CommandProcessor:
+    """A command processor that really handles MyCommand, for performers reading from the in-memory broker"""
+    registry = Registry()
+    registry.register(MyCommand, lambda: MyCommandHandler())
+    return CommandProcessor(registry=registry)
+
+
 def mock_consumer_factory(connection: Connection, consumer_configuration: BrightsideConsumerConfiguration,
                           logger: logging.Logger):
     consumer = Mock(spec=BrightsideConsumer)
@@ -56,6 +69,35 @@ def mock_consumer_factory(connection: Connection, consumer_configuration: Bright
     return consumer
 
 
+def metrics_heavy_consumer_factory(connection: Connection, consumer_configuration: BrightsideConsumerConfiguration,
+                                   logger: logging.Logger):
+    """A mock consumer, whose performer counts that it was created, and records enough other metrics that a few of
+    their snapshots fill a pipe"""
+    metrics = get_metrics()
+    metrics.increment("tests_consumers_created_total")
+    for index in range(200):
+        metrics.increment("tests_padding_total", labels={"index": str(index)})
+    return mock_consumer_factory(connection, consumer_configuration, logger)
+
+
 def arame_consuemr_factory(connection: Connection, consumer_configuration: BrightsideConsumerConfiguration,
                           logger: logging.Logger) -> BrightsideConsumer:
     return ArameConsumer(connection=connection, configuration=consumer_configuration, logger=logger)
+
+
+def failing_consumer_factory(connection: Connection, consumer_configuration: BrightsideConsumerConfiguration,
+                             logger: logging.Logger):
+    """A consumer that fails on every read, which kills the message pump and thus the performer's process"""
+    consumer = Mock(spec=BrightsideConsumer)
+    consumer_spec = {"receive.side_effect": RuntimeError("Fake error to kill the message pump")}
+    consumer.configure_mock(**consumer_spec)
+    return consumer
+
+
+def hanging_consumer_factory(connection: Connection, consumer_configuration: BrightsideConsumerConfiguration,
+                             logger: logging.Logger):
+    """A consumer that never returns from a read, so the message pump stops beating"""
+    consumer = Mock(spec=BrightsideConsumer)
+    consumer_spec = {"receive.side_effect": lambda timeout: time.sleep(60)}
+    consumer.configure_mock(**consumer_spec)
+    return consumer
@@ -44,6 +44,7 @@ class FakeChannel:
         self._queue = Queue()
         self._state = ChannelState.initialized
         self._cancel_heartbeat = None  # type: Event
+        self._requeued_delay = None  # type: float
 
     def __len__(self):
         return self._queue.qsize()
@@ -51,6 +52,12 @@ class FakeChannel:
     def acknowledge(self, message: BrightsideMessage):
         pass
 
+    def cancel(self) -> None:
+        pass
+
+    def resume(self) -> None:
+        pass
+
     def add(self, message: BrightsideMessage):
         self._queue.put(message)
 
@@ -88,5 +95,10 @@ class FakeChannel:
         self._queue.put(create_quit_message())
         self._state = ChannelState.stopping
 
-    def requeue(self, message):
+    def requeue(self, message, delay: float = 0.0):
+        self._requeued_delay = delay
         self._queue.put(message)
+
+    @property
+    def requeued_delay(self) -> float:
+        return self._requeued_delay
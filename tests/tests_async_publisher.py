@@ -0,0 +1,180 @@
+"""
+File             : tests_async_publisher.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import threading
+import time
+import unittest
+from concurrent.futures import wait
+from unittest.mock import patch
+
+from brightside.async_publisher import AsyncPublisher, PublishOptions
+from brightside.command_processor import CommandProcessor
+from brightside.exceptions import ConfigurationException, PublishQueueFullException
+from brightside.handler import Handler
+from brightside.registry import Registry
+from tests.handlers_testdoubles import MyEvent, MyEventHandler
+
+
+class SlowEventHandler(Handler):
+    def __init__(self, seconds: float) -> None:
+        self._seconds = seconds
+
+    def handle(self, request):
+        time.sleep(self._seconds)
+
+
+class BlockedEventHandler(Handler):
+    def __init__(self, release: threading.Event) -> None:
+        self._release = release
+
+    def handle(self, request):
+        self._release.wait(5)
+
+
+class FailingEventHandler(Handler):
+    def handle(self, request):
+        raise RuntimeError("Fake error to check handlers are isolated")
+
+
+class AsyncPublisherFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._registry = Registry()
+        self._publisher = AsyncPublisher(PublishOptions(workers=8))
+        self._command_processor = CommandProcessor(registry=self._registry, async_publisher=self._publisher)
+
+    def tearDown(self):
+        self._publisher.shutdown(timeout=5)
+
+    def test_handlers_run_in_parallel(self):
+        """
+        Given that I have eight slow handlers for an event, and eight workers
+        When I publish the event asynchronously
+        Then I should not wait for the handlers, and they should take about as long as one of them
+        """
+        for _ in range(8):
+            self._registry.register(MyEvent, lambda: SlowEventHandler(0.2))
+
+        started = time.monotonic()
+        futures = self._command_processor.publish_async(MyEvent())
+        returned = time.monotonic() - started
+        wait(futures, timeout=5)
+        finished = time.monotonic() - started
+
+        self.assertEqual(len(futures), 8)
+        self.assertLess(returned, 0.1)
+        self.assertLess(finished, 0.2 * 4)
+        self.assertTrue(all(future.done() and future.exception() is None for future in futures))
+
+    def test_a_failing_handler_does_not_stop_the_others(self):
+        """
+        Given that I have an event with a handler that fails, and one that does not
+        When I publish the event asynchronously
+        Then the other handler should still be called, and only the failing handler's future should fail
+        """
+        handler = MyEventHandler()
+        self._registry.register(MyEvent, lambda: FailingEventHandler())
+        self._registry.register(MyEvent, lambda: handler)
+
+        failed, succeeded = self._command_processor.publish_async(MyEvent())
+        wait([failed, succeeded], timeout=5)
+
+        self.assertIsInstance(failed.exception(), RuntimeError)
+        self.assertIsNone(succeeded.exception())
+        self.assertTrue(handler.called)
+
+    def test_full_queue_rejects_when_not_blocking(self):
+        """
+        Given that I have an event type with its own pool, of one worker and a queue of one, that does not block
+        When I publish more events than it can hold
+        Then the publish should be rejected
+        """
+        release = threading.Event()
+        self._publisher.configure(MyEvent, PublishOptions(workers=1, queue_size=1, block=False))
+        self._registry.register(MyEvent, lambda: BlockedEventHandler(release))
+
+        first = self._command_processor.publish_async(MyEvent())
+        # wait for the worker to take the first event, so that the second fills the queue
+        while self._publisher.depth(MyEvent) != 0:
+            time.sleep(0.01)
+        self._command_processor.publish_async(MyEvent())
+
+        with self.assertRaises(PublishQueueFullException):
+            self._command_processor.publish_async(MyEvent())
+
+        release.set()
+        wait(first, timeout=5)
+
+    def test_full_queue_applies_backpressure(self):
+        """
+        Given that I have an event type with its own pool, of one worker and a queue of one, that blocks for a time
+        When I publish more events than it can hold, and the handlers do not finish in time
+        Then the publish should wait, and then be rejected
+        """
+        release = threading.Event()
+        self._publisher.configure(MyEvent, PublishOptions(workers=1, queue_size=1, timeout=0.2))
+        self._registry.register(MyEvent, lambda: BlockedEventHandler(release))
+
+        self._command_processor.publish_async(MyEvent())
+        while self._publisher.depth(MyEvent) != 0:
+            time.sleep(0.01)
+        self._command_processor.publish_async(MyEvent())
+
+        started = time.monotonic()
+        with self.assertRaises(PublishQueueFullException):
+            self._command_processor.publish_async(MyEvent())
+        waited = time.monotonic() - started
+
+        release.set()
+        self.assertGreaterEqual(waited, 0.2)
+
+    def test_submit_racing_shutdown_fails_rather_than_queue_for_ever(self):
+        """
+        Given that I have an async publisher
+        When it is shut down between a submit finding the pool for an event and queueing the event's handler runs
+        Then the submit should fail, rather than hand back futures that will never complete
+        """
+        self._registry.register(MyEvent, lambda: MyEventHandler())
+        pool_for = AsyncPublisher._pool_for
+
+        def _shut_down_once_found(publisher, request):
+            pool = pool_for(publisher, request)
+            publisher.shutdown(timeout=5)
+            return pool
+
+        with patch.object(AsyncPublisher, "_pool_for", _shut_down_once_found):
+            with self.assertRaises(ConfigurationException):
+                self._command_processor.publish_async(MyEvent())
+
+        self.assertEqual(self._publisher.depth(MyEvent), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+"""
+File             : tests_batch.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import threading
+import time
+import unittest
+from multiprocessing import Queue
+
+from brightside.channels import Channel
+from brightside.command_processor import CommandProcessor
+from brightside.exceptions import ConfigurationException, DeferMessageException
+from brightside.handler import BatchHandler
+from brightside.in_memory import InMemoryBroker, InMemoryConsumer, InMemoryProducer
+from brightside.message_pump import MessagePump
+from brightside.messaging import BrightsideConsumerConfiguration
+from brightside.pipeline import LoggingStep
+from brightside.registry import Registry
+from tests.handlers_testdoubles import MyCommand, MyOtherCommand, map_my_command_to_request, \
+    map_mycommand_to_message
+
+
+class MyBatchHandler(BatchHandler):
+    """Defers the first request it sees with an id in defer, once, and handles the rest"""
+    batches = []
+    defer = set()
+
+    def handle_batch(self, requests):
+        MyBatchHandler.batches.append([request.id for request in requests])
+        outcomes = []
+        for request in requests:
+            if request.id in MyBatchHandler.defer:
+                MyBatchHandler.defer.discard(request.id)
+                outcomes.append(DeferMessageException(delay=0))
+            else:
+                outcomes.append(None)
+        return outcomes
+
+
+class ShortChangingBatchHandler(BatchHandler):
+    """Returns no outcomes, which is a configuration error"""
+    def handle_batch(self, requests):
+        return []
+
+
+class SendBatchFixture(unittest.TestCase):
+
+    def setUp(self):
+        MyBatchHandler.batches = []
+        MyBatchHandler.defer = set()
+        self._registry = Registry()
+        self._registry.register(MyCommand, lambda: MyBatchHandler())
+        self._command_processor = CommandProcessor(registry=self._registry)
+
+    def test_hands_the_batch_to_a_batch_handler(self):
+        """
+        Given that I have a batch handler
+        When I send a batch of commands
+        Then it should handle them in one call, and return an outcome for each
+        """
+        requests = [MyCommand() for _ in range(3)]
+        MyBatchHandler.defer.add(requests[1].id)
+
+        outcomes = self._command_processor.send_batch(requests)
+
+        self.assertEqual(MyBatchHandler.batches, [[request.id for request in requests]])
+        self.assertIsNone(outcomes[0])
+        self.assertIsInstance(outcomes[1], DeferMessageException)
+        self.assertIsNone(outcomes[2])
+
+    def test_sends_one_by_one_through_steps(self):
+        """
+        Given that I have a batch handler, with a step registered for its requests
+        When I send a batch of commands
+        Then each should run through the pipeline on its own
+        """
+        self._command_processor.add_step(LoggingStep(), MyCommand)
+
+        self._command_processor.send_batch([MyCommand(), MyCommand()])
+
+        self.assertEqual(len(MyBatchHandler.batches), 2)
+
+    def test_send_raises_what_the_batch_handler_returns(self):
+        """
+        Given that I have a batch handler
+        When I send a command it defers
+        Then send should raise the deferral
+        """
+        request = MyCommand()
+        MyBatchHandler.defer.add(request.id)
+
+        with self.assertRaises(DeferMessageException):
+            self._command_processor.send(request)
+
+    def test_a_batch_is_of_one_type(self):
+        """
+        Given that I have a batch of two request types
+        When I send it
+        Then I should get a configuration error
+        """
+        with self.assertRaises(ConfigurationException):
+            self._command_processor.send_batch([MyCommand(), MyOtherCommand()])
+
+
+class BatchingPumpFixture(unittest.TestCase):
+
+    def test_pump_hands_over_batches_and_settles_each_message(self):
+        """
+        Given that I have a pump with a batch size of 5, and 5 commands waiting, one of which the handler defers
+        When the pump runs
+        Then the handler should get all 5 at once, and later the deferred one again, with the rest acked
+        """
+        MyBatchHandler.batches = []
+        broker = InMemoryBroker()
+        pipeline = Queue()
+        registry = Registry()
+        registry.register(MyCommand, lambda: MyBatchHandler())
+        configuration = BrightsideConsumerConfiguration(pipeline, "batch.queue", "my_command", batch_size=5,
+                                                        batch_linger=0.5)
+        channel = Channel("batch", InMemoryConsumer(broker, configuration), pipeline)
+        producer = InMemoryProducer(broker)
+        messages = [map_mycommand_to_message(MyCommand()) for _ in range(5)]
+        MyBatchHandler.defer = {messages[2].id}
+        for message in messages:
+            producer.send(message)
+
+        pump = MessagePump(CommandProcessor(registry=registry), channel, map_my_command_to_request, timeout=50,
+                           batch_size=configuration.batch_size, batch_linger=configuration.batch_linger)
+        pump_thread = threading.Thread(target=pump.run, daemon=True)
+        pump_thread.start()
+        deadline = time.monotonic() + 5
+        while len(MyBatchHandler.batches) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        channel.stop()
+        pump_thread.join(5)
+
+        self.assertEqual(configuration.prefetch_count, 5)
+        self.assertEqual(MyBatchHandler.batches[0], [message.id for message in messages])
+        self.assertEqual(MyBatchHandler.batches[1], [messages[2].id])
+        self.assertEqual(broker.depth("batch.queue") + broker.in_flight("batch.queue"), 0)
+        self.assertFalse(pump_thread.is_alive())
+
+    def test_pump_returns_an_unsettled_batch_on_a_configuration_error(self):
+        """
+        Given that I have a pump with a batch size of 3, and a batch handler that is misconfigured
+        When the pump hands it a batch of 3 commands
+        Then the pump should stop, returning the batch to the broker rather than leaving it unacked
+        """
+        broker = InMemoryBroker()
+        pipeline = Queue()
+        registry = Registry()
+        registry.register(MyCommand, lambda: ShortChangingBatchHandler())
+        configuration = BrightsideConsumerConfiguration(pipeline, "misconfigured_batch.queue", "my_command",
+                                                        batch_size=3, batch_linger=0.5)
+        channel = Channel("misconfigured_batch", InMemoryConsumer(broker, configuration), pipeline)
+        producer = InMemoryProducer(broker)
+        for _ in range(3):
+            producer.send(map_mycommand_to_message(MyCommand()))
+
+        pump = MessagePump(CommandProcessor(registry=registry), channel, map_my_command_to_request, timeout=50,
+                           batch_size=configuration.batch_size, batch_linger=configuration.batch_linger)
+
+        with self.assertRaises(ConfigurationException):
+            pump.run()
+
+        self.assertEqual(broker.in_flight("misconfigured_batch.queue"), 0)
+        self.assertEqual(broker.depth("misconfigured_batch.queue"), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+File             : tests_bench.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import os
+import unittest
+
+from brightside.bench import _parse_args, percentile, process_stats, run
+
+
+class BenchFixture(unittest.TestCase):
+
+    def test_a_run_over_the_in_memory_transport(self):
+        """
+        Given that I ask for a mix of commands and events over the in-memory transport
+        When I run the load generator
+        Then every message should be received, and we should report latency and the performers' resources
+        """
+        args = _parse_args(["--messages", "200", "--event-ratio", "0.5", "--payload-size", "64", "--timeout", "10"])
+
+        report = run(args)
+
+        self.assertEqual(report["sent"], 200)
+        self.assertEqual(report["received"], 200)
+        self.assertIsNotNone(report["throughput"])
+        self.assertLessEqual(report["latency_ms"]["p50"], report["latency_ms"]["p99"])
+        self.assertEqual(sorted(p["channel"] for p in report["performers"]), ["bench.commands", "bench.events"])
+
+    def test_percentiles(self):
+        """
+        Given that I have some sorted latencies
+        When I ask for percentiles
+        Then I should get the nearest rank, and None if there are no latencies
+        """
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 1.0), 100)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_process_stats(self):
+        """
+        Given that I have a running process
+        When I ask for its stats
+        Then I should get the CPU it has used and its resident memory
+        """
+        cpu, rss = process_stats(os.getpid())
+
+        self.assertGreater(cpu, 0)
+        self.assertGreater(rss, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+"""
+File             : tests_caching.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import threading
+import time
+import unittest
+
+from brightside.caching import CachingStep
+from brightside.command_processor import CommandProcessor
+from brightside.exceptions import ConfigurationException
+from brightside.handler import Command, Handler
+from brightside.metrics import InMemoryMetrics
+from brightside.registry import Registry
+from tests.clock_testdoubles import FakeClock
+
+
+class GetPrice(Command):
+    def __init__(self, sku: str) -> None:
+        super().__init__()
+        self.sku = sku
+
+    @property
+    def cache_key(self):
+        return self.sku
+
+
+class GetStock(GetPrice):
+    pass
+
+
+class UncachedCommand(Command):
+    pass
+
+
+class LookupHandler(Handler):
+    calls = 0
+    release = None  # type: threading.Event
+    interrupt_first = False
+
+    def handle(self, request):
+        LookupHandler.calls += 1
+        if LookupHandler.release is not None:
+            LookupHandler.release.wait(5)
+        if LookupHandler.interrupt_first and LookupHandler.calls == 1:
+            raise KeyboardInterrupt()
+        return "{}-{}".format(getattr(request, "sku", None), LookupHandler.calls)
+
+
+class CachingStepFixture(unittest.TestCase):
+
+    def setUp(self):
+        LookupHandler.calls = 0
+        LookupHandler.release = None
+        LookupHandler.interrupt_first = False
+        self._clock = FakeClock()
+        self._metrics = InMemoryMetrics()
+        registry = Registry()
+        for request_class in (GetPrice, GetStock, UncachedCommand):
+            registry.register(request_class, lambda: LookupHandler())
+        self._command_processor = CommandProcessor(registry=registry)
+
+    def _use(self, step: CachingStep) -> None:
+        self._command_processor.add_step(step)
+
+    def test_reuses_a_result_until_it_expires(self):
+        """
+        Given that I have a cache with a ttl of 10 seconds
+        When I send the same query twice, then again after 10 seconds
+        Then the handler should run for the first and last, and the second should get the first's result
+        """
+        self._use(CachingStep(ttl=10, metrics=self._metrics, clock=self._clock))
+
+        first = self._command_processor.send(GetPrice("apple"))
+        second = self._command_processor.send(GetPrice("apple"))
+        self._clock.now = 10
+        third = self._command_processor.send(GetPrice("apple"))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertEqual(LookupHandler.calls, 2)
+        self.assertEqual(self._metrics.counter_value("brightside_cache_hits_total", {"request_type": "GetPrice"}), 1)
+        self.assertEqual(self._metrics.counter_value("brightside_cache_misses_total", {"request_type": "GetPrice"}), 2)
+
+    def test_requests_without_a_key_are_not_cached(self):
+        """
+        Given that I have a cache
+        When I send a request with no cache key twice
+        Then the handler should run each time
+        """
+        self._use(CachingStep(clock=self._clock))
+
+        self._command_processor.send(UncachedCommand())
+        self._command_processor.send(UncachedCommand())
+
+        self.assertEqual(LookupHandler.calls, 2)
+
+    def test_bounds_each_request_type(self):
+        """
+        Given that I have a cache of one entry for each request type
+        When I send two queries of one type, and one of another
+        Then the least recently used of the first type should be evicted, but the other type kept
+        """
+        self._use(CachingStep(max_entries=1, clock=self._clock))
+
+        self._command_processor.send(GetStock("pear"))
+        self._command_processor.send(GetPrice("apple"))
+        self._command_processor.send(GetPrice("plum"))
+        self._command_processor.send(GetStock("pear"))
+        self._command_processor.send(GetPrice("apple"))
+
+        self.assertEqual(LookupHandler.calls, 4)
+
+    def test_concurrent_misses_run_the_handler_once(self):
+        """
+        Given that I have a cache, and a slow handler
+        When many threads send the same query at once
+        Then the handler should run once, and every thread get its result
+        """
+        self._use(CachingStep(clock=self._clock))
+        LookupHandler.release = threading.Event()
+        results = []
+
+        def _send():
+            results.append(self._command_processor.send(GetPrice("apple")))
+
+        threads = [threading.Thread(target=_send) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while LookupHandler.calls == 0:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        LookupHandler.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(LookupHandler.calls, 1)
+        self.assertEqual(results, ["apple-1"] * 5)
+
+    def test_waiters_carry_on_when_the_first_request_is_interrupted(self):
+        """
+        Given that I have a cache, and a slow handler that is interrupted by something other than an Exception
+        When a thread sends the same query whilst the first runs
+        Then that thread should run the handler itself, rather than wait for ever
+        """
+        self._use(CachingStep(clock=self._clock))
+        LookupHandler.release = threading.Event()
+        LookupHandler.interrupt_first = True
+        interrupted, results = [], []
+
+        def _lead():
+            try:
+                self._command_processor.send(GetPrice("apple"))
+            except KeyboardInterrupt:
+                interrupted.append(True)
+
+        leader = threading.Thread(target=_lead, daemon=True)
+        waiter = threading.Thread(target=lambda: results.append(self._command_processor.send(GetPrice("apple"))),
+                                  daemon=True)
+        leader.start()
+        while LookupHandler.calls == 0:
+            time.sleep(0.01)
+        waiter.start()
+        time.sleep(0.1)
+        LookupHandler.release.set()
+        leader.join(5)
+        waiter.join(5)
+
+        self.assertEqual(interrupted, [True])
+        self.assertEqual(results, ["apple-2"])
+
+    def test_a_clear_whilst_handling_is_not_undone(self):
+        """
+        Given that I have a cache, and a slow handler
+        When I clear the cache whilst the handler runs
+        Then the result it returns should not be kept
+        """
+        step = CachingStep(clock=self._clock)
+        self._use(step)
+        LookupHandler.release = threading.Event()
+        sender = threading.Thread(target=lambda: self._command_processor.send(GetPrice("apple")), daemon=True)
+        sender.start()
+        while LookupHandler.calls == 0:
+            time.sleep(0.01)
+
+        step.clear()
+        LookupHandler.release.set()
+        sender.join(5)
+        LookupHandler.release = None
+
+        self.assertEqual(self._command_processor.send(GetPrice("apple")), "apple-2")
+
+    def test_needs_room_for_an_entry(self):
+        """
+        Given that I want a cache
+        When I give it no room
+        Then I should get a configuration error
+        """
+        with self.assertRaises(ConfigurationException):
+            CachingStep(max_entries=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
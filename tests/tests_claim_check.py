@@ -0,0 +1,249 @@
+"""
+File             : tests_claim_check.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import tempfile
+import threading
+import time
+import unittest
+from multiprocessing import Queue
+from uuid import uuid4
+
+from brightside.channels import Channel
+from brightside.claim_check import CLAIM_CHECK_HEADER, ClaimCheck, ClaimCheckStore, FileSystemClaimCheckStore, \
+    MessageStoreClaimCheckStore
+from brightside.command_processor import CommandProcessor
+from brightside.exceptions import DeferMessageException, MessagingException
+from brightside.handler import Handler
+from brightside.in_memory import InMemoryBroker, InMemoryConsumer, InMemoryProducer
+from brightside.message_pump import MessagePump
+from brightside.messaging import BrightsideConsumerConfiguration, BrightsideMessageBody, BrightsideMessageBodyType
+from brightside.registry import MessageMapperRegistry, Registry
+from tests.handlers_testdoubles import MyCommand, map_my_command_to_request, map_mycommand_to_message
+from tests.messaging_testdoubles import FakeMessageStore
+
+
+class RecordingHandler(Handler):
+    handled = []
+
+    def handle(self, request):
+        RecordingHandler.handled.append(request.id)
+
+
+class UnavailableOnceClaimCheckStore(ClaimCheckStore):
+    """Keeps bodies in memory, but is unavailable the first time we claim one"""
+    def __init__(self) -> None:
+        self.bodies = {}
+        self.claims = 0
+
+    def check_in(self, body: str) -> str:
+        reference = str(uuid4())
+        self.bodies[reference] = body
+        return reference
+
+    def claim(self, reference: str) -> str:
+        self.claims += 1
+        if self.claims == 1:
+            raise ConnectionError("The claim check store is unavailable")
+        return self.bodies[reference]
+
+
+class ClaimCheckStoreFixture(unittest.TestCase):
+
+    def test_file_system_store_returns_what_was_checked_in(self):
+        """
+        Given that I have a claim check store in a directory
+        When I check a body in, and claim it
+        Then I should get the body back
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            store = FileSystemClaimCheckStore(directory)
+
+            reference = store.check_in('{"document": "large"}')
+
+            self.assertEqual(store.claim(reference), '{"document": "large"}')
+
+    def test_file_system_store_only_reads_its_own_files(self):
+        """
+        Given that I have a claim check store in a directory
+        When I claim a reference that is not one of ours, or that we do not have
+        Then I should get an error, rather than a file from elsewhere
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            store = FileSystemClaimCheckStore(directory)
+
+            with self.assertRaises(ValueError):
+                store.claim("../../etc/passwd")
+            with self.assertRaises(MessagingException):
+                store.claim(str(uuid4()))
+
+    def test_message_store_claim_must_exist(self):
+        """
+        Given that I have a claim check store in a message store
+        When I claim a reference it does not have
+        Then I should get a messaging error
+        """
+        store = MessageStoreClaimCheckStore(FakeMessageStore())
+
+        with self.assertRaises(MessagingException):
+            store.claim(str(uuid4()))
+
+
+class ClaimCheckFixture(unittest.TestCase):
+
+    def setUp(self):
+        RecordingHandler.handled = []
+        self._claim_check = ClaimCheck(MessageStoreClaimCheckStore(FakeMessageStore()), threshold=32)
+
+    def test_small_bodies_are_sent_as_they_are(self):
+        """
+        Given that I have a claim check for bodies of 32 bytes or more
+        When I check in a smaller message
+        Then it should keep its body
+        """
+        message = map_mycommand_to_message(MyCommand())
+        message.header.bag = None
+        body = message.body.value
+
+        ClaimCheck(MessageStoreClaimCheckStore(FakeMessageStore()), threshold=1024).check_in(message)
+
+        self.assertEqual(message.body.value, body)
+        self.assertFalse(message.header.bag)
+
+    def test_post_sends_a_reference_that_the_pump_claims(self):
+        """
+        Given that I have a command processor and a message pump that share a claim check
+        When I post a large command
+        Then the broker should only carry a reference, and the handler get the whole command
+        """
+        broker = InMemoryBroker()
+        pipeline = Queue()
+        mappers = MessageMapperRegistry()
+        mappers.register(MyCommand, map_mycommand_to_message)
+        sent = []
+        producer = InMemoryProducer(broker)
+        original_send = producer.send
+
+        def _send(message):
+            sent.append((message.body.value, dict(message.header.bag)))
+            original_send(message)
+
+        producer.send = _send
+        configuration = BrightsideConsumerConfiguration(pipeline, "claim.queue", "my_command")
+        channel = Channel("claim", InMemoryConsumer(broker, configuration), pipeline)
+        posting = CommandProcessor(message_mapper_registry=mappers, message_store=FakeMessageStore(),
+                                   producer=producer, claim_check=self._claim_check)
+        request = MyCommand()
+
+        posting.post(request)
+
+        registry = Registry()
+        registry.register(MyCommand, lambda: RecordingHandler())
+        pump = MessagePump(CommandProcessor(registry=registry), channel, map_my_command_to_request, timeout=50,
+                           claim_check=self._claim_check)
+        pump_thread = threading.Thread(target=pump.run, daemon=True)
+        pump_thread.start()
+        deadline = time.monotonic() + 5
+        while not RecordingHandler.handled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        channel.stop()
+        pump_thread.join(5)
+
+        body, bag = sent[0]
+        self.assertEqual(body, "")
+        self.assertIn(CLAIM_CHECK_HEADER, bag)
+        self.assertEqual(RecordingHandler.handled, [request.id])
+
+    def test_claim_keeps_the_body_type(self):
+        """
+        Given that I have a claim check for bodies of 32 bytes or more
+        When I check in a large body of a type other than the default, and claim it back
+        Then it should keep its type
+        """
+        message = map_mycommand_to_message(MyCommand())
+        message.body = BrightsideMessageBody('{"document": "' + "x" * 64 + '"}', BrightsideMessageBodyType.application_json)
+
+        self._claim_check.check_in(message)
+        self._claim_check.claim(message)
+
+        self.assertEqual(message.body.body_type, BrightsideMessageBodyType.application_json)
+
+    def test_a_body_we_cannot_claim_is_deferred(self):
+        """
+        Given that I have a claim check whose store is unavailable
+        When I claim a message's body
+        Then the message should be deferred, keeping its reference, so that we can claim it when it comes back
+        """
+        store = UnavailableOnceClaimCheckStore()
+        claim_check = ClaimCheck(store, threshold=32, defer_delay=2)
+        message = map_mycommand_to_message(MyCommand())
+        message.body = BrightsideMessageBody("x" * 64)
+        claim_check.check_in(message)
+
+        with self.assertRaises(DeferMessageException) as context:
+            claim_check.claim(message)
+
+        self.assertEqual(context.exception.delay, 2)
+        self.assertIn(CLAIM_CHECK_HEADER, message.header.bag)
+
+    def test_pump_requeues_a_message_whose_body_it_cannot_claim(self):
+        """
+        Given that I have a message pump whose claim check store is unavailable when it first claims a body
+        When a message with a checked in body arrives
+        Then the pump should requeue it, and handle it once it can claim the body
+        """
+        broker = InMemoryBroker()
+        pipeline = Queue()
+        store = UnavailableOnceClaimCheckStore()
+        claim_check = ClaimCheck(store, threshold=32, defer_delay=0.1)
+        configuration = BrightsideConsumerConfiguration(pipeline, "unavailable_claim.queue", "my_command")
+        channel = Channel("unavailable_claim", InMemoryConsumer(broker, configuration), pipeline)
+        request = MyCommand()
+        message = map_mycommand_to_message(request)
+        claim_check.check_in(message)
+        InMemoryProducer(broker).send(message)
+
+        registry = Registry()
+        registry.register(MyCommand, lambda: RecordingHandler())
+        pump = MessagePump(CommandProcessor(registry=registry), channel, map_my_command_to_request, timeout=50,
+                           claim_check=claim_check)
+        pump_thread = threading.Thread(target=pump.run, daemon=True)
+        pump_thread.start()
+        deadline = time.monotonic() + 5
+        while not RecordingHandler.handled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        channel.stop()
+        pump_thread.join(5)
+
+        self.assertEqual(store.claims, 2)
+        self.assertEqual(RecordingHandler.handled, [request.id])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+File             : tests_compression.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import json
+import unittest
+from uuid import uuid4
+
+from kombu.message import Message
+
+from arame.messaging import ArameMessageFactory, KombuMessageFactory, message_content_encoding_header
+from brightside.compression import Compression, LzmaCodec, ZlibCodec
+from brightside.exceptions import ConfigurationException
+from brightside.messaging import BrightsideMessage, BrightsideMessageBody, BrightsideMessageHeader, \
+    BrightsideMessageType
+
+
+def _document(size: int) -> str:
+    return json.dumps({"lines": [{"sku": "item-{}".format(i), "quantity": i % 7} for i in range(size)]})
+
+
+def _on_the_wire(message: BrightsideMessage, compression: Compression) -> Message:
+    """What ArameProducer publishes, as an ArameConsumer reads it"""
+    body, content_encoding = compression.compress(message.body.bytes)
+    headers = KombuMessageFactory(message).create_message_header()
+    if content_encoding is not None:
+        headers[message_content_encoding_header] = content_encoding
+    return Message(body=body, content_type="text/plain", headers=headers)
+
+
+class CompressionFixture(unittest.TestCase):
+
+    def test_leaves_small_bodies_alone(self):
+        """
+        Given that I compress bodies of 1KB or more
+        When I compress a smaller body
+        Then it should be left as it was, with no encoding
+        """
+        body = b'{"sku": "apple"}'
+
+        self.assertEqual(Compression(threshold=1024).compress(body), (body, None))
+
+    def test_compresses_large_bodies(self):
+        """
+        Given that I compress bodies of 1KB or more, with each codec
+        When I compress a large JSON document
+        Then it should be much smaller, and record the codec
+        """
+        body = _document(1000).encode("utf-8")
+
+        for codec in (ZlibCodec(), LzmaCodec()):
+            compressed, content_encoding = Compression(codec, threshold=1024).compress(body)
+            self.assertLess(len(compressed), len(body) / 4)
+            self.assertEqual(content_encoding, codec.name)
+
+    def test_threshold_cannot_be_negative(self):
+        """
+        Given that I want to compress bodies
+        When I give a negative threshold
+        Then I should get a configuration error
+        """
+        with self.assertRaises(ConfigurationException):
+            Compression(threshold=-1)
+
+
+class DecompressingFactoryFixture(unittest.TestCase):
+
+    def _message(self, body: str) -> BrightsideMessage:
+        return BrightsideMessage(BrightsideMessageHeader(uuid4(), "document.topic", BrightsideMessageType.MT_EVENT),
+                                 BrightsideMessageBody(body))
+
+    def test_decompresses_a_compressed_body(self):
+        """
+        Given that I have a large message, compressed on the wire
+        When the message factory reads it
+        Then it should have the original body, and no encoding header in its bag
+        """
+        message = self._message(_document(1000))
+        on_the_wire = _on_the_wire(message, Compression(LzmaCodec(), threshold=1024))
+
+        read = ArameMessageFactory().create_message(on_the_wire)
+
+        self.assertEqual(read.header.message_type, BrightsideMessageType.MT_EVENT)
+        self.assertEqual(read.body.value, message.body.value)
+        self.assertNotIn(message_content_encoding_header, read.header.bag)
+
+    def test_unknown_encoding_is_unacceptable(self):
+        """
+        Given that I have a message with an encoding no codec is registered for
+        When the message factory reads it
+        Then the message should be unacceptable
+        """
+        message = self._message("{}")
+        headers = KombuMessageFactory(message).create_message_header()
+        headers[message_content_encoding_header] = "snappy"
+
+        read = ArameMessageFactory().create_message(Message(body=b"{}", content_type="text/plain", headers=headers))
+
+        self.assertEqual(read.header.message_type, BrightsideMessageType.MT_UNACCEPTABLE)
+
+
+if __name__ == '__main__':
+    unittest.main()
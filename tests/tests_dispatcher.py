@@ -28,6 +28,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 ***********************************************************************
 """
+import os
 import time
 import unittest
 from multiprocessing import Event, Queue
@@ -35,15 +36,37 @@ from uuid import uuid4
 
 from arame.messaging import JsonRequestSerializer
 from brightside.connection import Connection
-from brightside.dispatch import ConsumerConfiguration, Dispatcher, DispatcherState, Performer
+from brightside.exceptions import ConfigurationException
+from brightside.dispatch import AutoscalePolicy, ConsumerConfiguration, Dispatcher, DispatcherState, Performer
 from brightside.messaging import BrightsideConsumerConfiguration, BrightsideMessageHeader, BrightsideMessageBody, \
     BrightsideMessage, BrightsideMessageType, BrightsideMessageBodyType
 from tests.config import TestConfig
-from tests.dispatcher_testdoubles import mock_command_processor_factory, mock_consumer_factory
+from tests.dispatcher_testdoubles import mock_command_processor_factory, mock_consumer_factory, failing_consumer_factory, \
+    hanging_consumer_factory
 from tests.handlers_testdoubles import MyCommand, MyEvent, map_my_command_to_request, map_my_event_to_request
 
 config = TestConfig()
 
+
+def wait_until(condition, timeout: float=10.0, interval: float=0.1) -> bool:
+    """Poll until the condition holds, rather than sleeping for long enough; False if it still fails at the deadline"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+
+def is_running(pid: int) -> bool:
+    """Whether the process is still running; once it has exited and been joined, its pid is gone"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
 class PerformerFixture(unittest.TestCase):
     def test_stop_performer(self):
         """
@@ -176,13 +199,255 @@ class DispatcherFixture(unittest.TestCase):
         self.assertEqual(dispatcher.state, DispatcherState.ds_stopped)
         self.assertTrue(pipeline_two.empty())
 
+    def test_open_a_running_consumer(self):
+        """Given that I have a running dispatcher
+            When I open a consumer that is already running
+            Then the performer it replaces should drain, and the replacement keep running
+        """
+        pipeline = Queue()
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        configuration = BrightsideConsumerConfiguration(pipeline, "reopen.test.queue", "examples.tests.mycommand")
+        consumer = ConsumerConfiguration(connection, configuration, mock_consumer_factory, mock_command_processor_factory,
+                                         map_my_command_to_request)
+        dispatcher = Dispatcher({"MyCommand": consumer}, supervision_interval=0.1, restart_backoff=0.1)
 
-if __name__ == '__main__':
-    unittest.main()
+        dispatcher.receive()
+        replaced = dispatcher.performer_pids["MyCommand"]
+
+        dispatcher.open("MyCommand")
+        drained = wait_until(lambda: not any(is_running(pid) for pid in replaced))
+        health = dispatcher.health["MyCommand"][0]
+        restarts, is_alive = health.restarts, health.is_alive
+
+        dispatcher.end()
+
+        self.assertTrue(drained)
+        self.assertEqual(0, restarts)
+        self.assertTrue(is_alive)
+
+    def test_restart_failed_performer(self):
+        """Given that I have a dispatcher
+            When the process for a performer dies
+            Then the supervisor should restart it
+        """
+        pipeline = Queue()
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        configuration = BrightsideConsumerConfiguration(pipeline, "restart_failed.test.queue", "examples.tests.mycommand")
+        consumer = ConsumerConfiguration(connection, configuration, failing_consumer_factory, mock_command_processor_factory, map_my_command_to_request)
+        dispatcher = Dispatcher({"MyCommand": consumer}, supervision_interval=0.1, restart_backoff=0.1, max_restart_backoff=0.2)
+
+        dispatcher.receive()
+
+        health = dispatcher.health["MyCommand"][0]
+        restarted = wait_until(lambda: health.restarts >= 1)
+
+        dispatcher.end()
+
+        self.assertEqual(dispatcher.state, DispatcherState.ds_stopped)
+        self.assertTrue(restarted)
+        self.assertFalse(health.is_alive)
+
+    def test_restart_hung_performer(self):
+        """Given that I have a dispatcher with a hang timeout
+            When the message pump for a performer stops beating
+            Then the supervisor should terminate and restart it
+        """
+        pipeline = Queue()
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        configuration = BrightsideConsumerConfiguration(pipeline, "restart_hung.test.queue", "examples.tests.mycommand")
+        consumer = ConsumerConfiguration(connection, configuration, hanging_consumer_factory, mock_command_processor_factory, map_my_command_to_request)
+        dispatcher = Dispatcher({"MyCommand": consumer}, supervision_interval=0.1, hang_timeout=0.5, restart_backoff=0.1)
+
+        dispatcher.receive()
+
+        health = dispatcher.health["MyCommand"][0]
+        restarted = wait_until(lambda: health.restarts >= 1)
+
+        dispatcher.end()
+
+        self.assertTrue(restarted)
+
+    def test_start_and_stop_performers_together(self):
+        """Given that I have a dispatcher with many channels
+            When I start and then end the dispatcher
+            Then the performers should start and stop together, and report that they are ready
+        """
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        consumers = {}
+        for index in range(4):
+            configuration = BrightsideConsumerConfiguration(Queue(), "parallel_{}.test.queue".format(index), "examples.tests.mycommand")
+            consumers["channel_{}".format(index)] = ConsumerConfiguration(connection, configuration, mock_consumer_factory,
+                                                                          mock_command_processor_factory, map_my_command_to_request,
+                                                                          performers=2)
+        dispatcher = Dispatcher(consumers, startup_timeout=10, shutdown_timeout=10)
+
+        readiness = dispatcher.receive()
+        pids = [pid for pids in dispatcher.performer_pids.values() for pid in pids]
+
+        dispatcher.end()
+
+        self.assertEqual(4, len(readiness))
+        self.assertTrue(all(readiness.values()))
+        self.assertEqual(dispatcher.state, DispatcherState.ds_stopped)
+        self.assertEqual(8, len(pids))
+        self.assertTrue(wait_until(lambda: not any(is_running(pid) for pid in pids)))
+
+    def test_terminate_performers_that_miss_the_shutdown_deadline(self):
+        """Given that I have a dispatcher with a performer that will not stop
+            When I end the dispatcher
+            Then it should terminate the performer once the shutdown deadline has passed
+        """
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        configuration = BrightsideConsumerConfiguration(Queue(), "deadline.test.queue", "examples.tests.mycommand")
+        consumer = ConsumerConfiguration(connection, configuration, hanging_consumer_factory, mock_command_processor_factory,
+                                         map_my_command_to_request)
+        dispatcher = Dispatcher({"MyCommand": consumer}, shutdown_timeout=1)
+
+        dispatcher.receive()
+        pid = dispatcher.performer_pids["MyCommand"][0]
+
+        dispatcher.end()
+
+        self.assertEqual(dispatcher.state, DispatcherState.ds_stopped)
+        self.assertTrue(wait_until(lambda: not is_running(pid)))
+
+    def test_start_performers_from_a_preloaded_fork_server(self):
+        """Given that I have a dispatcher using the forkserver start method with preloaded modules
+            When I start and then end the dispatcher
+            Then the performers should be forked from the fork server and start
+        """
+        pipeline = Queue()
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        configuration = BrightsideConsumerConfiguration(pipeline, "forkserver.test.queue", "examples.tests.mycommand")
+        consumer = ConsumerConfiguration(connection, configuration, mock_consumer_factory, mock_command_processor_factory,
+                                         map_my_command_to_request, performers=2)
+        dispatcher = Dispatcher({"MyCommand": consumer}, start_method="forkserver",
+                                preload=["brightside.dispatch", "tests.dispatcher_testdoubles"])
+
+        dispatcher.warm()
+
+        readiness = dispatcher.receive()
+
+        dispatcher.end()
+
+        self.assertTrue(readiness["MyCommand"])
+        self.assertEqual(dispatcher.state, DispatcherState.ds_stopped)
 
+    def test_only_preload_for_a_fork_server(self):
+        """Given that I have a dispatcher that does not use the forkserver start method
+            When I ask it to preload modules
+            Then it should raise a configuration exception
+        """
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        configuration = BrightsideConsumerConfiguration(Queue(), "preload.test.queue", "examples.tests.mycommand")
+        consumer = ConsumerConfiguration(connection, configuration, mock_consumer_factory, mock_command_processor_factory,
+                                         map_my_command_to_request)
 
+        with self.assertRaises(ConfigurationException):
+            Dispatcher({"MyCommand": consumer}, start_method="spawn", preload=["brightside.dispatch"])
+
+    def test_set_rate_limit_of_a_channel(self):
+        """Given that I have a dispatcher with a consumer
+            When I set the rate limit of its channel
+            Then its performer's pipeline should be told the new limit, and restarts should use it
+        """
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        pipeline = Queue()
+        configuration = BrightsideConsumerConfiguration(pipeline, "rate_limit.test.queue", "examples.tests.mycommand",
+                                                        prefetch_count=5)
+        consumer = ConsumerConfiguration(connection, configuration, mock_consumer_factory, mock_command_processor_factory,
+                                         map_my_command_to_request)
+        dispatcher = Dispatcher({"MyCommand": consumer})
 
+        dispatcher.set_rate_limit("MyCommand", 10)
+        control = pipeline.get(timeout=1)
 
+        self.assertEqual(control.header.message_type, BrightsideMessageType.MT_CONFIGURE)
+        self.assertEqual(configuration.rate_limit, 10)
+        self.assertEqual(configuration.burst, 5)
+        with self.assertRaises(ConfigurationException):
+            dispatcher.set_rate_limit("missing", 10)
 
 
+class ScalingFixture(unittest.TestCase):
+    def test_start_many_performers_for_a_channel(self):
+        """Given that I have a consumer configured for more than one performer
+            When I start the dispatcher
+            Then it should start that many performers for the channel
+        """
+        pipeline = Queue()
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        configuration = BrightsideConsumerConfiguration(pipeline, "many_performers.test.queue", "examples.tests.mycommand")
+        consumer = ConsumerConfiguration(connection, configuration, mock_consumer_factory, mock_command_processor_factory,
+                                         map_my_command_to_request, performers=2)
+        dispatcher = Dispatcher({"MyCommand": consumer})
+
+        dispatcher.receive()
 
+        ready = wait_until(lambda: dispatcher.readiness["MyCommand"])
+        health = dispatcher.health["MyCommand"]
+
+        dispatcher.end()
+
+        self.assertTrue(ready)
+        self.assertEqual(2, len(health))
+        self.assertTrue(all(h.restarts == 0 for h in health))
+
+    def test_scale_out_and_in_whilst_running(self):
+        """Given that I have a running dispatcher
+            When I scale a channel out and then in
+            Then it should start and then drain performers for that channel
+        """
+        pipeline = Queue()
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        configuration = BrightsideConsumerConfiguration(pipeline, "scaling.test.queue", "examples.tests.mycommand")
+        consumer = ConsumerConfiguration(connection, configuration, mock_consumer_factory, mock_command_processor_factory,
+                                         map_my_command_to_request)
+        dispatcher = Dispatcher({"MyCommand": consumer}, supervision_interval=0.1)
+
+        dispatcher.receive()
+
+        dispatcher.scale("MyCommand", 3)
+        scaled_out = dispatcher.performer_count("MyCommand")
+        alive = [h.is_alive for h in dispatcher.health["MyCommand"]]
+        started = dispatcher.performer_pids["MyCommand"]
+
+        dispatcher.scale("MyCommand", 1)
+        scaled_in = dispatcher.performer_count("MyCommand")
+        drained = set(started) - set(dispatcher.performer_pids["MyCommand"])
+        stopped = wait_until(lambda: not any(is_running(pid) for pid in drained))
+
+        dispatcher.end()
+
+        self.assertEqual(3, scaled_out)
+        self.assertTrue(all(alive))
+        self.assertEqual(1, scaled_in)
+        self.assertEqual(2, len(drained))
+        self.assertTrue(stopped)
+        self.assertEqual(dispatcher.state, DispatcherState.ds_stopped)
+
+    def test_autoscale_out_on_queue_depth(self):
+        """Given that I have an autoscale policy
+            When the queue is deeper than my performers can keep up with
+            Then I should want enough performers to work through it, up to the maximum
+        """
+        policy = AutoscalePolicy(min_performers=1, max_performers=4, messages_per_performer=100)
+
+        self.assertEqual(3, policy.desired_performers(1, queue_depth=250, utilisation=0.5))
+        self.assertEqual(4, policy.desired_performers(1, queue_depth=10000, utilisation=0.5))
+
+    def test_autoscale_on_utilisation(self):
+        """Given that I have an autoscale policy
+            When my message pumps are busy or idle
+            Then I should want one more or one fewer performer, down to the minimum
+        """
+        policy = AutoscalePolicy(min_performers=1, max_performers=4)
+
+        self.assertEqual(3, policy.desired_performers(2, utilisation=0.9))
+        self.assertEqual(1, policy.desired_performers(2, queue_depth=0, utilisation=0.1))
+        self.assertEqual(1, policy.desired_performers(1, queue_depth=0, utilisation=0.0))
+        self.assertEqual(2, policy.desired_performers(2, queue_depth=150, utilisation=0.1))
+
+
+if __name__ == '__main__':
+    unittest.main()
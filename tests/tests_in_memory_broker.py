@@ -0,0 +1,182 @@
+"""
+File             : tests_in_memory_broker.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import time
+import unittest
+from multiprocessing import Queue
+
+from brightside.connection import Connection
+from brightside.dispatch import ConsumerConfiguration, Dispatcher
+from brightside.in_memory import DELAY_HEADER, InMemoryBroker, InMemoryBrokerManager, InMemoryConsumer, \
+    InMemoryConsumerFactory, InMemoryProducer
+from brightside.messaging import BrightsideConsumerConfiguration, BrightsideMessageType
+from tests.dispatcher_testdoubles import in_memory_command_processor_factory
+from tests.handlers_testdoubles import MyCommand, map_my_command_to_request, map_mycommand_to_message
+
+
+class InMemoryBrokerFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._broker = InMemoryBroker()
+        self._producer = InMemoryProducer(self._broker)
+
+    def _consumer(self, queue_name: str, routing_key: str, prefetch_count: int = 1) -> InMemoryConsumer:
+        return InMemoryConsumer(self._broker, BrightsideConsumerConfiguration(Queue(), queue_name, routing_key, prefetch_count))
+
+    def test_routing_by_topic(self):
+        """
+        Given that I have queues bound to an exact key, a wildcard key, and another key
+        When I send a message
+        Then the queues whose keys match its topic should each get a copy, and the other none
+        """
+        exact = self._consumer("exact.queue", "my_command")
+        wildcard = self._consumer("wildcard.queue", "#")
+        other = self._consumer("other.queue", "my_event")
+        message = map_mycommand_to_message(MyCommand())
+
+        self._producer.send(message)
+
+        self.assertEqual(exact.receive(0.1).id, message.id)
+        self.assertEqual(wildcard.receive(0.1).id, message.id)
+        self.assertEqual(other.receive(0.1).header.message_type, BrightsideMessageType.MT_NONE)
+
+    def test_prefetch_limits_unacked_messages(self):
+        """
+        Given that I have a consumer with a prefetch of one
+        When I receive a message, and do not ack it
+        Then I should not receive another until I do
+        """
+        consumer = self._consumer("prefetch.queue", "my_command", prefetch_count=1)
+        self._producer.send(map_mycommand_to_message(MyCommand()))
+        self._producer.send(map_mycommand_to_message(MyCommand()))
+
+        first = consumer.receive(0.1)
+        blocked = consumer.receive(0.1)
+        consumer.acknowledge(first)
+        second = consumer.receive(0.1)
+
+        self.assertEqual(blocked.header.message_type, BrightsideMessageType.MT_NONE)
+        self.assertTrue(consumer.has_acknowledged(first))
+        self.assertEqual(second.header.message_type, BrightsideMessageType.MT_COMMAND)
+        self.assertNotEqual(second.id, first.id)
+
+    def test_requeue_keeps_the_handled_count(self):
+        """
+        Given that I have received a message
+        When I requeue it, having tried to handle it
+        Then I should receive it again, with its handled count
+        """
+        consumer = self._consumer("requeue.queue", "my_command")
+        self._producer.send(map_mycommand_to_message(MyCommand()))
+
+        message = consumer.receive(0.1)
+        message.increment_handled_count()
+        consumer.requeue(message)
+        redelivered = consumer.receive(0.1)
+
+        self.assertEqual(redelivered.id, message.id)
+        self.assertEqual(redelivered.header.handled_count, 1)
+
+    def test_delayed_delivery(self):
+        """
+        Given that I send a message with a delay
+        When I try to receive it before and after the delay
+        Then it should only be delivered after the delay
+        """
+        consumer = self._consumer("delay.queue", "my_command")
+        message = map_mycommand_to_message(MyCommand())
+        message.header.bag = {DELAY_HEADER: 200}
+
+        self._producer.send(message)
+        early = consumer.receive(0.05)
+        on_time = consumer.receive(1.0)
+
+        self.assertEqual(early.header.message_type, BrightsideMessageType.MT_NONE)
+        self.assertEqual(on_time.id, message.id)
+
+    def test_queue_depth_and_stopping_a_consumer(self):
+        """
+        Given that I have a consumer that has received, but not acked, a message
+        When I stop the consumer
+        Then the message should go back on the queue, ready for another consumer
+        """
+        consumer = self._consumer("depth.queue", "my_command", prefetch_count=2)
+        for _ in range(3):
+            self._producer.send(map_mycommand_to_message(MyCommand()))
+
+        consumer.receive(0.1)
+        depth, in_flight = self._broker.depth("depth.queue"), self._broker.in_flight("depth.queue")
+        consumer.stop()
+
+        self.assertEqual((depth, in_flight), (2, 1))
+        self.assertEqual(self._broker.depth("depth.queue"), 3)
+        self.assertEqual(self._broker.in_flight("depth.queue"), 0)
+
+
+class InMemoryBrokerDispatcherFixture(unittest.TestCase):
+
+    def test_dispatching_from_a_shared_broker(self):
+        """
+        Given that I have a dispatcher whose performers consume from a shared in-memory broker
+        When I send messages to the broker
+        Then the performers should handle and ack all of them
+        """
+        with InMemoryBrokerManager() as manager:
+            broker = manager.InMemoryBroker()
+            # declare the queue up front, so that we do not drop messages sent before the performers bind it
+            broker.declare_queue("dispatcher.in_memory.queue", "my_command")
+            consumer_factory = InMemoryConsumerFactory(broker)
+            configuration = BrightsideConsumerConfiguration(Queue(), "dispatcher.in_memory.queue", "my_command",
+                                                            prefetch_count=10)
+            consumer = ConsumerConfiguration(Connection("memory://", "in_memory.exchange"), configuration,
+                                             consumer_factory, in_memory_command_processor_factory,
+                                             map_my_command_to_request, performers=2)
+            dispatcher = Dispatcher({"in_memory": consumer})
+            dispatcher.receive()
+
+            producer = InMemoryProducer(broker)
+            for _ in range(100):
+                producer.send(map_mycommand_to_message(MyCommand()))
+
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and (broker.depth("dispatcher.in_memory.queue") > 0 or
+                                                   broker.in_flight("dispatcher.in_memory.queue") > 0):
+                time.sleep(0.1)
+            depth = consumer_factory.queue_depth(consumer.connection, configuration)
+            in_flight = broker.in_flight("dispatcher.in_memory.queue")
+
+            dispatcher.end()
+
+        self.assertEqual(depth, 0)
+        self.assertEqual(in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
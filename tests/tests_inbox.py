@@ -0,0 +1,237 @@
+"""
+File             : tests_inbox.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from multiprocessing import Queue
+from uuid import UUID, uuid4
+
+from alchemy_store.inbox import SqlAlchemyInbox
+from brightside.channels import Channel
+from brightside.command_processor import CommandProcessor
+from brightside.handler import Handler
+from brightside.in_memory import InMemoryBroker, InMemoryConsumer, InMemoryProducer
+from brightside.inbox import BloomFilter, CachedInbox, InMemoryInbox, InboxStep
+from brightside.message_pump import MessagePump
+from brightside.messaging import BrightsideConsumerConfiguration
+from brightside.metrics import InMemoryMetrics
+from brightside.registry import Registry
+from tests.handlers_testdoubles import MyCommand, map_my_command_to_request, map_mycommand_to_message
+
+
+class CountingInbox(InMemoryInbox):
+    def __init__(self) -> None:
+        super().__init__()
+        self.exists_calls = 0
+
+    def exists(self, message_id: UUID, context_key: str) -> bool:
+        self.exists_calls += 1
+        return super().exists(message_id, context_key)
+
+
+class CountingHandler(Handler):
+    calls = 0
+
+    def handle(self, request):
+        CountingHandler.calls += 1
+
+
+class BloomFilterFixture(unittest.TestCase):
+
+    def test_has_no_false_negatives(self):
+        """
+        Given that I have a Bloom filter
+        When I add ids to it
+        Then it should contain all of them, and few of those I did not add
+        """
+        bloom_filter = BloomFilter(capacity=1000, false_positive_rate=0.01)
+        added = [uuid4() for _ in range(1000)]
+        for item in added:
+            bloom_filter.add(item)
+
+        self.assertTrue(all(item in bloom_filter for item in added))
+        false_positives = sum(1 for _ in range(1000) if uuid4() in bloom_filter)
+        self.assertLess(false_positives, 50)
+
+
+class CachedInboxFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._inbox = CountingInbox()
+        self._metrics = InMemoryMetrics()
+
+    def test_recent_ids_do_not_reach_the_inbox(self):
+        """
+        Given that I have a cached inbox
+        When I check for an id I have just added
+        Then the LRU should answer, without the inbox
+        """
+        cached = CachedInbox(self._inbox, metrics=self._metrics)
+        message_id = uuid4()
+        cached.add(message_id, "context")
+
+        self.assertTrue(cached.exists(message_id, "context"))
+        self.assertFalse(cached.exists(message_id, "other context"))
+        self.assertEqual(self._inbox.exists_calls, 1)
+        self.assertEqual(self._metrics.counter_value("brightside_inbox_checks_total", {"answered_by": "lru"}), 1)
+
+    def test_lru_forgets_the_oldest_ids(self):
+        """
+        Given that I have a cached inbox that remembers one id
+        When I add two ids, and check for the first
+        Then the inbox should answer, and still know it
+        """
+        cached = CachedInbox(self._inbox, cache_size=1)
+        first, second = uuid4(), uuid4()
+        cached.add(first, "context")
+        cached.add(second, "context")
+
+        self.assertTrue(cached.exists(first, "context"))
+        self.assertEqual(self._inbox.exists_calls, 1)
+
+    def test_bloom_filter_answers_for_new_ids(self):
+        """
+        Given that I have a cached inbox with a Bloom filter, in front of an inbox that already holds an id
+        When I check for that id, and for new ids
+        Then the inbox should only be asked about the id it holds
+        """
+        existing = uuid4()
+        self._inbox.add(existing, "context")
+        cached = CachedInbox(self._inbox, bloom_filter=BloomFilter(capacity=1000), metrics=self._metrics)
+
+        self.assertTrue(cached.exists(existing, "context"))
+        for _ in range(10):
+            self.assertFalse(cached.exists(uuid4(), "context"))
+
+        self.assertEqual(self._inbox.exists_calls, 1)
+        self.assertEqual(self._metrics.counter_value("brightside_inbox_checks_total", {"answered_by": "bloom"}), 10)
+
+    def test_bloom_filter_is_warmed_only_from_the_window(self):
+        """
+        Given that I have a cached inbox with a Bloom filter and a warm window, in front of an inbox that holds an id
+            recorded before the window
+        When I check for that id
+        Then the Bloom filter should not have been warmed with it, and answer without the inbox
+        """
+        existing = uuid4()
+        self._inbox.add(existing, "context")
+        time.sleep(0.1)
+        cached = CachedInbox(self._inbox, bloom_filter=BloomFilter(capacity=1000), metrics=self._metrics,
+                             warm_window=0.05)
+
+        self.assertFalse(cached.exists(existing, "context"))
+
+        self.assertEqual(self._inbox.exists_calls, 0)
+        self.assertEqual(self._metrics.counter_value("brightside_inbox_checks_total", {"answered_by": "bloom"}), 1)
+
+
+class InboxStepFixture(unittest.TestCase):
+
+    def test_skips_a_request_it_has_handled(self):
+        """
+        Given that I have a command processor with an inbox step
+        When I send the same command twice
+        Then the handler should only be called once
+        """
+        CountingHandler.calls = 0
+        registry = Registry()
+        registry.register(MyCommand, lambda: CountingHandler())
+        command_processor = CommandProcessor(registry=registry)
+        command_processor.add_step(InboxStep(InMemoryInbox(), "my command handler"))
+        request = MyCommand()
+
+        command_processor.send(request)
+        command_processor.send(request)
+
+        self.assertEqual(CountingHandler.calls, 1)
+
+
+class InboxPumpFixture(unittest.TestCase):
+
+    def test_acks_a_duplicate_without_handling_it(self):
+        """
+        Given that I have a pump with an inbox
+        When the same message is delivered twice
+        Then the handler should be called once, and both deliveries acked
+        """
+        CountingHandler.calls = 0
+        broker = InMemoryBroker()
+        pipeline = Queue()
+        registry = Registry()
+        registry.register(MyCommand, lambda: CountingHandler())
+        command_processor = CommandProcessor(registry=registry)
+        configuration = BrightsideConsumerConfiguration(pipeline, "inbox.queue", "my_command")
+        channel = Channel("inbox", InMemoryConsumer(broker, configuration), pipeline)
+        inbox = InMemoryInbox()
+        metrics = InMemoryMetrics()
+        message = map_mycommand_to_message(MyCommand())
+        producer = InMemoryProducer(broker)
+        producer.send(message)
+        producer.send(message)
+
+        pump = MessagePump(command_processor, channel, map_my_command_to_request, timeout=50, metrics=metrics,
+                           inbox=inbox)
+        pump_thread = threading.Thread(target=pump.run, daemon=True)
+        pump_thread.start()
+        deadline = time.monotonic() + 5
+        while broker.depth("inbox.queue") + broker.in_flight("inbox.queue") > 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        channel.stop()
+        pump_thread.join(5)
+
+        self.assertEqual(CountingHandler.calls, 1)
+        self.assertEqual(broker.in_flight("inbox.queue"), 0)
+        self.assertTrue(inbox.exists(message.id, "inbox"))
+        self.assertEqual(metrics.counter_value("brightside_pump_duplicates_total", {"channel": "inbox"}), 1)
+
+
+class SqlAlchemyInboxFixture(unittest.TestCase):
+
+    def test_adds_each_id_once_per_context(self):
+        """
+        Given that I have an inbox in the database
+        When I add the same id twice, and to another context
+        Then the second add should tell me it was already there, and the other context should not see it until added
+        """
+        inbox = SqlAlchemyInbox()
+        message_id = uuid4()
+
+        self.assertTrue(inbox.add(message_id, "context"))
+        self.assertFalse(inbox.add(message_id, "context"))
+        self.assertTrue(inbox.exists(message_id, "context"))
+        self.assertFalse(inbox.exists(message_id, "other context"))
+        self.assertIn(message_id, inbox.ids("context"))
+        self.assertNotIn(message_id, inbox.ids("context", datetime.utcnow() + timedelta(minutes=1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,10 +35,36 @@ import logging
 from mock import call, patch
 
 from brightside.command_processor import CommandProcessor, Registry
+from brightside.exceptions import ConfigurationException
+from brightside.handler import Handler
+from brightside.log_handler import LogSampler, log_handler
 
 from tests.handlers_testdoubles import MyCommand, MyCommandHandler
 
 
+class MyTimedCommandHandler(Handler):
+    @log_handler(level=logging.INFO, name="tests.timed_handler", timed=True)
+    def handle(self, request):
+        pass
+
+
+class MySampledCommandHandler(Handler):
+    @log_handler(level=logging.INFO, name="tests.sampled_handler", sample=2)
+    def handle(self, request):
+        pass
+
+
+class MyCountedCommand(MyCommand):
+    """Counts how often we turn it into a string, which is the expensive part of logging it"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "MyCountedCommand"
+
+
 class LoggingAndMonitoringFixture(unittest.TestCase):
 
     def setUp(self):
@@ -56,12 +82,102 @@ class LoggingAndMonitoringFixture(unittest.TestCase):
         request = MyCommand()
         self._subscriber_registry.register(MyCommand, lambda: handler)
         logger = logging.getLogger("tests.handlers_testdoubles")
-        with patch.object(logger, 'log') as mock_log:
-            self._commandProcessor.send(request)
+        level = logger.level
+        logger.setLevel(logging.DEBUG)
+        try:
+            with patch.object(logger, 'log') as mock_log:
+                self._commandProcessor.send(request)
+        finally:
+            logger.setLevel(level)
 
         mock_log.assert_has_calls([call(logging.DEBUG, "Entering handle " + str(request)),
                                    call(logging.DEBUG, "Exiting handle " + str(request))])
 
+    def test_logging_a_handler_when_the_level_is_disabled(self):
+        """
+        Given that I have a handler decorated for logging at debug
+        When I call that handler, and debug is not enabled
+        Then we should not log, nor turn the request into a string
+        """
+        handler = MyCommandHandler()
+        request = MyCountedCommand()
+        self._subscriber_registry.register(MyCountedCommand, lambda: handler)
+        logger = logging.getLogger("tests.handlers_testdoubles")
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            with patch.object(logger, 'log') as mock_log:
+                self._commandProcessor.send(request)
+        finally:
+            logger.setLevel(level)
+
+        self.assertTrue(handler.called)
+        mock_log.assert_not_called()
+        self.assertEqual(request.formatted, 0)
+
+    def test_logging_a_timed_handler(self):
+        """
+        Given that I have a handler decorated for logging, with timing
+        When I call that handler
+        Then the exit log should say how long the handler took
+        """
+        request = MyCommand()
+        self._subscriber_registry.register(MyCommand, lambda: MyTimedCommandHandler())
+        with self.assertLogs("tests.timed_handler", level=logging.INFO) as logs:
+            self._commandProcessor.send(request)
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertRegex(logs.records[1].getMessage(), r"^Exiting handle .* in \d+\.\d{6} seconds$")
+
+    def test_logging_a_sampled_handler(self):
+        """
+        Given that I have a handler decorated for logging 1 in 2 requests
+        When I call that handler 4 times
+        Then we should log entry and exit for 2 of them
+        """
+        self._subscriber_registry.register(MyCommand, lambda: MySampledCommandHandler())
+        with self.assertLogs("tests.sampled_handler", level=logging.INFO) as logs:
+            for _ in range(4):
+                self._commandProcessor.send(MyCommand())
+
+        self.assertEqual(len(logs.records), 4)
+
+
+class LogSamplerFixture(unittest.TestCase):
+
+    def test_sampling_one_in_n(self):
+        """
+        Given that I have a log sampler for 1 in 3
+        When I ask it whether to log 9 times
+        Then it should say yes 3 times, starting with the first
+        """
+        sampler = LogSampler(3)
+
+        samples = [sampler.sample() for _ in range(9)]
+
+        self.assertEqual(samples, [True, False, False] * 3)
+
+    def test_sampling_everything_or_nothing(self):
+        """
+        Given that I have a log sampler for every time, and one for never
+        When I ask them whether to log
+        Then the first should always say yes and the second always no
+        """
+        always = LogSampler(1)
+        never = LogSampler(0)
+
+        self.assertTrue(all(always.sample() for _ in range(5)))
+        self.assertFalse(any(never.sample() for _ in range(5)))
+
+    def test_negative_sampling_is_a_configuration_error(self):
+        """
+        Given that I ask for a log sampler with a negative rate
+        When I create it
+        Then I should get a configuration exception
+        """
+        with self.assertRaises(ConfigurationException):
+            LogSampler(-1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -29,20 +29,25 @@ THE SOFTWARE.
 ***********************************************************************
 """
 
+import logging
 import time
 import unittest
+from multiprocessing import Queue
 from threading import Event, Thread
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 from uuid import uuid4
 
 from arame.messaging import JsonRequestSerializer
 from brightside.channels import Channel
 from brightside.command_processor import CommandProcessor
 from brightside.exceptions import ConfigurationException, DeferMessageException
-from brightside.message_factory import create_quit_message
-from brightside.message_pump import MessagePump
-from brightside.messaging import BrightsideMessage, BrightsideMessageBody, BrightsideMessageBodyType, BrightsideMessageHeader, BrightsideMessageType
-from tests.handlers_testdoubles import MyCommandHandler, MyCommand, map_my_command_to_request
+from brightside.in_memory import InMemoryBroker, InMemoryConsumer, InMemoryProducer
+from brightside.message_factory import create_null_message, create_quit_message
+from brightside.message_pump import MessagePump, PumpLiveness
+from brightside.messaging import BrightsideMessage, BrightsideMessageBody, BrightsideMessageBodyType, BrightsideMessageHeader, BrightsideMessageType, \
+    BrightsideConsumerConfiguration
+from brightside.registry import Registry
+from tests.handlers_testdoubles import MyCommandHandler, MyCommand, map_my_command_to_request, map_mycommand_to_message
 from tests.message_pump_doubles import FakeChannel
 
 
@@ -318,6 +323,131 @@ class MessagePumpFixture(unittest.TestCase):
 
         self.assertTrue(command_processor.send.call_count, 3)
 
+    def test_the_pump_should_drain_prefetched_messages_on_quit(self):
+        """
+        Given that I have a message pump for a channel with a drain timeout
+        When I quit whilst there are messages already received from the broker
+        Then I should cancel consumption and handle those messages before I stop
+        """
+        channel = Mock(spec=Channel)
+        command_processor = Mock(spec=CommandProcessor)
+
+        message_pump = MessagePump(command_processor, channel, map_my_command_to_request, drain_timeout=10)
+
+        first_message = self._create_command_message()
+        second_message = self._create_command_message()
+
+        response_queue = [create_quit_message(), first_message, second_message, create_null_message()]
+        channel_spec = {"receive.side_effect": response_queue}
+        channel.configure_mock(**channel_spec)
+
+        message_pump.run()
+
+        self.assertEqual(channel.cancel.call_count, 1)
+        self.assertEqual(command_processor.send.call_count, 2)
+        self.assertEqual(channel.acknowledge.call_count, 2)
+        self.assertEqual(message_pump.drained_count, 2)
+        self.assertEqual(message_pump.returned_count, 0)
+
+    def test_the_pump_should_return_prefetched_messages_after_the_drain_timeout(self):
+        """
+        Given that I have a message pump for a channel with a drain timeout
+        When I quit and run out of time to drain the messages already received from the broker
+        Then I should requeue those messages without handling them
+        """
+        channel = Mock(spec=Channel)
+        command_processor = Mock(spec=CommandProcessor)
+
+        message_pump = MessagePump(command_processor, channel, map_my_command_to_request, drain_timeout=0)
+
+        response_queue = [create_quit_message(), self._create_command_message(), self._create_command_message(),
+                          create_null_message()]
+        channel_spec = {"receive.side_effect": response_queue}
+        channel.configure_mock(**channel_spec)
+
+        message_pump.run()
+
+        self.assertEqual(command_processor.send.call_count, 0)
+        self.assertEqual(channel.requeue.call_count, 2)
+        self.assertEqual(message_pump.drained_count, 0)
+        self.assertEqual(message_pump.returned_count, 2)
+
+    def test_the_pump_should_drain_a_channel_stopped_in_process(self):
+        """
+        Given that I have a message pump with a drain timeout, reading a channel over a consumer that prefetches 3
+        When I stop the channel, from the same process, whilst 5 messages wait on the broker
+        Then the pump should handle the 3 the broker sent the consumer, and leave the other 2 with the broker
+        """
+        broker = InMemoryBroker()
+        pipeline = Queue()
+        configuration = BrightsideConsumerConfiguration(pipeline, "drain.queue", "my_command", prefetch_count=3)
+        channel = Channel("drain", InMemoryConsumer(broker, configuration), pipeline)
+        producer = InMemoryProducer(broker)
+        for _ in range(5):
+            producer.send(map_mycommand_to_message(MyCommand()))
+        registry = Registry()
+        registry.register(MyCommand, lambda: MyCommandHandler())
+        message_pump = MessagePump(CommandProcessor(registry=registry), channel, map_my_command_to_request,
+                                   timeout=50, drain_timeout=5)
+
+        channel.stop()
+        message_pump.run()
+
+        self.assertEqual(message_pump.drained_count, 3)
+        self.assertEqual(message_pump.returned_count, 0)
+        self.assertEqual(broker.depth("drain.queue"), 2)
+
+    @staticmethod
+    def _create_command_message() -> BrightsideMessage:
+        request = MyCommand()
+        header = BrightsideMessageHeader(uuid4(), request.__class__.__name__, BrightsideMessageType.MT_COMMAND)
+        body = BrightsideMessageBody(JsonRequestSerializer(request=request).serialize_to_json(),
+                                     BrightsideMessageBodyType.application_json)
+        return BrightsideMessage(header, body)
+
+    def test_the_pump_does_not_build_debug_logs_when_debug_is_off(self):
+        """
+        Given that I have a message pump, and debug logging is off
+        When I pump messages
+        Then we should not build any debug logs for them
+        """
+        channel = Mock(spec=Channel)
+        channel.name = "test"
+        command_processor = Mock(spec=CommandProcessor)
+        channel.configure_mock(**{"receive.side_effect": [self._create_command_message(),
+                                                           self._create_command_message(),
+                                                           create_quit_message()]})
+
+        message_pump = MessagePump(command_processor, channel, map_my_command_to_request)
+        logger = logging.getLogger("brightside.message_pump")
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            with patch("brightside.message_pump.current_thread") as mock_current_thread:
+                message_pump.run()
+        finally:
+            logger.setLevel(level)
+
+        self.assertEqual(command_processor.send.call_count, 2)
+        mock_current_thread.assert_not_called()
+
+    def test_the_hang_clock_should_start_at_the_first_beat(self):
+        """
+            Given that I have the liveness of a message pump
+             When the pump takes a while to start beating
+             Then the time it took to start should not count as time since its last beat
+        """
+        liveness = PumpLiveness()
+
+        time.sleep(0.2)
+        not_yet_beaten = liveness.seconds_since_last_beat()
+        liveness.beat()
+        time.sleep(0.2)
+        since_first_beat = liveness.seconds_since_last_beat()
+
+        self.assertEqual(0.0, not_yet_beaten)
+        self.assertGreaterEqual(since_first_beat, 0.2)
+
 
 if __name__ == '__main__':
     unittest.main()
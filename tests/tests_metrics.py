@@ -0,0 +1,195 @@
+"""
+File             : tests_metrics.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import logging
+import time
+import unittest
+from multiprocessing import Queue
+from unittest.mock import Mock, patch
+from uuid import uuid4
+
+from arame.messaging import JsonRequestSerializer
+from brightside.channels import Channel
+from brightside.command_processor import CommandProcessor
+from brightside.connection import Connection
+from brightside.dispatch import ConsumerConfiguration, Dispatcher
+from brightside.message_factory import create_null_message, create_quit_message
+from brightside.message_pump import MessagePump
+from brightside.messaging import BrightsideConsumerConfiguration, BrightsideMessage, BrightsideMessageBody, \
+    BrightsideMessageBodyType, BrightsideMessageHeader, BrightsideMessageType
+from brightside.metrics import InMemoryMetrics, merge_snapshots, to_prometheus_text
+from brightside.registry import Registry
+from tests.config import TestConfig
+from tests.dispatcher_testdoubles import metrics_heavy_consumer_factory, mock_command_processor_factory, \
+    mock_consumer_factory
+from tests.handlers_testdoubles import MyCommand, MyCommandHandler, map_my_command_to_request
+
+config = TestConfig()
+
+
+class MetricsFixture(unittest.TestCase):
+    def test_export_metrics_as_prometheus_text(self):
+        """
+        Given that I have recorded counters, gauges and timings
+        When I export them
+        Then I should get them in the Prometheus text format
+        """
+        metrics = InMemoryMetrics(buckets=(0.1, 1.0))
+        metrics.increment("messages_total", labels={"channel": "orders"})
+        metrics.increment("messages_total", labels={"channel": "orders"})
+        metrics.gauge("depth", 3)
+        metrics.observe("handler_seconds", 0.05)
+        metrics.observe("handler_seconds", 5.0)
+
+        text = to_prometheus_text(metrics.snapshot())
+
+        self.assertIn("# TYPE messages_total counter", text)
+        self.assertIn('messages_total{channel="orders"} 2', text)
+        self.assertIn("depth 3", text)
+        self.assertIn('handler_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('handler_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn("handler_seconds_count 2", text)
+
+    def test_merge_snapshots_from_many_processes(self):
+        """
+        Given that I have metrics from more than one process
+        When I merge them
+        Then counters and histograms should be summed
+        """
+        first = InMemoryMetrics()
+        second = InMemoryMetrics()
+        first.increment("messages_total", 2)
+        second.increment("messages_total", 3)
+        first.observe("handler_seconds", 0.01)
+        second.observe("handler_seconds", 0.01)
+
+        merged = merge_snapshots([first.snapshot(), second.snapshot()])
+
+        self.assertEqual(5, merged["counters"][("messages_total", ())])
+        self.assertEqual(2, sum(merged["histograms"][("handler_seconds", ())][:-1]))
+
+    def test_command_processor_records_handler_latency(self):
+        """
+        Given that I have a command processor with metrics
+        When I send a command
+        Then it should record the time spent in the handler, by request type
+        """
+        metrics = InMemoryMetrics()
+        registry = Registry()
+        registry.register(MyCommand, lambda: MyCommandHandler())
+        command_processor = CommandProcessor(registry=registry, metrics=metrics)
+
+        command_processor.send(MyCommand())
+
+        self.assertEqual(1, metrics.histogram_count("brightside_handler_seconds", {"request_type": "MyCommand"}))
+
+    def test_message_pump_records_where_time_goes(self):
+        """
+        Given that I have a message pump with metrics
+        When it handles a message, and then finds nothing to do
+        Then it should record time spent on each stage, and the idle loop
+        """
+        metrics = InMemoryMetrics()
+        channel = Mock(spec=Channel)
+        channel.name = "orders"
+        command_processor = Mock(spec=CommandProcessor)
+        message_pump = MessagePump(command_processor, channel, map_my_command_to_request, timeout=1, metrics=metrics)
+
+        request = MyCommand()
+        header = BrightsideMessageHeader(uuid4(), request.__class__.__name__, BrightsideMessageType.MT_COMMAND)
+        body = BrightsideMessageBody(JsonRequestSerializer(request=request).serialize_to_json(),
+                                     BrightsideMessageBodyType.application_json)
+        channel_spec = {"receive.side_effect": [BrightsideMessage(header, body), create_null_message(), create_quit_message()]}
+        channel.configure_mock(**channel_spec)
+
+        message_pump.run()
+
+        labels = {"channel": "orders"}
+        self.assertEqual(3, metrics.histogram_count("brightside_pump_receive_seconds", labels))
+        self.assertEqual(1, metrics.histogram_count("brightside_pump_translate_seconds", labels))
+        self.assertEqual(1, metrics.histogram_count("brightside_pump_dispatch_seconds", labels))
+        self.assertEqual(1, metrics.histogram_count("brightside_pump_acknowledge_seconds", labels))
+        self.assertEqual(1, metrics.counter_value("brightside_pump_idle_loops_total", labels))
+
+    def test_dispatcher_collects_metrics_from_performers(self):
+        """
+        Given that I have a dispatcher that collects metrics
+        When its performers run, and then stop
+        Then I should be able to export their metrics from the dispatcher, keeping only the counts from those stopped
+        """
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        configuration = BrightsideConsumerConfiguration(Queue(), "metrics.test.queue", "examples.tests.mycommand")
+        consumer = ConsumerConfiguration(connection, configuration, mock_consumer_factory, mock_command_processor_factory,
+                                         map_my_command_to_request, performers=2)
+        dispatcher = Dispatcher({"MyCommand": consumer}, collect_metrics=True, metrics_interval=0.2)
+
+        dispatcher.receive()
+
+        deadline = time.monotonic() + 10
+        running_text = dispatcher.metrics()
+        while 'brightside_pump_idle_loops_total{channel="MyCommand"}' not in running_text and time.monotonic() < deadline:
+            time.sleep(0.1)
+            running_text = dispatcher.metrics()
+
+        dispatcher.end()
+
+        stopped_text = dispatcher.metrics()
+
+        self.assertIn('brightside_pump_idle_loops_total{channel="MyCommand"}', running_text)
+        self.assertIn('brightside_channel_pipeline_depth{channel="MyCommand"}', running_text)
+        self.assertIn('brightside_pump_idle_loops_total{channel="MyCommand"}', stopped_text)
+        self.assertNotIn('brightside_channel_pipeline_depth', stopped_text)
+    def test_dispatcher_takes_the_final_metrics_of_many_performers_as_they_stop(self):
+        """
+        Given that I have a dispatcher that collects metrics, with many performers
+        When I end it
+        Then every performer should stop without being terminated, and I should have the final metrics of each
+        """
+        connection = Connection(config.broker_uri, "examples.perfomer.exchange")
+        configuration = BrightsideConsumerConfiguration(Queue(), "many_metrics.test.queue", "examples.tests.mycommand")
+        consumer = ConsumerConfiguration(connection, configuration, metrics_heavy_consumer_factory,
+                                         mock_command_processor_factory, map_my_command_to_request, performers=24)
+        # performers only send metrics when they stop, so each snapshot we have is a final one
+        dispatcher = Dispatcher({"MyCommand": consumer}, collect_metrics=True, metrics_interval=600,
+                                startup_timeout=30, shutdown_timeout=10)
+
+        dispatcher.receive()
+
+        with patch.object(logging.getLogger("brightside.dispatch"), "error") as error:
+            dispatcher.end()
+
+        text = dispatcher.metrics()
+
+        error.assert_not_called()
+        self.assertIn("tests_consumers_created_total 24", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+File             : tests_partitioning.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import time
+import unittest
+from multiprocessing import Queue
+
+from brightside.command_processor import CommandProcessor
+from brightside.connection import Connection
+from brightside.dispatch import AutoscalePolicy, ConsumerConfiguration, Dispatcher
+from brightside.exceptions import ConfigurationException
+from brightside.in_memory import InMemoryBroker, InMemoryBrokerManager, InMemoryConsumerFactory, InMemoryProducer
+from brightside.messaging import BrightsideConsumerConfiguration
+from brightside.partitioning import PARTITION_KEY_HEADER, Partitioner, partition_for, partition_name
+from brightside.registry import MessageMapperRegistry
+from tests.dispatcher_testdoubles import in_memory_command_processor_factory
+from tests.handlers_testdoubles import MyCommand, map_my_command_to_request, map_mycommand_to_message
+from tests.messaging_testdoubles import FakeMessageStore
+
+
+class MyPartitionedCommand(MyCommand):
+    def __init__(self, partition_key: str = None) -> None:
+        super().__init__()
+        self.partition_key = partition_key
+
+
+class PartitioningFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._mappers = MessageMapperRegistry()
+        self._mappers.register(MyPartitionedCommand, map_mycommand_to_message)
+        self._broker = InMemoryBroker()
+        for partition in range(4):
+            self._broker.declare_queue(partition_name("partitioned.queue", partition), partition_name("my_command", partition))
+        self._command_processor = CommandProcessor(message_mapper_registry=self._mappers,
+                                                   message_store=FakeMessageStore(),
+                                                   producer=InMemoryProducer(self._broker),
+                                                   partitioner=Partitioner({"my_command": 4}))
+
+    def test_partitions_are_stable(self):
+        """
+        Given that I have a partition key
+        When I ask for its partition, many times
+        Then I should always get the same partition, and keys should spread over all partitions
+        """
+        partitions = {partition_for("aggregate-{}".format(i), 4) for i in range(100)}
+
+        self.assertEqual(partition_for("aggregate-1", 4), partition_for("aggregate-1", 4))
+        self.assertEqual(partitions, {0, 1, 2, 3})
+
+    def test_posting_routes_a_key_to_one_partition(self):
+        """
+        Given that I have a command processor that partitions a topic
+        When I post requests for the same key
+        Then they should all go to that key's partition, in order, and carry the key in the header bag
+        """
+        requests = [MyPartitionedCommand("aggregate-7") for _ in range(5)]
+        for request in requests:
+            self._command_processor.post(request)
+
+        expected = partition_name("partitioned.queue", partition_for("aggregate-7", 4))
+        depths = {name: self._broker.depth(name) for name in (partition_name("partitioned.queue", p) for p in range(4))}
+        consumer_id = self._broker.consume(expected, prefetch_count=5)
+        received = [self._broker.fetch(consumer_id, 0.1) for _ in requests]
+
+        self.assertEqual(depths[expected], 5)
+        self.assertEqual(sum(depths.values()), 5)
+        self.assertEqual([m.id for m in received], [r.id for r in requests])
+        self.assertEqual(received[0].header.bag[PARTITION_KEY_HEADER], "aggregate-7")
+
+    def test_unpartitioned_topics_are_left_alone(self):
+        """
+        Given that I have a partitioner for one topic
+        When I partition a message for another topic
+        Then its topic should not change
+        """
+        message = map_mycommand_to_message(MyPartitionedCommand("aggregate-7"))
+        message.header.topic = "my_other_command"
+
+        partition = Partitioner({"my_command": 4}).partition(MyPartitionedCommand("aggregate-7"), message)
+
+        self.assertIsNone(partition)
+        self.assertEqual(message.header.topic, "my_other_command")
+
+    def test_partitioned_consumers_cannot_scale(self):
+        """
+        Given that I have a partitioned consumer
+        When I ask to autoscale it, or scale it
+        Then I should get a configuration exception
+        """
+        configuration = BrightsideConsumerConfiguration(Queue(), "partitioned.queue", "my_command")
+        connection = Connection("memory://", "partitioned.exchange")
+        consumer = ConsumerConfiguration(connection, configuration, InMemoryConsumerFactory(self._broker),
+                                         in_memory_command_processor_factory, map_my_command_to_request, partitions=4)
+
+        with self.assertRaises(ConfigurationException):
+            ConsumerConfiguration(connection, configuration, InMemoryConsumerFactory(self._broker),
+                                  in_memory_command_processor_factory, map_my_command_to_request, partitions=4,
+                                  autoscale=AutoscalePolicy())
+        with self.assertRaises(ConfigurationException):
+            Dispatcher({"partitioned": consumer}).scale("partitioned", 2)
+        self.assertEqual(consumer.performers, 4)
+
+
+class PartitionedDispatcherFixture(unittest.TestCase):
+
+    def test_one_performer_per_partition(self):
+        """
+        Given that I have a dispatcher for a partitioned consumer
+        When I post requests for many keys
+        Then there should be one performer per partition, and all the partitions should be consumed
+        """
+        with InMemoryBrokerManager() as manager:
+            broker = manager.InMemoryBroker()
+            queues = [partition_name("partitioned.dispatcher.queue", p) for p in range(3)]
+            for partition, queue in enumerate(queues):
+                broker.declare_queue(queue, partition_name("my_command", partition))
+
+            configuration = BrightsideConsumerConfiguration(Queue(), "partitioned.dispatcher.queue", "my_command")
+            consumer = ConsumerConfiguration(Connection("memory://", "partitioned.exchange"), configuration,
+                                             InMemoryConsumerFactory(broker), in_memory_command_processor_factory,
+                                             map_my_command_to_request, partitions=3)
+            dispatcher = Dispatcher({"partitioned": consumer})
+            dispatcher.receive()
+
+            mappers = MessageMapperRegistry()
+            mappers.register(MyPartitionedCommand, map_mycommand_to_message)
+            command_processor = CommandProcessor(message_mapper_registry=mappers, message_store=FakeMessageStore(),
+                                                 producer=InMemoryProducer(broker),
+                                                 partitioner=Partitioner({"my_command": 3}))
+            for i in range(60):
+                command_processor.post(MyPartitionedCommand("aggregate-{}".format(i % 10)))
+
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and any(broker.depth(q) or broker.in_flight(q) for q in queues):
+                time.sleep(0.1)
+            remaining = sum(broker.depth(q) + broker.in_flight(q) for q in queues)
+            performers = dispatcher.performer_count("partitioned")
+
+            dispatcher.end()
+
+        self.assertEqual(performers, 3)
+        self.assertEqual(remaining, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
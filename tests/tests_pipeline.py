@@ -0,0 +1,193 @@
+"""
+File             : tests_pipeline.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import logging
+import unittest
+from typing import Any, List
+
+from brightside.command_processor import CommandProcessor
+from brightside.handler import Handler, Request
+from brightside.metrics import InMemoryMetrics
+from brightside.pipeline import FeatureFlagStep, LoggingStep, NextStep, RetryStep, Step, TimingStep
+from brightside.registry import Registry
+from tests.handlers_testdoubles import MyCommand, MyCommandHandler, MyEvent, MyEventHandler, MyOtherCommand
+
+
+class RecordingStep(Step):
+    def __init__(self, name: str, calls: List[str]) -> None:
+        self._name = name
+        self._calls = calls
+
+    def handle(self, request: Request, next_step: NextStep) -> Any:
+        self._calls.append(self._name)
+        return next_step(request)
+
+
+class FlakyCommandHandler(Handler):
+    attempts = 0
+
+    def handle(self, request):
+        FlakyCommandHandler.attempts += 1
+        if FlakyCommandHandler.attempts < 3:
+            raise RuntimeError("Fake error to check for retry")
+
+
+class PipelineFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._registry = Registry()
+        self._command_processor = CommandProcessor(registry=self._registry)
+
+    def test_steps_run_in_order_around_the_handler(self):
+        """
+        Given that I have steps for all requests, and a step for one request type
+        When I send that request
+        Then the steps for all requests should run first, in the order added, then the request's own, then the handler
+        """
+        calls = []
+        handler = MyCommandHandler()
+        self._registry.register(MyCommand, lambda: handler)
+        self._command_processor.add_step(RecordingStep("first", calls))
+        self._command_processor.add_step(RecordingStep("mine", calls), MyCommand)
+        self._command_processor.add_step(RecordingStep("second", calls))
+
+        self._command_processor.send(MyCommand())
+
+        self.assertEqual(calls, ["first", "second", "mine"])
+        self.assertTrue(handler.called)
+
+    def test_step_for_one_request_type_does_not_run_for_others(self):
+        """
+        Given that I have a step for one request type
+        When I send another request type
+        Then the step should not run
+        """
+        calls = []
+        self._registry.register(MyOtherCommand, lambda: MyCommandHandler())
+        self._command_processor.add_step(RecordingStep("mine", calls), MyCommand)
+
+        self._command_processor.send(MyOtherCommand())
+
+        self.assertEqual(calls, [])
+
+    def test_steps_run_for_each_handler_of_an_event(self):
+        """
+        Given that I have a step, and an event with two handlers
+        When I publish the event
+        Then the step should run around each handler
+        """
+        calls = []
+        handler, other_handler = MyEventHandler(), MyEventHandler()
+        self._registry.register(MyEvent, lambda: handler)
+        self._registry.register(MyEvent, lambda: other_handler)
+        self._command_processor.add_step(RecordingStep("step", calls))
+
+        self._command_processor.publish(MyEvent())
+
+        self.assertEqual(calls, ["step", "step"])
+        self.assertTrue(handler.called and other_handler.called)
+
+    def test_pipeline_is_recomposed_when_registrations_change(self):
+        """
+        Given that I have sent a request, so that its pipeline has been composed
+        When I add a step, and send it again
+        Then the new step should run
+        """
+        calls = []
+        self._registry.register(MyCommand, lambda: MyCommandHandler())
+        self._command_processor.send(MyCommand())
+
+        self._command_processor.add_step(RecordingStep("late", calls))
+        self._command_processor.send(MyCommand())
+
+        self.assertEqual(calls, ["late"])
+
+    def test_disabled_feature_short_circuits(self):
+        """
+        Given that I have a feature flag step for a request, and the feature is disabled
+        When I send the request
+        Then the handler should not be created or called
+        """
+        created = []
+        self._registry.register(MyCommand, lambda: created.append(True) or MyCommandHandler())
+        self._command_processor.add_step(FeatureFlagStep(lambda request: False), MyCommand)
+
+        self._command_processor.send(MyCommand())
+
+        self.assertEqual(created, [])
+
+    def test_retry_step_retries_the_handler(self):
+        """
+        Given that I have a retry step, and a handler that fails twice before it succeeds
+        When I send the request
+        Then the handler should be tried until it succeeds
+        """
+        FlakyCommandHandler.attempts = 0
+        self._registry.register(MyCommand, lambda: FlakyCommandHandler())
+        self._command_processor.add_step(RetryStep(RuntimeError, times=3, interval=0))
+
+        self._command_processor.send(MyCommand())
+
+        self.assertEqual(FlakyCommandHandler.attempts, 3)
+
+    def test_retry_step_gives_up(self):
+        """
+        Given that I have a retry step, and a handler that fails more times than we retry
+        When I send the request
+        Then the last failure should be raised
+        """
+        FlakyCommandHandler.attempts = 0
+        self._registry.register(MyCommand, lambda: FlakyCommandHandler())
+        self._command_processor.add_step(RetryStep(RuntimeError, times=2, interval=0))
+
+        with self.assertRaises(RuntimeError):
+            self._command_processor.send(MyCommand())
+        self.assertEqual(FlakyCommandHandler.attempts, 2)
+
+    def test_timing_and_logging_steps(self):
+        """
+        Given that I have timing and logging steps
+        When I send a request
+        Then its time should be observed, and its entry and exit logged
+        """
+        metrics = InMemoryMetrics()
+        self._registry.register(MyCommand, lambda: MyCommandHandler())
+        self._command_processor.add_step(TimingStep(metrics))
+        self._command_processor.add_step(LoggingStep(logging.INFO))
+
+        with self.assertLogs("brightside.pipeline", level=logging.INFO) as logs:
+            self._command_processor.send(MyCommand())
+
+        self.assertEqual(metrics.histogram_count("brightside_pipeline_seconds", {"request_type": "MyCommand"}), 1)
+        self.assertEqual(len(logs.output), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
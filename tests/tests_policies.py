@@ -0,0 +1,572 @@
+"""
+File             : tests_policies.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import asyncio
+import threading
+import time
+import unittest
+from multiprocessing import Queue
+
+from brightside.channels import Channel
+from brightside.command_processor import CommandProcessor
+from brightside.exceptions import CircuitBrokenException, ConfigurationException, DeferMessageException
+from brightside.handler import Handler
+from brightside.in_memory import InMemoryBroker, InMemoryConsumer, InMemoryProducer
+from brightside.message_pump import MessagePump
+from brightside.messaging import BrightsideConsumerConfiguration
+from brightside.metrics import InMemoryMetrics
+from brightside.policies import Bulkhead, CircuitBreaker, CircuitState, PolicyRegistry, RetryPolicy, resume_retries
+from brightside.registry import Registry
+from tests.handlers_testdoubles import MyCommand, MyEvent, MyOtherCommand, map_my_command_to_request, map_mycommand_to_message
+from tests.message_pump_doubles import FakeChannel
+
+
+class Failing:
+    """Fails a number of times, then succeeds"""
+    def __init__(self, failures: int) -> None:
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self) -> str:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("Fake error to check policies")
+        return "done"
+
+
+class DownstreamHandler(Handler):
+    """Calls a downstream that is down"""
+    calls = 0
+
+    def handle(self, request):
+        DownstreamHandler.calls += 1
+        raise RuntimeError("Fake error from a downstream")
+
+
+class RecoveringHandler(Handler):
+    """Calls a downstream that is down for a number of calls, then recovers"""
+    def __init__(self, state: dict) -> None:
+        self._state = state
+
+    def handle(self, request):
+        self._state["calls"] += 1
+        if self._state["calls"] <= self._state["failures"]:
+            raise RuntimeError("Fake error from a downstream")
+        self._state["handled"] += 1
+
+
+class SlowHandler(Handler):
+    def __init__(self, release: threading.Event) -> None:
+        self._release = release
+
+    def handle(self, request):
+        self._release.wait(5)
+
+
+class FastHandler(Handler):
+    def __init__(self, calls: list) -> None:
+        self._calls = calls
+
+    def handle(self, request):
+        self._calls.append(True)
+
+
+class MyOtherEvent(MyEvent):
+    pass
+
+
+class RetryPolicyFixture(unittest.TestCase):
+
+    def test_retries_until_success(self):
+        """
+        Given that I have a retry policy of three attempts
+        When I call something that fails twice
+        Then it should be retried until it succeeds
+        """
+        failing = Failing(2)
+        policy = RetryPolicy("retry", RuntimeError, attempts=3, backoff=0)
+
+        self.assertEqual(policy.execute(failing), "done")
+        self.assertEqual(failing.calls, 3)
+
+    def test_raises_the_last_failure_when_out_of_attempts(self):
+        """
+        Given that I have a retry policy of two attempts
+        When I call something that always fails
+        Then the failure should be raised after two attempts
+        """
+        failing = Failing(5)
+        policy = RetryPolicy("retry", RuntimeError, attempts=2, backoff=0)
+
+        with self.assertRaises(RuntimeError):
+            policy.execute(failing)
+        self.assertEqual(failing.calls, 2)
+
+    def test_does_not_wait_past_its_deadline(self):
+        """
+        Given that I have a retry policy whose backoff would take it past its deadline
+        When I call something that fails
+        Then the failure should be raised without waiting
+        """
+        failing = Failing(5)
+        policy = RetryPolicy("retry", RuntimeError, attempts=5, backoff=10, jitter=False, deadline=1)
+
+        started = time.monotonic()
+        with self.assertRaises(RuntimeError):
+            policy.execute(failing)
+
+        self.assertEqual(failing.calls, 1)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_defers_a_long_backoff(self):
+        """
+        Given that I have a retry policy that defers backoffs of over a second
+        When a call fails, and its backoff is longer than that
+        Then we should defer, with the backoff as the delay
+        """
+        policy = RetryPolicy("retry", RuntimeError, attempts=5, backoff=5, jitter=False, defer_after=1)
+
+        with self.assertRaises(DeferMessageException) as context:
+            policy.execute(Failing(5))
+
+        self.assertEqual(context.exception.delay, 5)
+
+    def test_carries_on_from_its_attempts_before_a_deferral(self):
+        """
+        Given that I have a retry policy of three attempts that defers every backoff
+        When a call keeps failing, and I resume each deferral with the retry state it gave me
+        Then the third attempt should raise the failure, rather than defer again
+        """
+        policy = RetryPolicy("retry", RuntimeError, attempts=3, backoff=5, jitter=False, defer_after=1)
+        failing = Failing(5)
+
+        with self.assertRaises(DeferMessageException) as first:
+            policy.execute(failing)
+        with resume_retries(first.exception.retry_state), self.assertRaises(DeferMessageException) as second:
+            policy.execute(failing)
+        with resume_retries(second.exception.retry_state), self.assertRaises(RuntimeError):
+            policy.execute(failing)
+
+        self.assertEqual(failing.calls, 3)
+        self.assertEqual(second.exception.retry_state["retry"][0], 2)
+        self.assertEqual(second.exception.retry_state["retry"][1], first.exception.retry_state["retry"][1])
+
+    def test_backoff_is_exponential_and_capped(self):
+        """
+        Given that I have a retry policy without jitter
+        When I ask for its backoffs
+        Then they should double, up to the most it waits
+        """
+        policy = RetryPolicy("retry", backoff=1, max_backoff=5, jitter=False)
+
+        self.assertEqual([policy.backoff(attempt) for attempt in range(1, 5)], [1, 2, 4, 5])
+
+    def test_async_retries_until_success(self):
+        """
+        Given that I have a retry policy
+        When I await something that fails once
+        Then it should be retried until it succeeds
+        """
+        failing = Failing(1)
+        policy = RetryPolicy("retry", RuntimeError, attempts=3, backoff=0)
+
+        async def _call() -> str:
+            return failing()
+
+        self.assertEqual(asyncio.run(policy.execute_async(_call)), "done")
+        self.assertEqual(failing.calls, 2)
+
+
+class CircuitBreakerFixture(unittest.TestCase):
+
+    def test_opens_after_the_failure_threshold(self):
+        """
+        Given that I have a circuit breaker that opens after two failures
+        When two calls fail
+        Then the next call should fail at once, without being made
+        """
+        failing = Failing(5)
+        breaker = CircuitBreaker("breaker", RuntimeError, failure_threshold=2, reset_timeout=30)
+
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                breaker.execute(failing)
+        with self.assertRaises(CircuitBrokenException) as context:
+            breaker.execute(failing)
+
+        self.assertEqual(failing.calls, 2)
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        self.assertGreater(context.exception.retry_after, 0)
+
+    def test_probe_closes_the_circuit_on_success(self):
+        """
+        Given that I have a circuit breaker that has opened
+        When the reset timeout passes, and a probe succeeds
+        Then the circuit should close
+        """
+        failing = Failing(1)
+        breaker = CircuitBreaker("breaker", RuntimeError, failure_threshold=1, reset_timeout=0.1)
+        with self.assertRaises(RuntimeError):
+            breaker.execute(failing)
+
+        time.sleep(0.15)
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        self.assertEqual(breaker.execute(failing), "done")
+
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+
+    def test_failed_probe_opens_the_circuit_again(self):
+        """
+        Given that I have a circuit breaker that has opened
+        When the reset timeout passes, and the probe fails
+        Then the circuit should open again
+        """
+        breaker = CircuitBreaker("breaker", RuntimeError, failure_threshold=1, reset_timeout=0.1)
+        failing = Failing(5)
+        with self.assertRaises(RuntimeError):
+            breaker.execute(failing)
+
+        time.sleep(0.15)
+        with self.assertRaises(RuntimeError):
+            breaker.execute(failing)
+
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+
+class BulkheadFixture(unittest.TestCase):
+
+    def _occupy(self, bulkhead: Bulkhead, release: threading.Event) -> threading.Thread:
+        """Start a call that holds a place in the bulkhead until released"""
+        thread = threading.Thread(target=bulkhead.execute, args=(lambda: release.wait(5),), daemon=True)
+        thread.start()
+        return thread
+
+    def _wait_for(self, condition) -> None:
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_defers_when_full(self):
+        """
+        Given that I have a bulkhead of one, with no queue, that is in use
+        When I make another call
+        Then it should be deferred, without being made
+        """
+        release = threading.Event()
+        bulkhead = Bulkhead("downstream", max_concurrent=1, defer_delay=2)
+        occupier = self._occupy(bulkhead, release)
+        self._wait_for(lambda: bulkhead.in_use == 1)
+
+        with self.assertRaises(DeferMessageException) as context:
+            bulkhead.execute(Failing(0))
+
+        self.assertEqual(context.exception.delay, 2)
+        release.set()
+        occupier.join(5)
+        self.assertEqual(bulkhead.in_use, 0)
+
+    def test_queued_call_runs_when_there_is_room(self):
+        """
+        Given that I have a bulkhead of one, with a queue of one, that is in use
+        When I make another call, and the first finishes within the queue timeout
+        Then the second call should wait, then run
+        """
+        release = threading.Event()
+        bulkhead = Bulkhead("downstream", max_concurrent=1, max_queued=1, queue_timeout=5)
+        occupier = self._occupy(bulkhead, release)
+        self._wait_for(lambda: bulkhead.in_use == 1)
+        results = []
+
+        waiter = threading.Thread(target=lambda: results.append(bulkhead.execute(Failing(0))), daemon=True)
+        waiter.start()
+        self._wait_for(lambda: bulkhead.queued == 1)
+        release.set()
+        waiter.join(5)
+        occupier.join(5)
+
+        self.assertEqual(results, ["done"])
+
+    def test_queued_call_is_deferred_after_the_timeout(self):
+        """
+        Given that I have a bulkhead of one, with a queue of one, that is in use
+        When I make another call, and the first does not finish within the queue timeout
+        Then the second call should be deferred
+        """
+        release = threading.Event()
+        bulkhead = Bulkhead("downstream", max_concurrent=1, max_queued=1, queue_timeout=0.1)
+        occupier = self._occupy(bulkhead, release)
+        self._wait_for(lambda: bulkhead.in_use == 1)
+
+        with self.assertRaises(DeferMessageException):
+            bulkhead.execute(Failing(0))
+
+        self.assertEqual(bulkhead.queued, 0)
+        release.set()
+        occupier.join(5)
+
+    def test_cancelled_async_call_gives_back_its_place(self):
+        """
+        Given that I have a bulkhead of one, with a queue of one, that is in use
+        When I make another call asynchronously, and cancel it whilst it waits for room
+        Then once the first call finishes, the place the cancelled call was waiting for should be free again
+        """
+        release = threading.Event()
+        bulkhead = Bulkhead("downstream", max_concurrent=1, max_queued=1, queue_timeout=5)
+        occupier = self._occupy(bulkhead, release)
+        self._wait_for(lambda: bulkhead.in_use == 1)
+
+        async def _call() -> str:
+            return "done"
+
+        async def _cancel_whilst_waiting() -> None:
+            waiter = asyncio.ensure_future(bulkhead.execute_async(_call))
+            while bulkhead.queued == 0:
+                await asyncio.sleep(0.01)
+            waiter.cancel()
+            release.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+
+        asyncio.run(_cancel_whilst_waiting())
+        occupier.join(5)
+        self._wait_for(lambda: bulkhead.in_use == 0)
+
+        self.assertEqual(bulkhead.in_use, 0)
+
+    def test_slow_handler_does_not_take_every_worker(self):
+        """
+        Given that I have a slow handler behind a bulkhead of one, and a fast handler, publishing asynchronously
+        When I publish events for the slow handler and for the fast one
+        Then the fast handler should run, and the slow handler's extra events be deferred
+        """
+        release = threading.Event()
+        fast_calls = []
+        registry = Registry()
+        policies = PolicyRegistry()
+        policies.add(Bulkhead("slow-downstream", max_concurrent=1))
+        command_processor = CommandProcessor(registry=registry, policy_registry=policies)
+        registry.register(MyEvent, lambda: SlowHandler(release))
+        registry.register(MyOtherEvent, lambda: FastHandler(fast_calls))
+        command_processor.use_policy("slow-downstream", MyEvent)
+
+        slow = [command_processor.publish_async(MyEvent())[0] for _ in range(3)]
+        fast = command_processor.publish_async(MyOtherEvent())[0]
+        fast.result(5)
+        release.set()
+        outcomes = [type(future.exception(5)) for future in slow]
+
+        self.assertEqual(fast_calls, [True])
+        self.assertEqual(outcomes.count(DeferMessageException), 2)
+
+
+class PolicyRegistryFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._registry = Registry()
+        self._policies = PolicyRegistry()
+        self._command_processor = CommandProcessor(registry=self._registry, policy_registry=self._policies)
+
+    def test_handlers_share_a_named_circuit_breaker(self):
+        """
+        Given that I have two handlers that use the same named circuit breaker
+        When the first handler's failures open it
+        Then the second handler should not be called
+        """
+        DownstreamHandler.calls = 0
+        self._policies.add(CircuitBreaker("downstream", RuntimeError, failure_threshold=2))
+        self._registry.register(MyCommand, lambda: DownstreamHandler())
+        self._registry.register(MyOtherCommand, lambda: DownstreamHandler())
+        self._command_processor.use_policy("downstream", MyCommand)
+        self._command_processor.use_policy("downstream", MyOtherCommand)
+
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                self._command_processor.send(MyCommand())
+        with self.assertRaises(CircuitBrokenException):
+            self._command_processor.send(MyOtherCommand())
+
+        self.assertEqual(DownstreamHandler.calls, 2)
+
+    def test_unknown_policy(self):
+        """
+        Given that I have no policy with a name
+        When I use it
+        Then I should get a configuration error
+        """
+        with self.assertRaises(ConfigurationException):
+            self._command_processor.use_policy("missing")
+
+    def test_pump_requeues_a_deferred_message_with_its_delay(self):
+        """
+        Given that I have a handler with a retry policy that defers long backoffs
+        When the pump dispatches a message to it, and it fails
+        Then the pump should requeue the message, with the backoff as the delay, rather than wait
+        """
+        DownstreamHandler.calls = 0
+        self._policies.add(RetryPolicy("retry", RuntimeError, attempts=5, backoff=30, max_backoff=60, jitter=False,
+                                        defer_after=1))
+        self._registry.register(MyCommand, lambda: DownstreamHandler())
+        self._command_processor.use_policy("retry", MyCommand)
+        channel = FakeChannel("policies")
+        channel.add(map_mycommand_to_message(MyCommand()))
+        channel.stop()
+
+        started = time.monotonic()
+        MessagePump(self._command_processor, channel, map_my_command_to_request, requeue_count=2).run()
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(channel.requeued_delay, 30)
+        self.assertEqual(DownstreamHandler.calls, 1)
+
+    def test_pump_gives_up_on_a_message_deferred_until_out_of_attempts(self):
+        """
+        Given that I have a handler that always fails, with a retry policy of three attempts that defers every backoff,
+            and a pump with no requeue limit
+        When the pump handles a message
+        Then the message should come back until the policy runs out of attempts, then be acked
+        """
+        DownstreamHandler.calls = 0
+        self._policies.add(RetryPolicy("retry", RuntimeError, attempts=3, backoff=0.02, jitter=False,
+                                        defer_after=0.01))
+        self._registry.register(MyCommand, lambda: DownstreamHandler())
+        self._command_processor.use_policy("retry", MyCommand)
+        broker = InMemoryBroker()
+        pipeline = Queue()
+        configuration = BrightsideConsumerConfiguration(pipeline, "deferred.queue", "my_command")
+        channel = Channel("deferred", InMemoryConsumer(broker, configuration), pipeline)
+        InMemoryProducer(broker).send(map_mycommand_to_message(MyCommand()))
+
+        pump = MessagePump(self._command_processor, channel, map_my_command_to_request, timeout=20)
+        pump_thread = threading.Thread(target=pump.run, daemon=True)
+        pump_thread.start()
+        deadline = time.monotonic() + 5
+        while (DownstreamHandler.calls < 3 or broker.depth("deferred.queue") + broker.in_flight("deferred.queue") > 0) \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # long enough for a fourth attempt, were the policy to defer again
+        time.sleep(0.2)
+        channel.stop()
+        pump_thread.join(5)
+
+        self.assertEqual(DownstreamHandler.calls, 3)
+        self.assertEqual(broker.depth("deferred.queue") + broker.in_flight("deferred.queue"), 0)
+
+
+
+class ConsumerCircuitBreakingFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._broker = InMemoryBroker()
+        self._pipeline = Queue()
+        self._metrics = InMemoryMetrics()
+        self._state = {"calls": 0, "failures": 0, "handled": 0}
+
+        registry = Registry()
+        registry.register(MyCommand, lambda: RecoveringHandler(self._state))
+        policies = PolicyRegistry()
+        policies.add(CircuitBreaker("downstream", RuntimeError, failure_threshold=2, reset_timeout=0.3))
+        command_processor = CommandProcessor(registry=registry, policy_registry=policies)
+        command_processor.use_policy("downstream")
+
+        configuration = BrightsideConsumerConfiguration(self._pipeline, "breaking.queue", "my_command", prefetch_count=5)
+        self._channel = Channel("breaking", InMemoryConsumer(self._broker, configuration), self._pipeline)
+        self._pump = MessagePump(command_processor, self._channel, map_my_command_to_request, timeout=50,
+                                 metrics=self._metrics)
+
+    def _run(self, messages: int) -> None:
+        producer = InMemoryProducer(self._broker)
+        for _ in range(messages):
+            producer.send(map_mycommand_to_message(MyCommand()))
+
+        pump_thread = threading.Thread(target=self._pump.run, daemon=True)
+        pump_thread.start()
+        deadline = time.monotonic() + 5
+        while self._broker.depth("breaking.queue") + self._broker.in_flight("breaking.queue") > 0 \
+                and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._channel.stop()
+        pump_thread.join(5)
+
+    def test_pump_pauses_whilst_the_circuit_is_open(self):
+        """
+        Given that I have a handler whose circuit breaker opens after two failures
+        When the downstream fails twice, then recovers
+        Then the pump should pause once, probe, and handle the rest of the messages
+        """
+        self._state["failures"] = 2
+
+        self._run(10)
+
+        self.assertEqual(self._metrics.counter_value("brightside_pump_pauses_total", {"channel": "breaking"}), 1)
+        self.assertEqual(self._state["calls"], 10)
+        self.assertEqual(self._state["handled"], 8)
+
+    def test_pump_pauses_again_when_the_probe_fails(self):
+        """
+        Given that I have a handler whose circuit breaker opens after two failures
+        When the downstream fails three times, so that the probe fails too
+        Then the pump should pause again, before it probes successfully
+        """
+        self._state["failures"] = 3
+
+        self._run(10)
+
+        self.assertEqual(self._metrics.counter_value("brightside_pump_pauses_total", {"channel": "breaking"}), 2)
+        self.assertEqual(self._state["calls"], 10)
+        self.assertEqual(self._state["handled"], 7)
+
+    def test_pump_does_not_consume_whilst_paused(self):
+        """
+        Given that I have a handler whose circuit breaker has opened
+        When the pump pauses
+        Then it should not take messages from the broker until the breaker will let a probe through
+        """
+        self._state["failures"] = 100
+        producer = InMemoryProducer(self._broker)
+        for _ in range(5):
+            producer.send(map_mycommand_to_message(MyCommand()))
+
+        pump_thread = threading.Thread(target=self._pump.run, daemon=True)
+        pump_thread.start()
+        while self._metrics.gauge_value("brightside_pump_paused", {"channel": "breaking"}) != 1:
+            time.sleep(0.01)
+        paused_depth = self._broker.depth("breaking.queue")
+        time.sleep(0.1)
+
+        self.assertEqual(self._broker.depth("breaking.queue"), paused_depth)
+        self.assertEqual(self._broker.in_flight("breaking.queue"), 0)
+        self.assertEqual(self._state["calls"], 2)
+        self._channel.stop()
+        pump_thread.join(5)
+        self.assertFalse(pump_thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
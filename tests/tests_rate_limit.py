@@ -0,0 +1,193 @@
+"""
+File             : tests_rate_limit.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import threading
+import time
+import unittest
+from multiprocessing import Queue
+
+from brightside.channels import Channel
+from brightside.command_processor import CommandProcessor
+from brightside.exceptions import ConfigurationException
+from brightside.in_memory import InMemoryBroker, InMemoryConsumer, InMemoryProducer
+from brightside.message_pump import MessagePump
+from brightside.messaging import BrightsideConsumerConfiguration
+from brightside.rate_limit import TokenBucket
+from brightside.registry import Registry
+from tests.clock_testdoubles import FakeClock
+from tests.handlers_testdoubles import MyCommand, MyCommandHandler, map_my_command_to_request, map_mycommand_to_message
+
+
+class TokenBucketFixture(unittest.TestCase):
+
+    def test_allows_a_burst_then_the_rate(self):
+        """
+        Given that I have a bucket of 2 a second, with a burst of 3
+        When I take tokens
+        Then I should be able to take 3 at once, then wait half a second for each after that
+        """
+        clock = FakeClock()
+        bucket = TokenBucket(2, 3, clock=clock)
+
+        for _ in range(3):
+            self.assertEqual(bucket.wait_time(), 0)
+            bucket.take()
+
+        self.assertAlmostEqual(bucket.wait_time(), 0.5)
+        clock.now = 0.5
+        self.assertEqual(bucket.wait_time(), 0)
+
+    def test_does_not_fill_beyond_the_burst(self):
+        """
+        Given that I have a bucket with a burst of 2, that has been idle for a long time
+        When I take tokens
+        Then I should only be able to take 2 at once
+        """
+        clock = FakeClock()
+        bucket = TokenBucket(10, 2, clock=clock)
+        clock.now = 100
+
+        bucket.take()
+        bucket.take()
+
+        self.assertGreater(bucket.wait_time(), 0)
+
+    def test_reconfigure_keeps_tokens_up_to_the_new_burst(self):
+        """
+        Given that I have a full bucket
+        When I reduce its burst
+        Then it should hold no more than the new burst
+        """
+        clock = FakeClock()
+        bucket = TokenBucket(1, 5, clock=clock)
+
+        bucket.reconfigure(1, 1)
+        bucket.take()
+
+        self.assertAlmostEqual(bucket.wait_time(), 1)
+
+    def test_rate_must_be_positive(self):
+        """
+        Given that I want a rate limit
+        When I ask for a rate of 0
+        Then I should get a configuration error
+        """
+        with self.assertRaises(ConfigurationException):
+            TokenBucket(0)
+
+    def test_prefetch_is_no_more_than_the_burst(self):
+        """
+        Given that I have a consumer configuration with a prefetch of 10
+        When I give it a rate limit with a burst of 2
+        Then it should prefetch no more than 2; and by default the burst is the prefetch
+        """
+        limited = BrightsideConsumerConfiguration(Queue(), "queue", "key", prefetch_count=10, rate_limit=5, burst=2)
+        defaulted = BrightsideConsumerConfiguration(Queue(), "queue", "key", prefetch_count=10, rate_limit=5)
+
+        self.assertEqual(limited.prefetch_count, 2)
+        self.assertEqual(defaulted.burst, 10)
+
+
+class RateLimitedPumpFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._broker = InMemoryBroker()
+        self._pipeline = Queue()
+        registry = Registry()
+        registry.register(MyCommand, lambda: MyCommandHandler())
+        self._command_processor = CommandProcessor(registry=registry)
+        configuration = BrightsideConsumerConfiguration(self._pipeline, "limited.queue", "my_command", prefetch_count=10)
+        self._channel = Channel("limited", InMemoryConsumer(self._broker, configuration), self._pipeline)
+        producer = InMemoryProducer(self._broker)
+        for _ in range(10):
+            producer.send(map_mycommand_to_message(MyCommand()))
+
+    def _start(self, rate_limit: float, burst: int) -> threading.Thread:
+        pump = MessagePump(self._command_processor, self._channel, map_my_command_to_request, timeout=50,
+                           rate_limit=rate_limit, burst=burst)
+        pump_thread = threading.Thread(target=pump.run, daemon=True)
+        pump_thread.start()
+        return pump_thread
+
+    def _wait_until_handled(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while self._broker.depth("limited.queue") + self._broker.in_flight("limited.queue") > 0 \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_pump_receives_no_faster_than_the_limit(self):
+        """
+        Given that I have a pump limited to 20 messages a second, with a burst of 2
+        When it handles 10 messages
+        Then it should take at least the time the limit allows for the 8 after the burst
+        """
+        started = time.monotonic()
+        pump_thread = self._start(20, 2)
+        self._wait_until_handled(5)
+        elapsed = time.monotonic() - started
+        self._channel.stop()
+        pump_thread.join(5)
+
+        self.assertGreaterEqual(elapsed, 8 / 20 - 0.05)
+        self.assertFalse(pump_thread.is_alive())
+
+    def test_rate_limit_changes_at_runtime(self):
+        """
+        Given that I have a pump limited to 1 message a second
+        When I remove the limit through the channel
+        Then it should handle the rest of the messages at once
+        """
+        pump_thread = self._start(1, 1)
+        time.sleep(0.1)
+        self._channel.set_rate_limit(None)
+        self._wait_until_handled(2)
+
+        self.assertEqual(self._broker.depth("limited.queue"), 0)
+        self._channel.stop()
+        pump_thread.join(5)
+        self.assertFalse(pump_thread.is_alive())
+
+    def test_quit_is_seen_whilst_throttled(self):
+        """
+        Given that I have a pump limited to 1 message every 100 seconds
+        When I stop the channel
+        Then the pump should quit without waiting for the limit
+        """
+        pump_thread = self._start(0.01, 1)
+        time.sleep(0.1)
+
+        self._channel.stop()
+        pump_thread.join(2)
+
+        self.assertFalse(pump_thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+File             : tests_rpc.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import json
+import threading
+import unittest
+from multiprocessing import Queue
+from uuid import uuid4
+
+from brightside.channels import Channel
+from brightside.command_processor import CommandProcessor
+from brightside.exceptions import RequestTimeoutException
+from brightside.handler import Call, Handler, Reply
+from brightside.in_memory import InMemoryBroker, InMemoryConsumer, InMemoryProducer, InMemoryReplyReceiver
+from brightside.message_pump import MessagePump
+from brightside.messaging import BrightsideConsumerConfiguration, BrightsideMessage, BrightsideMessageBody, \
+    BrightsideMessageHeader, BrightsideMessageType
+from brightside.registry import MessageMapperRegistry, Registry
+from arame.messaging import JsonRequestSerializer
+from tests.messaging_testdoubles import FakeMessageStore
+
+
+class AddCall(Call):
+    def __init__(self, left: int = 0, right: int = 0) -> None:
+        super().__init__()
+        self.left = left
+        self.right = right
+
+
+class SumReply(Reply):
+    def __init__(self, total: int = 0) -> None:
+        super().__init__()
+        self.total = total
+
+
+def map_add_call_to_message(request: AddCall) -> BrightsideMessage:
+    message_body = BrightsideMessageBody(json.dumps({"left": request.left, "right": request.right}))
+    return BrightsideMessage(BrightsideMessageHeader(request.id, "add_call", BrightsideMessageType.MT_COMMAND), message_body)
+
+
+def map_message_to_add_call(message: BrightsideMessage) -> AddCall:
+    values = json.loads(message.body.value)
+    return AddCall(values["left"], values["right"])
+
+
+def map_sum_reply_to_message(request: SumReply) -> BrightsideMessage:
+    message_body = BrightsideMessageBody(JsonRequestSerializer(request=request).serialize_to_json())
+    return BrightsideMessage(BrightsideMessageHeader(uuid4(), "", BrightsideMessageType.MT_COMMAND), message_body)
+
+
+def map_message_to_sum_reply(message: BrightsideMessage) -> SumReply:
+    return JsonRequestSerializer(request=SumReply(), serialized_request=message.body.value).deserialize_from_json()
+
+
+class AddCallHandler(Handler):
+    def __init__(self, command_processor: CommandProcessor) -> None:
+        self._command_processor = command_processor
+
+    def handle(self, request: AddCall) -> None:
+        self._command_processor.reply(request, SumReply(request.left + request.right))
+
+
+class RequestReplyFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._broker = InMemoryBroker()
+        self._reply_receiver = InMemoryReplyReceiver(self._broker)
+        self._pipeline = Queue()
+        self._pump_thread = None  # type: threading.Thread
+
+        mappers = MessageMapperRegistry()
+        mappers.register(AddCall, map_add_call_to_message)
+        self._caller = CommandProcessor(message_mapper_registry=mappers, message_store=FakeMessageStore(),
+                                        producer=InMemoryProducer(self._broker), reply_receiver=self._reply_receiver)
+
+        # the consumer declares the queue, so it must exist before we call
+        configuration = BrightsideConsumerConfiguration(self._pipeline, "add.queue", "add_call", prefetch_count=10)
+        self._channel = Channel("add", InMemoryConsumer(self._broker, configuration), self._pipeline)
+
+    def tearDown(self):
+        if self._pump_thread is not None:
+            self._channel.stop()
+            self._pump_thread.join(5)
+        self._reply_receiver.stop()
+
+    def _start_replying(self) -> None:
+        reply_mappers = MessageMapperRegistry()
+        reply_mappers.register(SumReply, map_sum_reply_to_message)
+        registry = Registry()
+        replier = CommandProcessor(registry=registry, message_mapper_registry=reply_mappers,
+                                   producer=InMemoryProducer(self._broker))
+        registry.register(AddCall, lambda: AddCallHandler(replier))
+
+        pump = MessagePump(replier, self._channel, map_message_to_add_call, timeout=50)
+        self._pump_thread = threading.Thread(target=pump.run, daemon=True)
+        self._pump_thread.start()
+
+    def test_call_receives_its_reply(self):
+        """
+        Given that I have a handler that replies to a call
+        When I make the call
+        Then I should receive its reply, mapped to a reply request
+        """
+        self._start_replying()
+
+        reply = self._caller.call(AddCall(2, 3), timeout=5, reply_mapper=map_message_to_sum_reply)
+
+        self.assertIsInstance(reply, SumReply)
+        self.assertEqual(reply.total, 5)
+        self.assertEqual(self._reply_receiver.pending, 0)
+
+    def test_concurrent_calls_are_matched_by_correlation_id(self):
+        """
+        Given that I have a handler that replies to a call
+        When I make many calls at once, from many threads
+        Then each call should receive the reply to its own request
+        """
+        self._start_replying()
+        results = {}
+
+        def _call(n: int) -> None:
+            results[n] = self._caller.call(AddCall(n, n), timeout=5, reply_mapper=map_message_to_sum_reply).total
+
+        callers = [threading.Thread(target=_call, args=(n,)) for n in range(20)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join(10)
+
+        self.assertEqual(results, {n: 2 * n for n in range(20)})
+        self.assertEqual(self._reply_receiver.pending, 0)
+
+    def test_call_without_a_reply_times_out(self):
+        """
+        Given that nobody handles a call
+        When I make the call
+        Then it should time out, and no longer wait for the reply
+        """
+        with self.assertRaises(RequestTimeoutException):
+            self._caller.call(AddCall(1, 1), timeout=0.2)
+
+        self.assertEqual(self._reply_receiver.pending, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+"""
+File             : tests_tracing.py
+Author           : ian
+Created          : 10-19-2026
+
+Last Modified By : ian
+Last Modified On : 10-19-2026
+***********************************************************************
+The MIT License (MIT)
+Copyright © 2026 Ian Cooper <ian_hammond_cooper@yahoo.co.uk>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+***********************************************************************
+"""
+import unittest
+from unittest.mock import Mock
+
+from kombu.message import Message
+
+from arame.messaging import ArameMessageFactory, KombuMessageFactory
+from brightside.channels import Channel
+from brightside.command_processor import CommandProcessor
+from brightside.handler import Handler
+from brightside.message_factory import create_quit_message
+from brightside.message_pump import MessagePump
+from brightside.registry import MessageMapperRegistry, Registry
+from brightside.tracing import InMemorySpanExporter, SpanContext, TRACEPARENT_HEADER, Tracer, extract
+from tests.handlers_testdoubles import MyCommand, map_my_command_to_request, map_mycommand_to_message
+from tests.messaging_testdoubles import FakeMessageStore, FakeProducer
+
+
+class MyPostingCommandHandler(Handler):
+    """Posts on what it handles, as a service in the middle of a flow would"""
+    def __init__(self, command_processor: CommandProcessor) -> None:
+        self._command_processor = command_processor
+
+    def handle(self, request):
+        self._command_processor.post(MyCommand())
+
+
+class MyFailingCommandHandler(Handler):
+    def handle(self, request):
+        raise RuntimeError("Fake error to check we trace it")
+
+
+class TracingFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._exporter = InMemorySpanExporter()
+        self._tracer = Tracer(self._exporter)
+        self._message_mapper_registry = MessageMapperRegistry()
+        self._message_mapper_registry.register(MyCommand, map_mycommand_to_message)
+        self._message_store = FakeMessageStore()
+        self._command_processor = CommandProcessor(message_mapper_registry=self._message_mapper_registry,
+                                                   message_store=self._message_store,
+                                                   producer=FakeProducer(),
+                                                   tracer=self._tracer)
+
+    def test_span_context_as_a_traceparent(self):
+        """
+        Given that I have a span context
+        When I write it as a traceparent and read it back
+        Then I should get the same context, and a malformed traceparent should give me none
+        """
+        context = SpanContext("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7")
+
+        traceparent = context.to_traceparent()
+        read = SpanContext.from_traceparent(traceparent)
+
+        self.assertEqual(traceparent, "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+        self.assertEqual(read.trace_id, context.trace_id)
+        self.assertEqual(read.span_id, context.span_id)
+        self.assertTrue(read.sampled)
+        self.assertIsNone(SpanContext.from_traceparent("00-not-a-trace-01"))
+        self.assertIsNone(SpanContext.from_traceparent("00-00000000000000000000000000000000-00f067aa0ba902b7-01"))
+
+    def test_post_injects_the_trace_context(self):
+        """
+        Given that I have a command processor with a tracer
+        When I post a request
+        Then the message should carry the context of the post span in its header bag
+        """
+        request = MyCommand()
+
+        self._command_processor.post(request)
+
+        message = self._message_store.get_message(request.id)
+        spans = self._exporter.spans
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0].name, "brightside.post")
+        self.assertIsNone(spans[0].parent_id)
+        self.assertEqual(extract(message.header.bag).span_id, spans[0].context.span_id)
+
+    def test_the_header_bag_round_trips_over_the_wire(self):
+        """
+        Given that I have a message with a trace context in its header bag
+        When I turn it into kombu headers, and read it back
+        Then the bag should still hold the trace context
+        """
+        request = MyCommand()
+        self._command_processor.post(request)
+        message = self._message_store.get_message(request.id)
+
+        headers = KombuMessageFactory(message).create_message_header()
+        kombu_message = Message(body=message.body.bytes, content_type="text/plain", headers=headers)
+        read = ArameMessageFactory().create_message(kombu_message)
+
+        self.assertEqual(read.id, message.id)
+        self.assertEqual(read.header.bag[TRACEPARENT_HEADER], message.header.bag[TRACEPARENT_HEADER])
+
+    def test_the_pump_continues_the_trace(self):
+        """
+        Given that I have a message posted within a trace
+        When the message pump handles it, and the handler posts onwards
+        Then we should trace translation and dispatch as children of the post, and the onward post in the same trace
+        """
+        request = MyCommand()
+        self._command_processor.post(request)
+        message = self._message_store.get_message(request.id)
+        post_span = self._exporter.spans[0]
+        self._exporter.clear()
+
+        registry = Registry()
+        registry.register(MyCommand, lambda: MyPostingCommandHandler(self._command_processor))
+        command_processor = CommandProcessor(registry=registry, tracer=self._tracer)
+        channel = Mock(spec=Channel)
+        channel.name = "test"
+        channel.configure_mock(**{"receive.side_effect": [message, create_quit_message()]})
+
+        MessagePump(command_processor, channel, map_my_command_to_request, tracer=self._tracer).run()
+
+        spans = {span.name: span for span in self._exporter.spans}
+        self.assertEqual(set(spans.keys()), {"brightside.process", "brightside.translate", "brightside.dispatch", "brightside.post"})
+        self.assertTrue(all(span.context.trace_id == post_span.context.trace_id for span in spans.values()))
+        self.assertEqual(spans["brightside.process"].parent_id, post_span.context.span_id)
+        self.assertEqual(spans["brightside.translate"].parent_id, spans["brightside.process"].context.span_id)
+        self.assertEqual(spans["brightside.dispatch"].parent_id, spans["brightside.process"].context.span_id)
+        self.assertEqual(spans["brightside.post"].parent_id, spans["brightside.dispatch"].context.span_id)
+
+    def test_a_failed_dispatch_is_traced_as_an_error(self):
+        """
+        Given that I have a message whose handler fails
+        When the message pump handles it
+        Then the dispatch span should record the error
+        """
+        registry = Registry()
+        registry.register(MyCommand, lambda: MyFailingCommandHandler())
+        command_processor = CommandProcessor(registry=registry, tracer=self._tracer)
+        channel = Mock(spec=Channel)
+        channel.name = "test"
+        channel.configure_mock(**{"receive.side_effect": [map_mycommand_to_message(MyCommand()), create_quit_message()]})
+
+        MessagePump(command_processor, channel, map_my_command_to_request, tracer=self._tracer).run()
+
+        spans = {span.name: span for span in self._exporter.spans}
+        self.assertEqual(spans["brightside.dispatch"].status, "error")
+        self.assertEqual(spans["brightside.process"].status, "ok")
+        self.assertEqual(channel.acknowledge.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()